@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'core',
@@ -45,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -132,3 +134,115 @@ STATIC_ROOT = '/vol/web/static'
 MEDIA_ROOT = '/vol/web/media'
 
 AUTH_USER_MODEL = 'core.User'
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    },
+}
+
+
+# Cached list responses
+# core.cache.CachedListMixin
+
+RESPONSE_CACHE = {
+    'CACHE_ALIAS': os.environ.get('RESPONSE_CACHE_ALIAS', 'default'),
+    'TTL': int(os.environ.get('RESPONSE_CACHE_TTL', 300)),
+}
+
+
+# Cached token authentication
+# core.authentication.CachedTokenAuthentication
+
+TOKEN_AUTH_CACHE = {
+    'LOCAL_TTL': int(os.environ.get('TOKEN_AUTH_CACHE_LOCAL_TTL', 30)),
+    'MAX_BYTES': int(os.environ.get('TOKEN_AUTH_CACHE_MAX_BYTES', 4194304)),
+    'CACHE_ALIAS': os.environ.get('TOKEN_AUTH_CACHE_ALIAS') or None,
+    'TTL': int(os.environ.get('TOKEN_AUTH_CACHE_TTL', 300)),
+}
+
+
+# Full-text search
+# core.search
+
+SEARCH_CONFIG = 'english'
+
+
+# Request timing
+# core.middleware.RequestTimingMiddleware
+
+REQUEST_TIMING = {
+    'SAMPLE_RATE': float(os.environ.get('REQUEST_TIMING_SAMPLE_RATE', 1)),
+    'HEADER': bool(int(os.environ.get('REQUEST_TIMING_HEADER', 1))),
+    'REPEATED_THRESHOLD': int(
+        os.environ.get('REQUEST_TIMING_REPEATED_THRESHOLD', 5),
+    ),
+}
+
+
+# Recipe image processing
+# recipe.images
+
+# Uploads are hashed as they are received, to store identical ones once.
+FILE_UPLOAD_HANDLERS = [
+    'recipe.images.HashingMemoryFileUploadHandler',
+    'recipe.images.HashingTemporaryFileUploadHandler',
+]
+
+IMAGE_PROCESSING = {
+    'MAX_UPLOAD_SIZE': int(
+        os.environ.get('IMAGE_MAX_UPLOAD_SIZE', 20 * 1024 * 1024),
+    ),
+    'MAX_PIXELS': int(os.environ.get('IMAGE_MAX_PIXELS', 40 * 1000 * 1000)),
+    'MAX_DIMENSION': int(os.environ.get('IMAGE_MAX_DIMENSION', 2048)),
+    'JPEG_QUALITY': int(os.environ.get('IMAGE_JPEG_QUALITY', 85)),
+    'BATCH_SIZE': int(os.environ.get('IMAGE_BATCH_SIZE', 2)),
+}
+
+
+# Media delivery
+# recipe.media.MediaView
+
+MEDIA_DELIVERY = {
+    'BACKEND': os.environ.get('MEDIA_DELIVERY_BACKEND', 'django'),
+    'INTERNAL_URL': os.environ.get(
+        'MEDIA_DELIVERY_INTERNAL_URL',
+        '/protected-media/',
+    ),
+}
+
+
+# Logging
+# https://docs.djangoproject.com/en/2.2/topics/logging/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {
+            'format': '%(message)s',
+        },
+    },
+    'handlers': {
+        'request_timing': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        # One JSON line per sampled request at INFO, per N+1 at WARNING.
+        'core.middleware': {
+            'handlers': ['request_timing'],
+            'level': os.environ.get('REQUEST_TIMING_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
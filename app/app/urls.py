@@ -15,13 +15,17 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.conf import settings
-from django.conf.urls.static import static
-from django.urls import path, include
+from django.urls import path, include, re_path
+
+from recipe.media import MediaView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/user/', include('user.urls')),
     path('api/recipe/', include('recipe.urls')),
+    re_path(
+        rf'^{settings.MEDIA_URL.lstrip("/")}(?P<name>.+)$',
+        MediaView.as_view(),
+        name='media',
+    ),
 ]
-static_patterns = static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-urlpatterns.extend(static_patterns)
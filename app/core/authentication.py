@@ -0,0 +1,236 @@
+import sys
+import threading
+from collections import OrderedDict
+from hashlib import sha256
+from time import monotonic
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+DEFAULTS = {
+    # Seconds an entry lives in the per-process layer. Other processes are
+    # not notified of invalidations, so keep it short.
+    'LOCAL_TTL': 30,
+    # Approximate memory cap of the per-process layer, in bytes.
+    'MAX_BYTES': 4 * 1024 * 1024,
+    # Alias from CACHES for the shared layer, None to disable it.
+    'CACHE_ALIAS': None,
+    # Seconds an entry lives in the shared layer.
+    'TTL': 300,
+    'KEY_PREFIX': 'token-auth',
+}
+
+# Rough per-entry bookkeeping cost: the ordered dict node and the tuples.
+ENTRY_OVERHEAD = 256
+
+
+def get_config():
+    """Return the token cache settings merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'TOKEN_AUTH_CACHE', {})}
+
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by approximate size in bytes."""
+
+    def __init__(self):
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return a live value or None."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[1] < monotonic():
+                self._pop(key)
+                item = None
+
+            if item is None:
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value, ttl, max_bytes):
+        """Store a value, evicting the least recently used ones."""
+        size = ENTRY_OVERHEAD + sys.getsizeof(key) + sum(
+            sys.getsizeof(v) for v in value
+        )
+        if size > max_bytes:
+            return
+
+        with self._lock:
+            self._pop(key)
+            self._data[key] = (value, monotonic() + ttl, size)
+            self.size += size
+
+            while self.size > max_bytes:
+                _, (_, _, evicted) = self._data.popitem(last=False)
+                self.size -= evicted
+                self.evictions += 1
+
+    def delete(self, key):
+        """Drop a key if present."""
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        """Drop everything and reset the counters."""
+        with self._lock:
+            self._data.clear()
+            self.size = self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Return the counters."""
+        with self._lock:
+            return {
+                'entries': len(self._data),
+                'bytes': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _pop(self, key):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.size -= item[2]
+
+
+class TokenCache:
+    """Two layer cache of token owners: in-process LRU, then shared."""
+
+    def __init__(self):
+        self.local = LRUCache()
+        self.shared_hits = 0
+        self.shared_misses = 0
+
+    def get(self, key):
+        """Return the cached ``(created, user values)`` of a token."""
+        value = self.local.get(key)
+        if value is not None:
+            return value
+
+        config = get_config()
+        shared = self._shared(config)
+        if shared is None:
+            return None
+
+        value = shared.get(self._shared_key(config, key))
+        if value is None:
+            self.shared_misses += 1
+            return None
+
+        self.shared_hits += 1
+        self.local.set(key, value, config['LOCAL_TTL'], config['MAX_BYTES'])
+        return value
+
+    def set(self, key, value):
+        """Store a token entry in both layers."""
+        config = get_config()
+        self.local.set(key, value, config['LOCAL_TTL'], config['MAX_BYTES'])
+
+        shared = self._shared(config)
+        if shared is not None:
+            shared.set(self._shared_key(config, key), value, config['TTL'])
+
+    def delete(self, *keys):
+        """Invalidate tokens in both layers."""
+        for key in keys:
+            self.local.delete(key)
+
+        config = get_config()
+        shared = self._shared(config)
+        if shared is not None and keys:
+            shared.delete_many([self._shared_key(config, k) for k in keys])
+
+    def clear(self):
+        """Drop the in-process layer and reset the counters."""
+        self.local.clear()
+        self.shared_hits = self.shared_misses = 0
+
+    def stats(self):
+        """Return hit and miss counters of both layers."""
+        return {
+            'local': self.local.stats(),
+            'shared': {
+                'hits': self.shared_hits,
+                'misses': self.shared_misses,
+            },
+        }
+
+    @staticmethod
+    def _shared(config):
+        alias = config['CACHE_ALIAS']
+        return caches[alias] if alias else None
+
+    @staticmethod
+    def _shared_key(config, key):
+        # Token keys are credentials, don't spread them across cache servers.
+        return f'{config["KEY_PREFIX"]}:{sha256(key.encode()).hexdigest()}'
+
+
+token_cache = TokenCache()
+
+
+def _user_fields():
+    # The password hash stays out of the shared cache; loaded users defer it.
+    return [
+        f.attname
+        for f in get_user_model()._meta.concrete_fields
+        if f.attname != 'password'
+    ]
+
+
+def dump_token(token):
+    """Snapshot a token and its user as a tuple of plain values."""
+    user = token.user
+    return (token.created,) + tuple(getattr(user, f) for f in _user_fields())
+
+
+def load_token(key, value):
+    """Build fresh token and user instances from a snapshot."""
+    user = get_user_model().from_db('default', _user_fields(), value[1:])
+    token = Token(key=key, user=user, created=value[0])
+    token._state.adding = False
+    token._state.db = 'default'
+    return token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication which caches the token owner.
+
+    Each request gets its own user instance rebuilt from the cached values,
+    so nothing is shared between requests.
+    """
+
+    def authenticate_credentials(self, key):
+        """Return the user and the token for a key."""
+        value = token_cache.get(key)
+        if value is None:
+            model = self.get_model()
+            try:
+                token = model.objects.select_related('user').get(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+            value = dump_token(token)
+            token_cache.set(key, value)
+
+        token = load_token(key, value)
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'),
+            )
+
+        return token.user, token
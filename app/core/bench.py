@@ -0,0 +1,310 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from io import BytesIO
+from itertools import count
+from time import perf_counter
+from urllib.parse import urlencode, urlsplit
+from uuid import uuid4
+
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from PIL import Image
+
+QUERIES_HEADER = 'X-Bench-Queries'
+
+
+class QueryCountingApp:
+    """WSGI application reporting the queries of a request in a header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        # Called once the response is built, before it is sent.
+        def start(status, headers, exc_info=None):
+            headers = [*headers, (QUERIES_HEADER, str(len(queries)))]
+            return start_response(status, headers, exc_info)
+
+        with connection.execute_wrapper(record):
+            return self.app(environ, start)
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Request handler without the access log."""
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server():
+    """Serve the project from a thread, return the server and its URL."""
+    server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+    server.set_app(QueryCountingApp(get_wsgi_application()))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    host, port = server.server_address
+    return server, f'http://{host}:{port}'
+
+
+def sample_image():
+    """Return the bytes of a small JPEG."""
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), (200, 120, 40)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def multipart(field, filename, content):
+    """Encode a file upload, return the body and its content type."""
+    boundary = uuid4().hex
+    body = b''.join((
+        f'--{boundary}\r\n'.encode(),
+        f'Content-Disposition: form-data; name="{field}"; '
+        f'filename="{filename}"\r\n'.encode(),
+        b'Content-Type: image/jpeg\r\n\r\n',
+        content,
+        f'\r\n--{boundary}--\r\n'.encode(),
+    ))
+
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def json_body(data):
+    """Encode a JSON body, return it and its content type."""
+    return json.dumps(data).encode(), 'application/json'
+
+
+class Fixture:
+    """What the requests of a benchmark user refer to."""
+
+    image = None
+
+    def __init__(self, email, password, token, recipe_ids, tag_ids,
+                 ingredient_ids):
+        self.email = email
+        self.password = password
+        self.token = token
+        self.recipe_ids = recipe_ids
+        self.tag_ids = tag_ids
+        self.ingredient_ids = ingredient_ids
+        self.calls = count()
+
+    def pick(self, ids, size=1):
+        """Pick ids in turn, so that the requests vary."""
+        if not ids:
+            return []
+        start = next(self.calls)
+        return [ids[(start + n) % len(ids)] for n in range(size)]
+
+
+def token_request(fixture):
+    """Log in."""
+    body, content_type = json_body({
+        'email': fixture.email,
+        'password': fixture.password,
+    })
+    return 'POST', '/api/user/token/', body, content_type, False
+
+
+def me_request(fixture):
+    """Read the profile."""
+    return 'GET', '/api/user/me/', None, None, True
+
+
+def list_request(fixture):
+    """List the first page of recipes."""
+    return 'GET', '/api/recipe/recipe/', None, None, True
+
+
+def filter_request(fixture):
+    """List the recipes with some tags."""
+    query = urlencode({'tags': ','.join(map(str, fixture.pick(
+        fixture.tag_ids,
+        2,
+    )))})
+    return 'GET', f'/api/recipe/recipe/?{query}', None, None, True
+
+
+def detail_request(fixture):
+    """Retrieve a recipe."""
+    pk, = fixture.pick(fixture.recipe_ids) or [0]
+    return 'GET', f'/api/recipe/recipe/{pk}/', None, None, True
+
+
+def create_request(fixture):
+    """Create a recipe with tags and ingredients."""
+    body, content_type = json_body({
+        'title': 'Benchmark recipe',
+        'time_minutes': 10,
+        'price': '5.00',
+        'tags': fixture.pick(fixture.tag_ids, 3),
+        'ingredients': fixture.pick(fixture.ingredient_ids, 5),
+    })
+    return 'POST', '/api/recipe/recipe/', body, content_type, True
+
+
+def update_request(fixture):
+    """Relink the tags of a recipe."""
+    pk, = fixture.pick(fixture.recipe_ids) or [0]
+    body, content_type = json_body({
+        'tags': fixture.pick(fixture.tag_ids, 2),
+    })
+    return 'PATCH', f'/api/recipe/recipe/{pk}/', body, content_type, True
+
+
+def upload_request(fixture):
+    """Upload the image of a recipe."""
+    pk, = fixture.pick(fixture.recipe_ids) or [0]
+    if Fixture.image is None:
+        Fixture.image = sample_image()
+    body, content_type = multipart('image', 'bench.jpg', Fixture.image)
+    return (
+        'POST',
+        f'/api/recipe/recipe/{pk}/upload-image/',
+        body,
+        content_type,
+        True,
+    )
+
+
+# Name to a function of a fixture returning the method, path, body,
+# content type of the body and whether the request is authenticated.
+SCENARIOS = {
+    'token': token_request,
+    'me': me_request,
+    'recipe-list': list_request,
+    'recipe-filter': filter_request,
+    'recipe-detail': detail_request,
+    'recipe-create': create_request,
+    'recipe-update': update_request,
+    'image-upload': upload_request,
+}
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return None
+
+    index = max(0, min(len(values) - 1, round(fraction * len(values)) - 1))
+    return round(values[index], 2)
+
+
+def summarize(samples, elapsed):
+    """Summarize ``(latency, status, queries)`` samples of a scenario."""
+    latencies = sorted(latency * 1000 for latency, _, _ in samples)
+    queries = [q for _, _, q in samples if q is not None]
+
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, status, _ in samples if status >= 400),
+        'rps': round(len(samples) / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            name: percentile(latencies, fraction)
+            for name, fraction in (
+                ('p50', 0.5),
+                ('p95', 0.95),
+                ('p99', 0.99),
+                ('max', 1),
+            )
+        },
+        'queries': {
+            'mean': round(sum(queries) / len(queries), 2) if queries else None,
+            'max': max(queries) if queries else None,
+        },
+    }
+
+
+def run_scenario(url, scenario, fixtures, requests, concurrency):
+    """Send ``requests`` requests of a scenario from concurrent clients.
+
+    Each client keeps its connection open and plays one fixture.
+    """
+    parts = urlsplit(url)
+    build = SCENARIOS[scenario]
+    budget = count()
+
+    def client(fixture):
+        conn = HTTPConnection(parts.hostname, parts.port, timeout=60)
+        samples = []
+        try:
+            while next(budget) < requests:
+                method, path, body, content_type, auth = build(fixture)
+                headers = {}
+                if content_type:
+                    headers['Content-Type'] = content_type
+                if auth:
+                    headers['Authorization'] = f'Token {fixture.token}'
+
+                started = perf_counter()
+                conn.request(method, path, body, headers)
+                response = conn.getresponse()
+                response.read()
+                latency = perf_counter() - started
+
+                queries = response.getheader(QUERIES_HEADER)
+                samples.append((
+                    latency,
+                    response.status,
+                    int(queries) if queries is not None else None,
+                ))
+        finally:
+            conn.close()
+
+        return samples
+
+    started = perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(client, (
+            fixtures[n % len(fixtures)] for n in range(concurrency)
+        )))
+    elapsed = perf_counter() - started
+
+    return summarize([s for samples in results for s in samples], elapsed)
+
+
+def compare(results, baseline, tolerance):
+    """Return the regressions of results against a baseline.
+
+    Latency and throughput may move by ``tolerance``, a fraction, before
+    they count; the number of queries is deterministic and may not grow.
+    """
+    regressions = []
+    for scenario, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(scenario)
+        if previous is None:
+            continue
+
+        before = previous['latency_ms']['p95']
+        after = current['latency_ms']['p95']
+        if before and after and after > before * (1 + tolerance):
+            regressions.append(
+                f'{scenario}: p95 {before}ms -> {after}ms',
+            )
+
+        before, after = previous['rps'], current['rps']
+        if before and after and after < before * (1 - tolerance):
+            regressions.append(f'{scenario}: {before} -> {after} req/s')
+
+        before, after = previous['queries']['max'], current['queries']['max']
+        if before is not None and after is not None and after > before:
+            regressions.append(
+                f'{scenario}: {before} -> {after} queries per request',
+            )
+
+        if current['errors'] > previous['errors']:
+            regressions.append(
+                f'{scenario}: {previous["errors"]} -> {current["errors"]} '
+                f'errors',
+            )
+
+    return regressions
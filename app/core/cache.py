@@ -0,0 +1,233 @@
+from hashlib import sha256
+from time import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag, urlencode
+from rest_framework.generics import get_object_or_404
+
+DEFAULTS = {
+    # Alias from CACHES storing the responses and the user versions.
+    'CACHE_ALIAS': 'default',
+    # Seconds a response lives; stale ones are never served regardless.
+    'TTL': 300,
+    'KEY_PREFIX': 'response',
+    # Renderer formats whose output is cached; the browsable API embeds
+    # per-request markup and is left out.
+    'FORMATS': (
+        'json',
+    ),
+}
+
+
+def get_config():
+    """Return the response cache settings merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'RESPONSE_CACHE', {})}
+
+
+def request_digest(request, *extra):
+    """Hash what identifies a representation: path, params and format."""
+    params = urlencode(sorted(request.query_params.lists()), doseq=True)
+    parts = (
+        f'{request.path}?{params}',
+        request.accepted_renderer.format,
+        *map(str, extra),
+    )
+
+    return sha256('|'.join(parts).encode()).hexdigest()
+
+
+class ResponseCache:
+    """Rendered responses keyed by user, user version and request.
+
+    Every write to the data of a user bumps its version, which orphans all
+    of the cached responses of the user at once; they simply expire.
+    """
+
+    @property
+    def cache(self):
+        """The configured cache backend."""
+        return caches[get_config()['CACHE_ALIAS']]
+
+    def get_version(self, user_id):
+        """Return the current version of the data of a user."""
+        key = self._version_key(user_id)
+        version = self.cache.get(key)
+        if version is None:
+            # Start from the clock so that a lost version never goes back
+            # to a number that was already used.
+            self.cache.add(key, int(time() * 1000), None)
+            version = self.cache.get(key)
+
+        return version
+
+    def bump(self, user_id):
+        """Invalidate every cached response of a user."""
+        key = self._version_key(user_id)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, int(time() * 1000), None)
+
+    def invalidate(self, user_id):
+        """Bump the version now and again once the transaction commits.
+
+        The second bump drops whatever was cached from a concurrent read
+        of the data before the commit made the changes visible.
+        """
+        self.bump(user_id)
+
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(lambda: self.bump(user_id))
+
+    def get_key(self, request, *extra):
+        """Return the cache key of a request, None if it is not cached.
+
+        ``extra`` values, e.g. a validator of the data, are part of the
+        key.
+        """
+        config = get_config()
+        if request.accepted_renderer.format not in config['FORMATS']:
+            return None
+
+        user_id = request.user.pk
+        return ':'.join((
+            config['KEY_PREFIX'],
+            str(user_id),
+            str(self.get_version(user_id)),
+            request_digest(request, *extra),
+        ))
+
+    def get(self, key):
+        """Return a cached response or None."""
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+
+        content, content_type = entry
+        return HttpResponse(content, content_type=content_type)
+
+    def set(self, key, response):
+        """Store the rendered bytes of a successful response."""
+        if response.status_code != 200:
+            return
+
+        self.cache.set(
+            key,
+            (response.content, response['Content-Type']),
+            get_config()['TTL'],
+        )
+
+    def _version_key(self, user_id):
+        """Key of the version of a user."""
+        return f'{get_config()["KEY_PREFIX"]}:version:{user_id}'
+
+
+response_cache = ResponseCache()
+
+
+class CachedListMixin:
+    """Serve the list action from the response cache.
+
+    Behind ``ConditionalListMixin`` the validator of the list is part of
+    the key, so a body cached for other data is never served, whether or
+    not the version bump reached the cache: per-process caches only see
+    the writes of their own process.
+    """
+
+    def list(self, request, *args, **kwargs):
+        """Return the cached response, or render and cache it."""
+        key = response_cache.get_key(
+            request,
+            getattr(self, 'list_validator', ''),
+        )
+        if key is not None:
+            cached = response_cache.get(key)
+            if cached is not None:
+                return cached
+
+        response = super().list(request, *args, **kwargs)
+
+        if key is not None:
+            response.add_post_render_callback(
+                lambda rendered: response_cache.set(key, rendered),
+            )
+
+        return response
+
+
+class ConditionalListMixin:
+    """Answer conditional GETs of lists before any row is loaded.
+
+    Lists are validated by the latest ``updated_at`` and the row count of
+    their querysets, one aggregate each: an update moves the former and a
+    delete changes the latter.
+    """
+
+    def get_validator_querysets(self):
+        """Return the querysets whose changes change the list."""
+        return [
+            self.filter_queryset(self.get_queryset()),
+        ]
+
+    def list(self, request, *args, **kwargs):
+        """Return 304 if the list is unchanged."""
+        stats = [
+            qs.order_by().aggregate(
+                updated_at=Max('updated_at'),
+                count=Count('pk'),
+            )
+            for qs in self.get_validator_querysets()
+        ]
+        etag = quote_etag(request_digest(request, request.user.pk, *(
+            f'{s["updated_at"] and s["updated_at"].isoformat()}/{s["count"]}'
+            for s in stats
+        )))
+        # Keys the cached body to the data it shows, see CachedListMixin.
+        self.list_validator = etag
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+
+        response['ETag'] = etag
+        return response
+
+
+class ConditionalMixin(ConditionalListMixin):
+    """Answer conditional GETs of lists and single objects.
+
+    Single objects are validated by their own ``updated_at``, which is
+    also sent as ``Last-Modified``.
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        """Return 304 if the object is unchanged."""
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(
+            self.get_queryset().prefetch_related(None).values('updated_at'),
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        updated_at = row['updated_at']
+        etag = quote_etag(request_digest(
+            request,
+            request.user.pk,
+            updated_at.isoformat(),
+        ))
+        last_modified = int(updated_at.timestamp())
+
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified,
+        )
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
@@ -0,0 +1,157 @@
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from core.bench import SCENARIOS, Fixture, compare, run_scenario, start_server
+from core.models import Ingredient, Recipe, Tag
+
+
+class Command(BaseCommand):
+    """Benchmark the API hot paths against seeded users.
+
+    Seed the database with seed_data first. The project is served from
+    this process, which counts the queries of each request, unless --url
+    points to another server.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            default=None,
+            help='Server to benchmark, in-process by default.',
+        )
+        parser.add_argument(
+            '--scenarios',
+            default=','.join(SCENARIOS),
+            help=f'Comma separated, among: {", ".join(SCENARIOS)}.',
+        )
+        parser.add_argument(
+            '--requests',
+            default=200,
+            type=int,
+            help='Requests per scenario.',
+        )
+        parser.add_argument(
+            '--concurrency',
+            default=8,
+            type=int,
+            help='Clients sending requests at the same time.',
+        )
+        parser.add_argument(
+            '--email-prefix',
+            default='seed',
+            help='Prefix of the seeded users to play.',
+        )
+        parser.add_argument(
+            '--password',
+            default='password',
+            help='Password of the seeded users.',
+        )
+        parser.add_argument(
+            '--output',
+            default=None,
+            help='JSON file the results are written to, stdout by default.',
+        )
+        parser.add_argument(
+            '--baseline',
+            default=None,
+            help='JSON results to compare with; regressions fail.',
+        )
+        parser.add_argument(
+            '--tolerance',
+            default=0.2,
+            type=float,
+            help='Fraction latency and throughput may worsen by.',
+        )
+
+    def handle(self, *args, **options):
+        scenarios = [s for s in options['scenarios'].split(',') if s]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {", ".join(unknown)}.')
+
+        fixtures = self.get_fixtures(options)
+
+        server, url = None, options['url']
+        if url is None:
+            server, url = start_server()
+
+        results = {
+            'meta': {
+                'started': datetime.now().isoformat(timespec='seconds'),
+                'url': options['url'] or 'in-process',
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'debug': settings.DEBUG,
+            },
+            'scenarios': {},
+        }
+        try:
+            for scenario in scenarios:
+                results['scenarios'][scenario] = run_scenario(
+                    url,
+                    scenario,
+                    fixtures,
+                    options['requests'],
+                    options['concurrency'],
+                )
+                self.stderr.write(
+                    f'{scenario}: '
+                    f'{json.dumps(results["scenarios"][scenario])}'
+                )
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        else:
+            self.stdout.write(output)
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = compare(results, baseline, options['tolerance'])
+            if regressions:
+                raise CommandError(
+                    'Regressions:\n' + '\n'.join(regressions),
+                )
+            self.stderr.write(self.style.SUCCESS('No regressions.'))
+
+    def get_fixtures(self, options):
+        """Load the token, recipes, tags and ingredients of the users."""
+        tokens = Token.objects.filter(
+            user__email__startswith=f'{options["email_prefix"]}-',
+        ).select_related('user').order_by('user_id')[:options['concurrency']]
+
+        fixtures = []
+        for token in tokens:
+            user = token.user
+            ids = {
+                model: list(model.objects.filter(user=user).order_by(
+                    'id',
+                ).values_list('id', flat=True)[:100])
+                for model in (Recipe, Tag, Ingredient)
+            }
+            fixtures.append(Fixture(
+                user.email,
+                options['password'],
+                token.key,
+                ids[Recipe],
+                ids[Tag],
+                ids[Ingredient],
+            ))
+
+        if not fixtures:
+            raise CommandError(
+                f'No users named {options["email_prefix"]}-<n> with a '
+                f'token, run seed_data first.'
+            )
+
+        return fixtures
@@ -0,0 +1,50 @@
+from time import monotonic
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+
+from core.models import Recipe
+from core.search import update_search_vector_range
+
+
+class Command(BaseCommand):
+    """Backfill or rebuild the recipe search vectors in batches."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            default=5000,
+            type=int,
+            help='Recipes updated per statement.',
+        )
+        parser.add_argument(
+            '--start-id',
+            default=None,
+            type=int,
+            help='Resume from this recipe id.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        bounds = Recipe.objects.aggregate(first=Min('id'), last=Max('id'))
+
+        if bounds['last'] is None:
+            self.stdout.write('No recipes to index.')
+            return
+
+        start = options['start_id'] or bounds['first']
+        started = monotonic()
+        total = 0
+
+        # Each batch commits on its own, so a long rebuild doesn't hold
+        # locks on the whole table and can be resumed with --start-id.
+        while start <= bounds['last']:
+            stop = start + batch_size
+            total += update_search_vector_range(start, stop)
+            self.stdout.write(f'Indexed recipes up to id {stop - 1}.')
+            start = stop
+
+        elapsed = monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {total} recipes in {elapsed:.1f}s.'
+        ))
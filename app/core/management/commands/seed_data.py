@@ -0,0 +1,370 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import StringIO
+from random import Random
+from time import monotonic
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.utils.timezone import now
+from rest_framework.authtoken.models import Token
+
+from core.search import update_search_vectors
+
+WORDS = (
+    'apple', 'basil', 'bean', 'beef', 'berry', 'bread', 'butter', 'cake',
+    'carrot', 'cheese', 'chicken', 'chili', 'chocolate', 'cinnamon',
+    'coconut', 'corn', 'cream', 'curry', 'egg', 'garlic', 'ginger', 'honey',
+    'lemon', 'lentil', 'lime', 'mango', 'mint', 'mushroom', 'noodle', 'oat',
+    'onion', 'orange', 'pasta', 'peanut', 'pepper', 'pie', 'pork', 'potato',
+    'pumpkin', 'rice', 'salad', 'salmon', 'soup', 'spinach', 'stew',
+    'sugar', 'tofu', 'tomato', 'vanilla', 'walnut',
+)
+
+STYLES = (
+    'baked', 'braised', 'creamy', 'crispy', 'easy', 'fried', 'grilled',
+    'quick', 'roasted', 'smoked', 'spicy', 'steamed', 'sweet', 'vegan',
+)
+
+DISTRIBUTIONS = (
+    'fixed',
+    'uniform',
+    'exponential',
+)
+
+
+def object_name(index):
+    """Name of the ``index``-th tag or ingredient of a user, unique."""
+    word = WORDS[index % len(WORDS)]
+    return word if index < len(WORDS) else f'{word} {index // len(WORDS)}'
+
+
+COLUMNS = {
+    'core_user': (
+        'id', 'password', 'last_login', 'is_superuser', 'email', 'name',
+        'is_active', 'is_staff',
+    ),
+    'authtoken_token': ('key', 'created', 'user_id'),
+    'core_changesequence': ('user_id', 'last'),
+    'core_tag': ('id', 'name', 'user_id', 'change_seq', 'updated_at'),
+    'core_ingredient': ('id', 'name', 'user_id', 'change_seq', 'updated_at'),
+    'core_recipe': (
+        'id', 'user_id', 'title', 'time_minutes', 'price', 'link',
+        'image_status', 'change_seq', 'updated_at',
+    ),
+    'core_recipe_tags': ('recipe_id', 'tag_id'),
+    'core_recipe_ingredients': ('recipe_id', 'ingredient_id'),
+}
+
+
+def reserve_ids(table, count):
+    """Take ``count`` ids from the sequence of a table."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT nextval(pg_get_serial_sequence(%s, %s)) '
+            'FROM generate_series(1, %s)',
+            [table, 'id', count],
+        )
+        return [pk for pk, in cursor.fetchall()]
+
+
+class Seeder:
+    """Generate and write one batch of users, in one transaction.
+
+    The generator is seeded by the seed and the first user of the batch,
+    so a batch is the same whichever process writes it.
+    """
+
+    def __init__(self, config, start, stop):
+        self.config = config
+        self.start = start
+        self.stop = stop
+        self.rng = Random(f'{config["seed"]}-{start}')
+        # Filled in the order of COLUMNS, which respects the foreign keys.
+        self.tables = {table: StringIO() for table in COLUMNS}
+        self.rows = 0
+
+    def run(self):
+        """Write the batch, return the number of rows."""
+        with transaction.atomic():
+            recipe_ids = self.generate()
+
+            with connection.cursor() as cursor:
+                for table, buffer in self.tables.items():
+                    buffer.seek(0)
+                    cursor.copy_expert(
+                        f'COPY {table} ({", ".join(COLUMNS[table])}) '
+                        f'FROM STDIN',
+                        buffer,
+                    )
+
+            if not self.config['skip_search_index']:
+                update_search_vectors(recipe_ids)
+
+        return self.rows
+
+    def write(self, table, *values):
+        """Add a row in the text format of COPY.
+
+        The generated values hold no tabs, newlines or backslashes.
+        """
+        buffer = self.tables[table]
+        buffer.write('\t'.join(map(str, values)))
+        buffer.write('\n')
+        self.rows += 1
+
+    def draw(self, mean):
+        """Draw a count from the configured distribution."""
+        if mean <= 0:
+            return 0
+
+        distribution = self.config['distribution']
+        if distribution == 'uniform':
+            return self.rng.randint(0, round(mean * 2))
+        if distribution == 'exponential':
+            return round(self.rng.expovariate(1 / mean))
+        return round(mean)
+
+    def generate(self):
+        """Generate the rows of the batch, return the recipe ids."""
+        config = self.config
+        users = [
+            (
+                n,
+                self.draw(config['tags']),
+                self.draw(config['ingredients']),
+                self.draw(config['recipes']),
+            )
+            for n in range(self.start, self.stop)
+        ]
+        user_ids = reserve_ids('core_user', len(users))
+        tag_ids = iter(reserve_ids('core_tag', sum(u[1] for u in users)))
+        ingredient_ids = iter(reserve_ids(
+            'core_ingredient',
+            sum(u[2] for u in users),
+        ))
+        recipe_ids = reserve_ids('core_recipe', sum(u[3] for u in users))
+        recipe_iter = iter(recipe_ids)
+
+        for user_id, (n, tags, ingredients, recipes) in zip(
+            user_ids,
+            users,
+        ):
+            self.write(
+                'core_user',
+                user_id, config['password'], r'\N', 'f',
+                f'{config["email_prefix"]}-{n}@example.com', f'User {n}',
+                't', 'f',
+            )
+            self.write(
+                'authtoken_token',
+                Token().generate_key(), config['updated_at'], user_id,
+            )
+
+            seq = 0
+            owned = {}
+            for table, count, ids in (
+                ('core_tag', tags, tag_ids),
+                ('core_ingredient', ingredients, ingredient_ids),
+            ):
+                owned[table] = [next(ids) for _ in range(count)]
+                for index, pk in enumerate(owned[table]):
+                    seq += 1
+                    self.write(
+                        table,
+                        pk, object_name(index), user_id, seq,
+                        config['updated_at'],
+                    )
+
+            for _ in range(recipes):
+                seq += 1
+                pk = next(recipe_iter)
+                self.write(
+                    'core_recipe',
+                    pk, user_id, *self.recipe(), '', seq,
+                    config['updated_at'],
+                )
+                for table, related, mean in (
+                    ('core_recipe_tags', owned['core_tag'],
+                     config['tags_per_recipe']),
+                    ('core_recipe_ingredients', owned['core_ingredient'],
+                     config['ingredients_per_recipe']),
+                ):
+                    count = min(self.draw(mean), len(related))
+                    for related_id in sorted(self.rng.sample(related, count)):
+                        self.write(table, pk, related_id)
+
+            self.write('core_changesequence', user_id, seq)
+
+        return recipe_ids
+
+    def recipe(self):
+        """Return the title, time, price and link of a recipe."""
+        title = ' '.join((
+            self.rng.choice(STYLES),
+            *self.rng.sample(WORDS, self.rng.randint(1, 3)),
+        )).capitalize()
+        cents = self.rng.randint(50, 99999)
+        link = ''
+        if self.rng.random() < 0.3:
+            link = f'https://example.com/recipes/{self.rng.getrandbits(32)}'
+
+        return (
+            title,
+            self.rng.randint(5, 240),
+            f'{cents // 100}.{cents % 100:02}',
+            link,
+        )
+
+
+def seed_batch(config, start, stop):
+    """Write the users numbered ``[start, stop)``, in a worker."""
+    return Seeder(config, start, stop).run()
+
+
+class Command(BaseCommand):
+    """Generate users with recipes, tags and ingredients for benchmarks.
+
+    The rows are written with COPY, one transaction per batch of users,
+    by one or more processes. The same seed generates the same data
+    whatever the number of workers; only the ids depend on the sequences
+    of the database, and the API tokens, which are credentials, are
+    random. Every user shares the same password, hashed once.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            default=100,
+            type=int,
+            help='Users generated.',
+        )
+        parser.add_argument(
+            '--recipes',
+            default=100.0,
+            type=float,
+            help='Mean recipes per user.',
+        )
+        parser.add_argument(
+            '--tags',
+            default=20.0,
+            type=float,
+            help='Mean tags per user.',
+        )
+        parser.add_argument(
+            '--ingredients',
+            default=50.0,
+            type=float,
+            help='Mean ingredients per user.',
+        )
+        parser.add_argument(
+            '--tags-per-recipe',
+            default=3.0,
+            type=float,
+            help='Mean tags linked to a recipe.',
+        )
+        parser.add_argument(
+            '--ingredients-per-recipe',
+            default=8.0,
+            type=float,
+            help='Mean ingredients linked to a recipe.',
+        )
+        parser.add_argument(
+            '--distribution',
+            default='exponential',
+            choices=DISTRIBUTIONS,
+            help='How the counts spread around their means.',
+        )
+        parser.add_argument(
+            '--seed',
+            default=0,
+            type=int,
+            help='Seed of the generator.',
+        )
+        parser.add_argument(
+            '--email-prefix',
+            default='seed',
+            help='Users are named <prefix>-<n>@example.com.',
+        )
+        parser.add_argument(
+            '--password',
+            default='password',
+            help='Password of every user.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            default=1000,
+            type=int,
+            help='Users written per transaction.',
+        )
+        parser.add_argument(
+            '--workers',
+            default=1,
+            type=int,
+            help='Processes writing batches in parallel.',
+        )
+        parser.add_argument(
+            '--skip-search-index',
+            action='store_true',
+            help='Leave the search vectors to rebuild_search_index.',
+        )
+
+    def handle(self, *args, **options):
+        counts = ('users', 'batch_size', 'workers')
+        if min(options[count] for count in counts) < 1:
+            raise CommandError(
+                '--users, --batch-size and --workers must be positive.'
+            )
+
+        prefix = f'{options["email_prefix"]}-'
+        if get_user_model().objects.filter(email__startswith=prefix).exists():
+            raise CommandError(
+                f'Users named {prefix}<n> exist, pick another --email-prefix.'
+            )
+
+        config = {
+            **options,
+            'password': make_password(options['password']),
+            'updated_at': now().isoformat(),
+        }
+        batches = [
+            (start, min(start + options['batch_size'], options['users']))
+            for start in range(0, options['users'], options['batch_size'])
+        ]
+
+        started = monotonic()
+        users = total = 0
+        for count, rows in self.run_batches(config, batches):
+            users += count
+            total += rows
+            rate = total / (monotonic() - started)
+            self.stdout.write(
+                f'Seeded {users} users, {total} rows ({rate:.0f}/s).'
+            )
+
+        elapsed = monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {total} rows in {elapsed:.1f}s.'
+        ))
+
+    def run_batches(self, config, batches):
+        """Yield the users and the rows of every written batch."""
+        if config['workers'] == 1:
+            for start, stop in batches:
+                yield stop - start, Seeder(config, start, stop).run()
+            return
+
+        # The workers are forked; they must not share our connections.
+        connections.close_all()
+        config = {
+            key: value for key, value in config.items()
+            if key not in ('stdout', 'stderr')
+        }
+        with ProcessPoolExecutor(config['workers']) as pool:
+            futures = {
+                pool.submit(seed_batch, config, start, stop): stop - start
+                for start, stop in batches
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
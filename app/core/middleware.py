@@ -0,0 +1,214 @@
+import json
+import logging
+from collections import Counter
+from random import random
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Fraction of the requests measured; the others run untouched.
+    'SAMPLE_RATE': 1.0,
+    # Whether measured responses carry the Server-Timing header.
+    'HEADER': True,
+    # Times a statement may run in a request before it's reported as
+    # repeated, the mark of an N+1 query.
+    'REPEATED_THRESHOLD': 5,
+    # Repeated statements listed in the log line, most frequent first.
+    'REPEATED_LIMIT': 5,
+}
+
+
+def get_config():
+    """Return the request timing settings merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'REQUEST_TIMING', {})}
+
+
+def milliseconds(seconds):
+    """Round a duration to hundredths of milliseconds."""
+    return round(seconds * 1000, 2)
+
+
+class QueryRecorder:
+    """Database wrapper timing the statements of a request.
+
+    Statements are counted by their SQL before the parameters are bound,
+    so the same query run for every row of a list adds up.
+    """
+
+    def __init__(self):
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += perf_counter() - started
+            self.statements[sql] += 1
+
+    @property
+    def count(self):
+        """Number of statements run."""
+        return sum(self.statements.values())
+
+    def repeated(self, threshold):
+        """Return the statements run at least ``threshold`` times."""
+        return [
+            (sql, count)
+            for sql, count in self.statements.most_common()
+            if count >= threshold
+        ]
+
+
+class RequestTiming:
+    """Where the time of one request goes."""
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.queries = QueryRecorder()
+        self.marks = {}
+
+    def mark(self, name):
+        """Record the time and the SQL time so far under ``name``."""
+        self.marks[name] = (perf_counter(), self.queries.duration)
+
+    def between(self, start, end):
+        """Return the time and SQL time between two marks, if both set."""
+        if start not in self.marks or end not in self.marks:
+            return None, None
+
+        (started, db_started), (ended, db_ended) = (
+            self.marks[start],
+            self.marks[end],
+        )
+        return ended - started, db_ended - db_started
+
+    def metrics(self):
+        """Return the durations by name, in seconds."""
+        total = perf_counter() - self.started
+        view, view_db = self.between('view', 'view_end')
+        render, _ = self.between('render', 'render_end')
+
+        return {
+            'total': total,
+            'db': self.queries.duration,
+            # The views do little but SQL and serialization.
+            'serialize': view - view_db if view is not None else None,
+            'render': render,
+        }
+
+
+class RequestTimingMiddleware:
+    """Measure requests, report them in Server-Timing and in the log.
+
+    Each sampled request reports its total time, the time spent in SQL and
+    the number of statements, the time its view spent outside of SQL,
+    which is serialization, and the time rendering the response. The log
+    line is JSON, a warning if some statement repeated like an N+1 query
+    does. Streamed responses are logged once their content is consumed;
+    their header can only cover the time before the first chunk. File
+    responses are logged right away, so that they're still sent as files.
+
+    Place it first in MIDDLEWARE, so that it covers the others.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = get_config()
+        if random() >= config['SAMPLE_RATE']:
+            return self.get_response(request)
+
+        timing = request._timing = RequestTiming()
+        with connection.execute_wrapper(timing.queries):
+            response = self.get_response(request)
+
+        if config['HEADER']:
+            response['Server-Timing'] = self.server_timing(timing)
+
+        # Files are left to the server's wsgi.file_wrapper, which a wrapped
+        # stream would bypass; they're sent without queries anyway.
+        is_file = getattr(response, 'file_to_stream', None) is not None
+        if response.streaming and not is_file:
+            response.streaming_content = self.stream(
+                request,
+                response,
+                timing,
+                response.streaming_content,
+            )
+        else:
+            self.log(request, response, timing)
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timing = getattr(request, '_timing', None)
+        if timing is not None:
+            timing.mark('view')
+
+    def process_template_response(self, request, response):
+        timing = getattr(request, '_timing', None)
+        if timing is not None:
+            # Rendered right after the last of these hooks, ours.
+            timing.mark('view_end')
+            timing.mark('render')
+            response.add_post_render_callback(
+                lambda response: timing.mark('render_end'),
+            )
+
+        return response
+
+    def stream(self, request, response, timing, content):
+        """Yield streamed content, timing its queries, then log."""
+        try:
+            with connection.execute_wrapper(timing.queries):
+                yield from content
+        finally:
+            self.log(request, response, timing)
+
+    def server_timing(self, timing):
+        """Format the metrics measured so far as a Server-Timing value."""
+        metrics = timing.metrics()
+        entries = []
+        for name, duration in metrics.items():
+            if duration is None:
+                continue
+            entry = f'{name};dur={milliseconds(duration)}'
+            if name == 'db':
+                entry += f';desc="{timing.queries.count} queries"'
+            entries.append(entry)
+
+        return ', '.join(entries)
+
+    def log(self, request, response, timing):
+        """Log the metrics of a finished request as one JSON line."""
+        config = get_config()
+        match = request.resolver_match
+        repeated = timing.queries.repeated(config['REPEATED_THRESHOLD'])
+
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': timing.queries.count,
+            **{
+                f'{name}_ms': duration and milliseconds(duration)
+                for name, duration in timing.metrics().items()
+            },
+            'repeated': [
+                {'sql': sql, 'count': count}
+                for sql, count in repeated[:config['REPEATED_LIMIT']]
+            ],
+        }
+
+        logger.log(
+            logging.WARNING if repeated else logging.INFO,
+            json.dumps(record),
+        )
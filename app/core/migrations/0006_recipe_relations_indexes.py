@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_recipe_image'),
+    ]
+
+    operations = [
+        # The through tables are only indexed by (recipe_id, target_id);
+        # filtering recipes by tags or ingredients probes them by target.
+        migrations.RunSQL(
+            sql=(
+                'CREATE INDEX core_recipe_tags_tag_id_recipe_id_idx '
+                'ON core_recipe_tags (tag_id, recipe_id);'
+            ),
+            reverse_sql='DROP INDEX core_recipe_tags_tag_id_recipe_id_idx;',
+        ),
+        migrations.RunSQL(
+            sql=(
+                'CREATE INDEX core_recipe_ingredients_ingredient_id_recipe_id_idx '
+                'ON core_recipe_ingredients (ingredient_id, recipe_id);'
+            ),
+            reverse_sql=(
+                'DROP INDEX core_recipe_ingredients_ingredient_id_recipe_id_idx;'
+            ),
+        ),
+    ]
@@ -0,0 +1,54 @@
+from django.db import migrations
+
+# Merge the names differing only by case into the oldest object, moving
+# its recipe links over, so the unique index can be built. Foreign keys are
+# checked immediately, as pending checks forbid creating the index.
+DEDUPLICATE = '''
+SET CONSTRAINTS ALL IMMEDIATE;
+
+CREATE TEMPORARY TABLE {table}_duplicates AS
+SELECT id, keep_id FROM (
+    SELECT id, min(id) OVER (PARTITION BY user_id, lower(name)) AS keep_id
+    FROM {table}
+) AS ranked
+WHERE id <> keep_id;
+
+INSERT INTO core_recipe_{relation} (recipe_id, {column})
+SELECT DISTINCT link.recipe_id, duplicate.keep_id
+FROM core_recipe_{relation} AS link
+JOIN {table}_duplicates AS duplicate ON duplicate.id = link.{column}
+ON CONFLICT DO NOTHING;
+
+DELETE FROM core_recipe_{relation} AS link
+USING {table}_duplicates AS duplicate
+WHERE link.{column} = duplicate.id;
+
+DELETE FROM {table} AS obj
+USING {table}_duplicates AS duplicate
+WHERE obj.id = duplicate.id;
+
+DROP TABLE {table}_duplicates;
+
+CREATE UNIQUE INDEX {table}_user_id_lower_name_uniq
+ON {table} (user_id, lower(name));
+'''
+
+
+def unique_lower_names(table, relation, column):
+    """Deduplicate the names of a table and build the unique index."""
+    return migrations.RunSQL(
+        sql=DEDUPLICATE.format(table=table, relation=relation, column=column),
+        reverse_sql=f'DROP INDEX {table}_user_id_lower_name_uniq;',
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_keyset_indexes'),
+    ]
+
+    operations = [
+        unique_lower_names('core_tag', 'tags', 'tag_id'),
+        unique_lower_names('core_ingredient', 'ingredients', 'ingredient_id'),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 2.2.1 on 2026-10-17 06:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Number the existing objects of every user, so that each change number is
+# unique to one object as the sync expects, and start the sequences after
+# them. Done before the indexes are built.
+NUMBER_OBJECTS = '''
+WITH numbered AS (
+    SELECT kind, id, user_id, row_number() OVER (
+        PARTITION BY user_id ORDER BY kind, id
+    ) AS seq
+    FROM (
+        SELECT 1 AS kind, id, user_id FROM core_tag
+        UNION ALL
+        SELECT 2, id, user_id FROM core_ingredient
+        UNION ALL
+        SELECT 3, id, user_id FROM core_recipe
+    ) AS objects
+), tags AS (
+    UPDATE core_tag AS obj SET change_seq = numbered.seq
+    FROM numbered WHERE numbered.kind = 1 AND numbered.id = obj.id
+), ingredients AS (
+    UPDATE core_ingredient AS obj SET change_seq = numbered.seq
+    FROM numbered WHERE numbered.kind = 2 AND numbered.id = obj.id
+), recipes AS (
+    UPDATE core_recipe AS obj SET change_seq = numbered.seq
+    FROM numbered WHERE numbered.kind = 3 AND numbered.id = obj.id
+)
+INSERT INTO core_changesequence (user_id, last)
+SELECT user_id, max(seq) FROM numbered GROUP BY user_id;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_timestamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeSequence',
+            fields=[
+                ('user', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('last', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=32)),
+                ('object_id', models.IntegerField()),
+                ('change_seq', models.BigIntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(
+            sql=NUMBER_OBJECTS,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'change_seq'], name='core_ingr_user_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'change_seq'], name='core_recipe_user_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'change_seq'], name='core_tag_user_seq_idx'),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['user', 'change_seq'], name='core_tombstone_user_seq_idx'),
+        ),
+    ]
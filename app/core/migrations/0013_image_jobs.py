@@ -0,0 +1,44 @@
+# Generated by Django 2.2.1 on 2026-10-17 06:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Images uploaded before the processing pipeline are served as they are.
+MARK_READY = '''
+UPDATE core_recipe SET image_status = 'ready'
+WHERE image IS NOT NULL AND image <> '';
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_import_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_status',
+            field=models.CharField(blank=True, choices=[('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], max_length=16),
+        ),
+        migrations.RunSQL(
+            sql=MARK_READY,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.CreateModel(
+            name='ImageJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('staged', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('failed', 'Failed')], default='queued', max_length=16)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_jobs', to='core.Recipe')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='imagejob',
+            index=models.Index(condition=models.Q(status='queued'), fields=['id'], name='core_imagejob_queued_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.1 on 2026-10-17 07:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_recipe_image_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagejob',
+            name='digest',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
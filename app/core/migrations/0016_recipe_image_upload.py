@@ -0,0 +1,18 @@
+# Generated by Django 2.2.1 on 2026-10-17 07:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_image_job_digest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_upload',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+    ]
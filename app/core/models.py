@@ -1,3 +1,5 @@
+import threading
+from contextlib import contextmanager
 from uuid import uuid4
 from os import path
 
@@ -7,17 +9,59 @@ from django.contrib.auth.models import (
     PermissionsMixin,
 )
 from django.conf import settings
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connection, models, transaction
+
+from core.cache import response_cache
+
+
+RECIPE_IMAGE_DIR = path.join('uploads', 'recipe')
 
 
 def recipe_image_filename(instance, filename):
     """Normalize filename for an image."""
     filename = f'{uuid4()}{path.splitext(filename)[-1]}'
-    return path.join('uploads', 'recipe', filename)
+    return path.join(RECIPE_IMAGE_DIR, filename)
+
+
+_departures = threading.local()
+
+
+@contextmanager
+def departure(user_ids):
+    """Mark users as being deleted in the block, their objects along.
+
+    Their sync state is dropped with them, so the deleted objects are
+    neither recorded nor relinked one by one, see core.signals.
+    """
+    previous = getattr(_departures, 'user_ids', frozenset())
+    _departures.user_ids = previous | set(user_ids)
+    try:
+        yield
+    finally:
+        _departures.user_ids = previous
+
+
+def departing(user_id):
+    """Whether a user is being deleted."""
+    return user_id in getattr(_departures, 'user_ids', ())
+
+
+class UserQuerySet(models.QuerySet):
+
+    def delete(self):
+        """Delete the users, see ``departure()``."""
+        with departure(self.values_list('pk', flat=True)):
+            return super().delete()
 
 
 class UserManger(BaseUserManager):
 
+    def get_queryset(self):
+        """Users, deleted in bulk like one by one."""
+        return UserQuerySet(self.model, using=self._db)
+
     def create_user(self, email, password=None, **extra_fields):
         """Creates and saves a new user."""
         if not email:
@@ -41,6 +85,118 @@ class UserManger(BaseUserManager):
         return user
 
 
+class NamedObjectManager(models.Manager):
+
+    def bulk_get_or_create(self, user, names):
+        """Return the objects named ``names``, creating the missing ones.
+
+        Objects are returned once, in the order of the first occurrence
+        of their name, see ``resolve()``.
+        """
+        return list(dict.fromkeys(self.resolve(user, names).values()))
+
+    def resolve(self, user, names):
+        """Map each of ``names`` to its object, creating the missing ones.
+
+        Names are matched case-insensitively, like the unique
+        ``(user_id, lower(name))`` index, and lowered by the database, as
+        Python lowers some letters otherwise. One SELECT, and one INSERT
+        for the missing names only, so that no change number is spent on
+        a name that exists. The INSERT skips conflicts rather than relying
+        on a lock, so concurrent requests agree on the objects.
+        """
+        names = list(dict.fromkeys(names))
+        if not names:
+            return {}
+
+        with transaction.atomic(savepoint=False):
+            keys, found = self._lookup(user, names)
+            missing = {}
+            for key, name in zip(keys, names):
+                if key not in found:
+                    missing.setdefault(key, name)
+            if missing:
+                found.update(self._insert(user, missing))
+                # Names inserted by a concurrent request since the lookup.
+                raced = [n for k, n in missing.items() if k not in found]
+                if raced:
+                    found.update(self._lookup(user, raced)[1])
+                # Bulk inserts send no signals.
+                response_cache.invalidate(user.pk)
+
+        return {name: found[key] for key, name in zip(keys, names)}
+
+    def _lookup(self, user, names):
+        """Lower ``names`` and find the objects of ``user`` they name.
+
+        Return the lowered names, in order, and the found objects by
+        lowered name.
+        """
+        opts = self.model._meta
+        qn = connection.ops.quote_name
+        fields = opts.concrete_fields
+        columns = ', '.join(f'o.{qn(field.column)}' for field in fields)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT lower(n.name), {columns} '
+                f'FROM unnest(%s::text[]) WITH ORDINALITY AS n(name, i) '
+                f'LEFT JOIN {qn(opts.db_table)} AS o '
+                f'ON o.user_id = %s AND lower(o.name) = lower(n.name) '
+                f'ORDER BY n.i',
+                [names, user.pk],
+            )
+            rows = cursor.fetchall()
+
+        attnames = [field.attname for field in fields]
+        pk_index = fields.index(opts.pk)
+        keys, found = [], {}
+        for key, *values in rows:
+            keys.append(key)
+            if values[pk_index] is not None:
+                found[key] = self.model.from_db(self.db, attnames, values)
+        return keys, found
+
+    def _insert(self, user, missing):
+        """Insert ``missing`` names by lowered name, skipping conflicts.
+
+        ``ON CONFLICT DO NOTHING`` leaves the names that another request
+        inserted since the lookup to the caller. Return the inserted
+        objects by lowered name.
+        """
+        objs = [self.model(user=user, name=name) for name in missing.values()]
+        ChangeSequence.objects.assign(objs)
+
+        opts = self.model._meta
+        qn = connection.ops.quote_name
+        fields = [field for field in opts.concrete_fields
+                  if not field.primary_key]
+        row = '({})'.format(', '.join(['%s'] * len(fields)))
+        params = [
+            field.get_db_prep_save(field.pre_save(obj, True), connection)
+            for obj in objs
+            for field in fields
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {qn(opts.db_table)} '
+                f'({", ".join(qn(field.column) for field in fields)}) '
+                f'VALUES {", ".join([row] * len(objs))} '
+                f'ON CONFLICT DO NOTHING '
+                f'RETURNING {qn(opts.pk.column)}, lower(name)',
+                params,
+            )
+            pks = {key: pk for pk, key in cursor.fetchall()}
+
+        inserted = {}
+        for key, obj in zip(missing, objs):
+            if key in pks:
+                obj.pk = pks[key]
+                obj._state.adding = False
+                obj._state.db = self.db
+                inserted[key] = obj
+        return inserted
+
+
 class User(AbstractBaseUser, PermissionsMixin):
     """Custom user model with email instead of username."""
 
@@ -62,10 +218,100 @@ class User(AbstractBaseUser, PermissionsMixin):
         default=False,
     )
 
+    def delete(self, *args, **kwargs):
+        """Delete the user and its objects, see ``departure()``."""
+        with departure([self.pk]):
+            return super().delete(*args, **kwargs)
+
 
-class Tag(models.Model):
+class ChangeSequenceManager(models.Manager):
+
+    def reserve(self, user_id, count=1):
+        """Reserve the next ``count`` change numbers of a user.
+
+        The row of the user stays locked until the transaction ends, so the
+        changes of a user commit in the order of their numbers and a sync
+        never skips over one that commits late.
+        """
+        table = self.model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, last) VALUES (%s, %s) '
+                f'ON CONFLICT (user_id) DO UPDATE '
+                f'SET last = {table}.last + EXCLUDED.last '
+                f'RETURNING last',
+                [user_id, count],
+            )
+            last, = cursor.fetchone()
+
+        return range(last - count + 1, last + 1)
+
+    def assign(self, objs):
+        """Number unsaved changes of many objects, one query per user."""
+        by_user = {}
+        for obj in objs:
+            by_user.setdefault(obj.user_id, []).append(obj)
+
+        for user_id, user_objs in by_user.items():
+            seqs = self.reserve(user_id, len(user_objs))
+            for obj, seq in zip(user_objs, seqs):
+                obj.change_seq = seq
+
+
+class ChangeSequence(models.Model):
+    """The last change number handed out for the objects of a user.
+
+    Kept apart from the user so that saving a stale user instance can't
+    move it back. No database constraint: the last changes of a deleted
+    user are numbered after its row is collected, see core.signals.
+    """
+
+    objects = ChangeSequenceManager()
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        primary_key=True,
+        related_name='+',
+    )
+    last = models.BigIntegerField(
+        default=0,
+    )
+
+
+class ChangeTrackedModel(models.Model):
+    """Object numbered by the change sequence of its user on every save.
+
+    Bulk writes, which bypass ``save()``, number their objects with
+    ``ChangeSequence.objects.assign()``.
+    """
+
+    change_seq = models.BigIntegerField(
+        default=0,
+        editable=False,
+    )
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        """Take the next change number along with the write."""
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            self.change_seq, = ChangeSequence.objects.reserve(self.user_id)
+
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'change_seq'}
+
+            super().save(*args, **kwargs)
+
+
+class Tag(ChangeTrackedModel):
     """Recipe tags."""
 
+    objects = NamedObjectManager()
+
     name = models.CharField(
         max_length=255,
     )
@@ -73,15 +319,36 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-name', 'id'],
+                name='core_tag_user_name_id_idx',
+            ),
+            models.Index(
+                fields=['user', 'updated_at'],
+                name='core_tag_user_updated_idx',
+            ),
+            models.Index(
+                fields=['user', 'change_seq'],
+                name='core_tag_user_seq_idx',
+            ),
+        ]
 
     def __str__(self):
         """String representation."""
         return self.name
 
 
-class Ingredient(models.Model):
+class Ingredient(ChangeTrackedModel):
     """Recipe ingredient."""
 
+    objects = NamedObjectManager()
+
     name = models.CharField(
         max_length=255,
     )
@@ -89,15 +356,43 @@ class Ingredient(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-name', 'id'],
+                name='core_ingr_user_name_id_idx',
+            ),
+            models.Index(
+                fields=['user', 'updated_at'],
+                name='core_ingr_user_updated_idx',
+            ),
+            models.Index(
+                fields=['user', 'change_seq'],
+                name='core_ingr_user_seq_idx',
+            ),
+        ]
 
     def __str__(self):
         """String representation."""
         return self.name
 
 
-class Recipe(models.Model):
+class Recipe(ChangeTrackedModel):
     """Recipe object."""
 
+    IMAGE_PROCESSING = 'processing'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUSES = (
+        (IMAGE_PROCESSING, 'Processing'),
+        (IMAGE_READY, 'Ready'),
+        (IMAGE_FAILED, 'Failed'),
+    )
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -114,14 +409,186 @@ class Recipe(models.Model):
         max_length=255,
         blank=True,
     )
+    # Indexed to find the recipe of a file by name.
     image = models.ImageField(
         null=True,
+        db_index=True,
         upload_to=recipe_image_filename,
     )
+    # Of the processed image, which its variants never exceed; null for
+    # images processed before it was stored.
+    image_width = models.PositiveIntegerField(
+        null=True,
+        editable=False,
+    )
+    # Of the latest upload, blank if there never was one; the image stays
+    # the previous one until an upload is ready, see recipe.images.
+    image_status = models.CharField(
+        max_length=16,
+        blank=True,
+        choices=IMAGE_STATUSES,
+    )
+    # The id of the latest image job: jobs are deleted once done, so an
+    # earlier job finishing last can't tell it was superseded otherwise.
+    image_upload = models.PositiveIntegerField(
+        null=True,
+        editable=False,
+    )
 
     ingredients = models.ManyToManyField('Ingredient')
     tags = models.ManyToManyField('Tag')
 
+    # Also bumped when the links change or a linked object is renamed or
+    # deleted, see core.signals.
+    updated_at = models.DateTimeField(
+        auto_now=True,
+    )
+
+    # Title, tag and ingredient names; maintained by core.search.
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-id'],
+                name='core_recipe_user_id_idx',
+            ),
+            models.Index(
+                fields=['user', 'updated_at'],
+                name='core_recipe_user_updated_idx',
+            ),
+            models.Index(
+                fields=['user', 'change_seq'],
+                name='core_recipe_user_seq_idx',
+            ),
+            GinIndex(
+                fields=['search_vector'],
+                name='core_recipe_search_idx',
+            ),
+            GinIndex(
+                fields=['title'],
+                name='core_recipe_title_trgm_idx',
+                opclasses=['gin_trgm_ops'],
+            ),
+        ]
+
     def __str__(self):
         """Title"""
         return self.title
+
+
+class TombstoneManager(models.Manager):
+
+    def bury(self, tombstones):
+        """Number and save many tombstones, one query per user."""
+        ChangeSequence.objects.assign(tombstones)
+
+        return self.bulk_create(tombstones)
+
+
+class Tombstone(models.Model):
+    """A deleted object, reported by the delta sync of its user."""
+
+    objects = TombstoneManager()
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+    )
+    model = models.CharField(
+        max_length=32,
+    )
+    object_id = models.IntegerField()
+    change_seq = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'change_seq'],
+                name='core_tombstone_user_seq_idx',
+            ),
+        ]
+
+
+class ImageJob(models.Model):
+    """An uploaded recipe image waiting in the staging area.
+
+    Workers claim queued jobs with ``SELECT ... FOR UPDATE SKIP LOCKED``
+    and hold the lock while processing, so the job of a dead worker is
+    simply claimed again. Processed jobs are deleted, failed ones kept.
+    """
+
+    QUEUED = 'queued'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'Queued'),
+        (FAILED, 'Failed'),
+    )
+
+    recipe = models.ForeignKey(
+        'Recipe',
+        on_delete=models.CASCADE,
+        related_name='image_jobs',
+    )
+    # Storage name of the upload, as received.
+    staged = models.CharField(
+        max_length=255,
+    )
+    # Hex SHA-256 of the upload, which names its processed image.
+    digest = models.CharField(
+        max_length=64,
+        blank=True,
+    )
+    status = models.CharField(
+        max_length=16,
+        choices=STATUSES,
+        default=QUEUED,
+    )
+    error = models.TextField(
+        blank=True,
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['id'],
+                name='core_imagejob_queued_idx',
+                condition=models.Q(status='queued'),
+            ),
+        ]
+
+
+class ImportCheckpoint(models.Model):
+    """How many records of a source were imported for a user.
+
+    Saved in the transaction of each imported batch, so an interrupted
+    import resumes right after the last committed batch.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    source = models.CharField(
+        max_length=255,
+    )
+    position = models.BigIntegerField(
+        default=0,
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+    )
+
+    class Meta:
+        unique_together = (
+            ('user', 'source'),
+        )
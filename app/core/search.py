@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramSimilarity,
+)
+from django.db import connection
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast
+
+# Titles weigh more than the names of tags and ingredients.
+UPDATE_SQL = '''
+UPDATE core_recipe AS recipe SET search_vector =
+    setweight(to_tsvector(%(config)s::regconfig, recipe.title), 'A')
+    || setweight(to_tsvector(%(config)s::regconfig, coalesce((
+        SELECT string_agg(tag.name, ' ')
+        FROM core_tag AS tag
+        JOIN core_recipe_tags AS link ON link.tag_id = tag.id
+        WHERE link.recipe_id = recipe.id
+    ), '')), 'B')
+    || setweight(to_tsvector(%(config)s::regconfig, coalesce((
+        SELECT string_agg(ingredient.name, ' ')
+        FROM core_ingredient AS ingredient
+        JOIN core_recipe_ingredients AS link
+            ON link.ingredient_id = ingredient.id
+        WHERE link.recipe_id = recipe.id
+    ), '')), 'B')
+WHERE {where}
+'''
+
+
+def _update(where, params):
+    """Recompute the search vectors of the recipes matching ``where``."""
+    params['config'] = settings.SEARCH_CONFIG
+    with connection.cursor() as cursor:
+        cursor.execute(UPDATE_SQL.format(where=where), params)
+        return cursor.rowcount
+
+
+def update_search_vectors(recipe_ids):
+    """Recompute the search vectors of the given recipes."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return 0
+
+    return _update('recipe.id = ANY(%(ids)s)', {'ids': recipe_ids})
+
+
+def update_search_vector_range(start, stop):
+    """Recompute the search vectors of the recipes in ``[start, stop)``."""
+    return _update(
+        'recipe.id >= %(start)s AND recipe.id < %(stop)s',
+        {'start': start, 'stop': stop},
+    )
+
+
+def search_recipes(qs, term):
+    """Match recipes by words or by a fuzzy title, annotating a rank.
+
+    Words are looked up in the ``search_vector`` GIN index; typos in the
+    title are caught by the trigram index. NUL characters, which
+    PostgreSQL text can't hold, are dropped.
+    """
+    term = term.replace('\x00', '')
+    query = SearchQuery(term, config=settings.SEARCH_CONFIG)
+
+    # Both scores are ``real``; a double precision rank survives the round
+    # trip through a keyset cursor unchanged.
+    rank = Cast(
+        SearchRank(F('search_vector'), query)
+        + TrigramSimilarity('title', term),
+        FloatField(),
+    )
+
+    return qs.annotate(rank=rank).filter(
+        Q(search_vector=query) | Q(title__trigram_similar=term),
+    )
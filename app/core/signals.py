@@ -0,0 +1,246 @@
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+from django.utils.timezone import now
+from rest_framework.authtoken.models import Token
+
+from core.authentication import token_cache
+from core.cache import response_cache
+from core.models import (
+    ChangeSequence,
+    Ingredient,
+    Recipe,
+    Tag,
+    Tombstone,
+    departing,
+)
+from core.search import update_search_vectors
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_tokens(sender, instance, **kwargs):
+    """Drop cached tokens of a changed (e.g. deactivated) user."""
+    keys = Token.objects.filter(user_id=instance.pk).values_list(
+        'key',
+        flat=True,
+    )
+    token_cache.delete(*keys)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    """Drop a revoked token, including when its user is deleted."""
+    token_cache.delete(instance.key)
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(sender, instance, update_fields=None, **kwargs):
+    """Index a saved recipe unless its title is known to be unchanged."""
+    saved = getattr(_relinks, 'saved', None)
+    if saved is not None:
+        saved.add(instance.pk)
+
+    if update_fields is None or 'title' in update_fields:
+        indexed = getattr(_relinks, 'indexed', None)
+        if indexed is None:
+            update_search_vectors([instance.pk])
+        else:
+            indexed.add(instance.pk)
+
+
+def linked_recipes_changed(user_id, recipe_ids):
+    """Reindex and touch recipes whose tags or ingredients changed."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+
+    update_search_vectors(recipe_ids)
+    touch_recipes(user_id, recipe_ids)
+
+
+def touch_recipes(user_id, recipe_ids):
+    """Bump the timestamps and the change numbers of recipes."""
+    if not recipe_ids:
+        return
+
+    updated_at = now()
+    recipes = [
+        Recipe(pk=pk, user_id=user_id, updated_at=updated_at)
+        for pk in recipe_ids
+    ]
+    ChangeSequence.objects.assign(recipes)
+    Recipe.objects.bulk_update(recipes, ['updated_at', 'change_seq'])
+
+
+_relinks = threading.local()
+
+
+@contextmanager
+def deferred_relinks():
+    """Handle the recipes saved or relinked in the block once, at its end.
+
+    Syncing a relation sends ``m2m_changed`` for the removed links, then
+    for the added ones, and saving the recipe sends ``post_save``; without
+    this each reindexes the recipe and reserves change numbers of its own.
+    Recipes saved in the block already have their number.
+    """
+    if getattr(_relinks, 'recipes', None) is not None:
+        yield
+        return
+
+    _relinks.recipes, _relinks.indexed, _relinks.saved = {}, set(), set()
+    try:
+        yield
+        indexed = set(_relinks.indexed)
+        for recipe_ids in _relinks.recipes.values():
+            indexed.update(recipe_ids)
+        update_search_vectors(indexed)
+
+        for user_id, recipe_ids in _relinks.recipes.items():
+            touch_recipes(user_id, [
+                pk for pk in recipe_ids if pk not in _relinks.saved
+            ])
+    finally:
+        _relinks.recipes = _relinks.indexed = _relinks.saved = None
+
+
+def relinked(user_id, recipe_ids):
+    """Handle relinked recipes now, or at the end of a deferral."""
+    recipes = getattr(_relinks, 'recipes', None)
+    if recipes is None:
+        linked_recipes_changed(user_id, recipe_ids)
+    else:
+        recipes.setdefault(user_id, {}).update(dict.fromkeys(recipe_ids))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def relink_recipes(sender, instance, action, reverse, pk_set, **kwargs):
+    """Handle recipes whose tags or ingredients were relinked."""
+    if action == 'pre_clear' and reverse:
+        instance._linked_recipe_ids = list(
+            instance.recipe_set.values_list('pk', flat=True),
+        )
+    elif action in ('post_add', 'post_remove'):
+        relinked(
+            instance.user_id,
+            pk_set if reverse else [instance.pk],
+        )
+    elif action == 'post_clear':
+        relinked(
+            instance.user_id,
+            getattr(instance, '_linked_recipe_ids', [])
+            if reverse else [instance.pk],
+        )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def rename_linked(sender, instance, created, **kwargs):
+    """Handle the recipes of a renamed tag or ingredient."""
+    if not created:
+        linked_recipes_changed(
+            instance.user_id,
+            instance.recipe_set.values_list('pk', flat=True),
+        )
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def collect_linked(sender, instance, **kwargs):
+    """Remember the recipes of a tag or ingredient about to be deleted."""
+    if departing(instance.user_id):
+        return
+
+    instance._linked_recipe_ids = list(
+        instance.recipe_set.values_list('pk', flat=True),
+    )
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def delete_linked(sender, instance, **kwargs):
+    """Handle the recipes of a deleted tag or ingredient."""
+    if departing(instance.user_id):
+        return
+
+    linked_recipes_changed(
+        instance.user_id,
+        getattr(instance, '_linked_recipe_ids', []),
+    )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+def invalidate_responses(sender, instance, **kwargs):
+    """Drop the cached responses of the owner of a written object."""
+    response_cache.invalidate(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_linked_responses(sender, instance, action, **kwargs):
+    """Drop the cached responses of the owner of relinked recipes."""
+    if action.startswith('post_'):
+        response_cache.invalidate(instance.user_id)
+
+
+_burials = threading.local()
+
+
+@contextmanager
+def deferred_burials():
+    """Record the objects deleted in the block at its end, in bulk.
+
+    Deleting a queryset sends ``post_delete`` for every object; without
+    this each one reserves its own change number and tombstone.
+    """
+    if getattr(_burials, 'tombstones', None) is not None:
+        yield
+        return
+
+    _burials.tombstones = []
+    try:
+        yield
+        Tombstone.objects.bury(_burials.tombstones)
+    finally:
+        _burials.tombstones = None
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+def bury(sender, instance, **kwargs):
+    """Record a deleted object for the delta sync."""
+    if departing(instance.user_id):
+        return
+
+    tombstone = Tombstone(
+        user_id=instance.user_id,
+        model=sender._meta.model_name,
+        object_id=instance.pk,
+    )
+    tombstones = getattr(_burials, 'tombstones', None)
+    if tombstones is None:
+        Tombstone.objects.bury([tombstone])
+    else:
+        tombstones.append(tombstone)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def forget_changes(sender, instance, **kwargs):
+    """Drop the sync state of a deleted user, written up to its deletion."""
+    Tombstone.objects.filter(user_id=instance.pk).delete()
+    ChangeSequence.objects.filter(user_id=instance.pk).delete()
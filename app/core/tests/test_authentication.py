@@ -0,0 +1,139 @@
+from django.contrib.auth import get_user_model
+from django.shortcuts import reverse
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import LRUCache, token_cache
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test the cached token authentication."""
+
+    def setUp(self):
+        token_cache.clear()
+
+        self.user = get_user_model().objects.create_user(
+            email='j@j.com',
+            password='123qwerty',
+            name='Guido',
+        )
+        self.token = Token.objects.create(user=self.user)
+
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def tearDown(self):
+        token_cache.clear()
+
+    def test_token_cached(self):
+        """Test the token query runs once."""
+        with self.assertNumQueries(1):
+            res = self.client.get(reverse('user:me'))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(reverse('user:me'))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['name'], self.user.name)
+
+        stats = token_cache.stats()['local']
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+
+    @override_settings(TOKEN_AUTH_CACHE={'CACHE_ALIAS': 'default'})
+    def test_password_not_cached(self):
+        """Test the password hash is left out and can still be changed."""
+        self.client.get(reverse('user:me'))
+
+        self.assertNotIn(self.user.password, token_cache.get(self.token.key))
+
+        res = self.client.patch(reverse('user:me'), {'password': 'newpass1'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('newpass1'))
+        self.assertEqual(self.user.name, 'Guido')
+
+    def test_invalid_token(self):
+        """Test an unknown token is rejected."""
+        self.client.credentials(HTTP_AUTHORIZATION='Token unknown')
+
+        res = self.client.get(reverse('user:me'))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_invalidated(self):
+        """Test deactivating a user drops the cached token."""
+        self.client.get(reverse('user:me'))
+
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(reverse('user:me'))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_user_invalidated(self):
+        """Test deleting a user drops the cached token."""
+        self.client.get(reverse('user:me'))
+
+        self.user.delete()
+
+        res = self.client.get(reverse('user:me'))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_rekeyed_token_invalidated(self):
+        """Test replacing a token drops the old one."""
+        self.client.get(reverse('user:me'))
+
+        self.token.delete()
+        Token.objects.create(user=self.user)
+
+        res = self.client.get(reverse('user:me'))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(TOKEN_AUTH_CACHE={'CACHE_ALIAS': 'default'})
+    def test_shared_layer(self):
+        """Test another process finds the token in the shared layer."""
+        self.client.get(reverse('user:me'))
+
+        # Simulate a cold process.
+        token_cache.local.clear()
+
+        with self.assertNumQueries(0):
+            res = self.client.get(reverse('user:me'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(token_cache.stats()['shared']['hits'], 1)
+
+
+class LRUCacheTests(TestCase):
+    """Test the bounded in-process layer."""
+
+    def test_memory_cap(self):
+        """Test the least recently used entries are evicted."""
+        cache = LRUCache()
+        max_bytes = 2000
+
+        for n in range(20):
+            cache.set(f'key{n}', ('x' * 100,), ttl=60, max_bytes=max_bytes)
+            cache.get('key0')
+
+        stats = cache.stats()
+        self.assertLessEqual(stats['bytes'], max_bytes)
+        self.assertGreater(stats['evictions'], 0)
+        self.assertIsNotNone(cache.get('key0'))
+        self.assertIsNone(cache.get('key1'))
+
+    def test_expired(self):
+        """Test expired entries are misses."""
+        cache = LRUCache()
+
+        cache.set('key', ('value',), ttl=-1, max_bytes=2000)
+
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.stats()['entries'], 0)
@@ -0,0 +1,101 @@
+from django.contrib.auth import get_user_model
+from django.test import (
+    SimpleTestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from rest_framework.authtoken.models import Token
+
+from core.bench import (
+    Fixture,
+    compare,
+    percentile,
+    run_scenario,
+    start_server,
+    summarize,
+)
+from core.models import Recipe
+
+
+class BenchStatsTests(SimpleTestCase):
+    """Test the statistics and the baseline comparison."""
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles."""
+        values = list(range(1, 101))
+
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([7], 0.95), 7)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_summarize(self):
+        """Test a scenario summary."""
+        summary = summarize(
+            [(0.010, 200, 3), (0.030, 200, 5), (0.020, 500, 4)],
+            elapsed=0.5,
+        )
+
+        self.assertEqual(summary['requests'], 3)
+        self.assertEqual(summary['errors'], 1)
+        self.assertEqual(summary['rps'], 6.0)
+        self.assertEqual(summary['latency_ms']['p50'], 20.0)
+        self.assertEqual(summary['latency_ms']['max'], 30.0)
+        self.assertEqual(summary['queries'], {'mean': 4.0, 'max': 5})
+
+    def test_compare(self):
+        """Test regressions beyond the tolerance are reported."""
+        def results(p95, rps, queries, errors=0):
+            return {'scenarios': {'list': {
+                'latency_ms': {'p95': p95},
+                'rps': rps,
+                'queries': {'max': queries},
+                'errors': errors,
+            }}}
+
+        baseline = results(100, 50, 3)
+
+        self.assertEqual(compare(results(110, 45, 3), baseline, 0.2), [])
+        self.assertEqual(len(compare(results(130, 50, 3), baseline, 0.2)), 1)
+        self.assertEqual(len(compare(results(100, 30, 3), baseline, 0.2)), 1)
+        self.assertEqual(len(compare(results(100, 50, 4), baseline, 0.2)), 1)
+        self.assertEqual(
+            len(compare(results(100, 50, 3, 1), baseline, 0.2)),
+            1,
+        )
+
+
+# The test runner only allows the test client's host.
+@override_settings(ALLOWED_HOSTS=['127.0.0.1'])
+class BenchRunTests(TransactionTestCase):
+    """Test running scenarios against the in-process server."""
+
+    def test_run(self):
+        """Test requests are timed and their queries counted."""
+        user = get_user_model().objects.create_user('j@j.com', 'password')
+        token = Token.objects.create(user=user)
+        recipe = Recipe.objects.create(
+            user=user,
+            title='Cheesecake',
+            time_minutes=10,
+            price=5,
+        )
+        fixture = Fixture(
+            user.email,
+            'password',
+            token.key,
+            [recipe.id],
+            [],
+            [],
+        )
+
+        server, url = start_server()
+        try:
+            summary = run_scenario(url, 'recipe-detail', [fixture], 4, 2)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual(summary['requests'], 4)
+        self.assertEqual(summary['errors'], 0)
+        self.assertGreater(summary['queries']['max'], 0)
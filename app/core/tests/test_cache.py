@@ -0,0 +1,242 @@
+from django.contrib.auth import get_user_model
+from django.shortcuts import reverse
+from django.test import TestCase
+from django.utils.timezone import now
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from core.tests.utils import ClearResponseCacheMixin
+
+
+class ResponseCacheTests(ClearResponseCacheMixin, TestCase):
+    """Test the cached list responses."""
+
+    def setUp(self):
+        super().setUp()
+
+        self.user = get_user_model().objects.create_user(
+            email='j@j.com',
+            password='123qwerty',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Cheesecake',
+            time_minutes=10,
+            price=5,
+        )
+        self.tag = Tag.objects.create(user=self.user, name='Dessert')
+
+    def test_list_cached(self):
+        """Test a repeated list runs no queries."""
+        url = reverse('recipe:recipe-list')
+        first = self.client.get(url)
+
+        # Only the validator aggregate.
+        with self.assertNumQueries(1):
+            second = self.client.get(url)
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['Content-Type'], first['Content-Type'])
+
+    def test_missed_invalidation(self):
+        """Test a write whose version bump was missed isn't served stale."""
+        url = reverse('recipe:tag-list')
+        self.client.get(url)
+
+        # Bumps nothing, like a write in a process with another cache.
+        Tag.objects.filter(pk=self.tag.pk).update(
+            name='Sweets',
+            updated_at=now(),
+        )
+        res = self.client.get(url)
+
+        self.assertEqual(res.data['results'][0]['name'], 'Sweets')
+
+    def test_params_normalized(self):
+        """Test the order of the query params doesn't matter."""
+        url = reverse('recipe:recipe-list')
+        self.client.get(f'{url}?page_size=5&tags={self.tag.id}')
+
+        with self.assertNumQueries(1):
+            self.client.get(f'{url}?tags={self.tag.id}&page_size=5')
+
+        # Different params are a different response.
+        res = self.client.get(f'{url}?page_size=4')
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_invalidated_by_save_and_delete(self):
+        """Test writes to any list are visible right away."""
+        url = reverse('recipe:tag-list')
+        self.client.get(url)
+
+        Tag.objects.create(user=self.user, name='Vegan')
+        res = self.client.get(url)
+        self.assertEqual(len(res.data['results']), 2)
+
+        self.tag.delete()
+        res = self.client.get(url)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_invalidated_by_links(self):
+        """Test relinking recipes is visible right away."""
+        url = reverse('recipe:recipe-list')
+        self.client.get(url)
+
+        self.recipe.tags.add(self.tag)
+
+        res = self.client.get(url)
+        self.assertEqual(res.data['results'][0]['tags'], [self.tag.id])
+
+    def test_invalidated_by_bulk_writes(self):
+        """Test bulk endpoints, which send no signals, invalidate too."""
+        url = reverse('recipe:ingredient-list')
+        self.client.get(url)
+
+        self.client.post(
+            reverse('recipe:ingredient-bulk'),
+            ['Salt', 'Sugar'],
+            format='json',
+        )
+
+        res = self.client.get(url)
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_limited_to_user(self):
+        """Test users never share cached responses."""
+        url = reverse('recipe:recipe-list')
+        self.client.get(url)
+
+        other = get_user_model().objects.create_user(
+            email='g@g.com',
+            password='123qwerty',
+        )
+        self.client.force_authenticate(other)
+
+        res = self.client.get(url)
+        self.assertEqual(res.data['results'], [])
+
+    def test_browsable_api_not_cached(self):
+        """Test only the configured formats are cached."""
+        Ingredient.objects.create(user=self.user, name='Salt')
+        url = reverse('recipe:ingredient-list')
+        self.client.get(url, {'format': 'api'})
+
+        res = self.client.get(url, {'format': 'api'})
+
+        # Cached responses are plain, without the serialized data.
+        self.assertTrue(hasattr(res, 'data'))
+
+
+class ConditionalGetTests(ClearResponseCacheMixin, TestCase):
+    """Test the ETag and Last-Modified validators."""
+
+    def setUp(self):
+        super().setUp()
+
+        self.user = get_user_model().objects.create_user(
+            email='j@j.com',
+            password='123qwerty',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Cheesecake',
+            time_minutes=10,
+            price=5,
+        )
+        self.tag = Tag.objects.create(user=self.user, name='Dessert')
+
+    def test_list_not_modified(self):
+        """Test an unchanged list is answered by the aggregate alone."""
+        url = reverse('recipe:recipe-list')
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(1):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+        self.assertEqual(res.content, b'')
+
+    def test_list_modified(self):
+        """Test updates, links and deletes change the list validator."""
+        url = reverse('recipe:recipe-list')
+        etag = self.client.get(url)['ETag']
+
+        for write in (
+            lambda: self.recipe.tags.add(self.tag),
+            lambda: self.tag.delete(),
+            lambda: Recipe.objects.create(
+                user=self.user,
+                title='Brownies',
+                time_minutes=10,
+                price=5,
+            ),
+            lambda: self.recipe.delete(),
+        ):
+            write()
+
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertNotEqual(res['ETag'], etag)
+            etag = res['ETag']
+
+    def test_assigned_list_modified(self):
+        """Test assigning a tag changes the assigned tags validator."""
+        url = reverse('recipe:tag-list')
+        etag = self.client.get(url, {'assigned_only': 1})['ETag']
+
+        self.recipe.tags.add(self.tag)
+
+        res = self.client.get(
+            url,
+            {'assigned_only': 1},
+            HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_detail_not_modified(self):
+        """Test an unchanged recipe is answered without loading it."""
+        url = reverse('recipe:recipe-detail', args=[self.recipe.id])
+        res = self.client.get(url)
+        self.assertIn('Last-Modified', res)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        res = self.client.get(
+            url,
+            HTTP_IF_MODIFIED_SINCE=res['Last-Modified'],
+        )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_modified_by_rename(self):
+        """Test renaming a linked tag changes the recipe validator."""
+        self.recipe.tags.add(self.tag)
+        url = reverse('recipe:recipe-detail', args=[self.recipe.id])
+        etag = self.client.get(url)['ETag']
+
+        self.tag.name = 'Sweets'
+        self.tag.save()
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tags'][0]['name'], 'Sweets')
+
+    def test_detail_not_found(self):
+        """Test a missing recipe is still a 404."""
+        url = reverse('recipe:recipe-detail', args=[self.recipe.id + 1])
+
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -1,9 +1,13 @@
+from io import StringIO
 from unittest.mock import MagicMock, patch
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
 from django.db.utils import OperationalError
 from django.test import TestCase
 
+from core.models import ChangeSequence, Recipe
+
 
 class CommandTest(TestCase):
     """Test commands."""
@@ -38,3 +42,60 @@ class CommandTest(TestCase):
 
             self.assertEqual(gi.call_count, 6)
             self.assertEqual(connection.cursor.call_count, 1)
+
+    def test_rebuild_search_index(self):
+        """Test missing search vectors are backfilled."""
+        user = get_user_model().objects.create_user('j@j.com', '123qwerty')
+        for n in range(3):
+            Recipe.objects.create(
+                user=user,
+                title=f'Recipe {n}',
+                time_minutes=10,
+                price=5,
+            )
+        Recipe.objects.update(search_vector=None)
+
+        call_command('rebuild_search_index', batch_size=2, stdout=StringIO())
+
+        self.assertFalse(
+            Recipe.objects.filter(search_vector__isnull=True).exists(),
+        )
+
+    def test_seed_data(self):
+        """Test users are seeded with their objects, reproducibly."""
+        options = {
+            'users': 3,
+            'recipes': 4,
+            'tags': 3,
+            'ingredients': 2,
+            'tags_per_recipe': 5,
+            'ingredients_per_recipe': 1,
+            'distribution': 'fixed',
+            'batch_size': 2,
+            'seed': 7,
+            'stdout': StringIO(),
+        }
+
+        call_command('seed_data', email_prefix='a', **options)
+        call_command('seed_data', email_prefix='b', **options)
+
+        user = get_user_model().objects.get(email='a-1@example.com')
+        self.assertTrue(user.check_password('password'))
+        self.assertTrue(hasattr(user, 'auth_token'))
+
+        recipes = user.recipe_set.order_by('id')
+        self.assertEqual(len(recipes), 4)
+        for recipe in recipes:
+            # No more links than objects.
+            self.assertEqual(recipe.tags.count(), 3)
+            self.assertEqual(recipe.ingredients.count(), 1)
+            self.assertIsNotNone(recipe.search_vector)
+        self.assertEqual(ChangeSequence.objects.get(user=user).last, 9)
+        self.assertEqual(recipes.last().change_seq, 9)
+
+        def titles(email):
+            return list(Recipe.objects.filter(
+                user__email=email,
+            ).order_by('id').values_list('title', 'time_minutes', 'price'))
+
+        self.assertEqual(titles('a-2@example.com'), titles('b-2@example.com'))
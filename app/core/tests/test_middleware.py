@@ -0,0 +1,143 @@
+import json
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.shortcuts import reverse
+from django.http import FileResponse
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from core.middleware import QueryRecorder, RequestTimingMiddleware
+from core.models import Recipe, Tag
+from core.tests.utils import ClearResponseCacheMixin
+
+
+def server_timing(response):
+    """Parse a Server-Timing header into durations and descriptions."""
+    metrics = {}
+    for entry in response['Server-Timing'].split(', '):
+        name, *params = entry.split(';')
+        metrics[name] = dict(param.split('=', 1) for param in params)
+
+    return metrics
+
+
+class RequestTimingMiddlewareTests(ClearResponseCacheMixin, TestCase):
+    """Test requests are measured."""
+
+    def setUp(self):
+        super().setUp()
+
+        self.user = get_user_model().objects.create_user(
+            email='j@j.com',
+            password='123qwerty',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Cheesecake',
+            time_minutes=10,
+            price=5,
+        )
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Cake'))
+
+    def get(self, url, **params):
+        """Get ``url``, return the response and its log record."""
+        with self.assertLogs('core.middleware', 'INFO') as logs:
+            res = self.client.get(url, params)
+            if res.streaming:
+                b''.join(res.streaming_content)
+
+        record, = logs.records
+        return res, record
+
+    def test_server_timing(self):
+        """Test the header reports every stage and the queries."""
+        with self.assertNumQueries(4):
+            res, _ = self.get(reverse('recipe:recipe-list'))
+
+        metrics = server_timing(res)
+        self.assertEqual(
+            set(metrics),
+            {'total', 'db', 'serialize', 'render'},
+        )
+        self.assertEqual(metrics['db']['desc'], '"4 queries"')
+        self.assertLessEqual(
+            float(metrics['db']['dur']),
+            float(metrics['total']['dur']),
+        )
+
+    def test_log_line(self):
+        """Test the log line is JSON naming the view."""
+        _, record = self.get(reverse('recipe:tag-list'))
+        line = json.loads(record.getMessage())
+
+        self.assertEqual(record.levelname, 'INFO')
+        self.assertEqual(line['view'], 'recipe:tag-list')
+        self.assertEqual(line['status'], 200)
+        self.assertEqual(line['queries'], 2)
+        self.assertEqual(line['repeated'], [])
+        for name in ('total', 'db', 'serialize', 'render'):
+            self.assertIsInstance(line[f'{name}_ms'], float)
+
+    def test_streaming(self):
+        """Test streamed responses are logged once consumed."""
+        res, record = self.get(reverse('recipe:recipe-export'))
+        line = json.loads(record.getMessage())
+
+        self.assertIn('Server-Timing', res)
+        # Read while streaming: the recipes and their tags and ingredients.
+        self.assertEqual(line['queries'], 3)
+
+    def test_file_not_wrapped(self):
+        """Test files are logged at once and left to the file wrapper."""
+        middleware = RequestTimingMiddleware(
+            lambda request: FileResponse(BytesIO(b'image')),
+        )
+
+        with self.assertLogs('core.middleware', 'INFO') as logs:
+            res = middleware(RequestFactory().get('/media/image.jpg'))
+
+        self.assertIsNotNone(res.file_to_stream)
+        self.assertIn('Server-Timing', res)
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['path'], '/media/image.jpg')
+
+    def test_repeated_statements(self):
+        """Test statements are counted before their parameters are bound."""
+        recorder = QueryRecorder()
+        for pk in range(3):
+            recorder(lambda *args: None, 'SELECT %s', [pk], False, {})
+        recorder(lambda *args: None, 'SELECT 1', [], False, {})
+
+        self.assertEqual(recorder.count, 4)
+        self.assertEqual(recorder.repeated(3), [('SELECT %s', 3)])
+
+    @override_settings(REQUEST_TIMING={'REPEATED_THRESHOLD': 1})
+    def test_repeated_logged(self):
+        """Test requests repeating statements are logged as warnings."""
+        _, record = self.get(reverse('recipe:tag-list'))
+        repeated = json.loads(record.getMessage())['repeated']
+
+        self.assertEqual(record.levelname, 'WARNING')
+        self.assertEqual(len(repeated), 2)
+        self.assertEqual(repeated[0]['count'], 1)
+
+    @override_settings(REQUEST_TIMING={'SAMPLE_RATE': 0})
+    def test_not_sampled(self):
+        """Test requests left out of the sample aren't measured."""
+        with self.assertRaises(AssertionError):
+            self.get(reverse('recipe:tag-list'))
+
+        res = self.client.get(reverse('recipe:tag-list'))
+        self.assertNotIn('Server-Timing', res)
+
+    @override_settings(REQUEST_TIMING={'HEADER': False})
+    def test_header_disabled(self):
+        """Test the header can be left out, the log line stays."""
+        res, record = self.get(reverse('recipe:tag-list'))
+
+        self.assertNotIn('Server-Timing', res)
+        self.assertEqual(record.levelname, 'INFO')
@@ -81,6 +81,64 @@ class ModelsTests(TestCase):
 
         self.assertEqual(str(recipe), recipe.title)
 
+    def test_tag_bulk_get_or_create(self):
+        """Test resolving names costs a select and an insert."""
+        user = sample_user()
+        models.Tag.objects.create(user=user, name='Vegan')
+
+        # Plus reserving the numbers.
+        with self.assertNumQueries(3):
+            tags = models.Tag.objects.bulk_get_or_create(
+                user,
+                ['VEGAN', 'Dessert', 'Vegan'],
+            )
+
+        self.assertEqual([tag.name for tag in tags], ['Vegan', 'Dessert'])
+        self.assertEqual(models.Tag.objects.count(), 2)
+
+    def test_tag_bulk_get_existing(self):
+        """Test resolving existing names reserves no change number."""
+        user = sample_user()
+        tag = models.Tag.objects.create(user=user, name='Vegan')
+
+        with self.assertNumQueries(1):
+            tags = models.Tag.objects.bulk_get_or_create(user, ['vegan'])
+
+        self.assertEqual(tags, [tag])
+        self.assertEqual(
+            models.ChangeSequence.objects.get(user=user).last,
+            tag.change_seq,
+        )
+
+    def test_tag_bulk_get_or_create_raced(self):
+        """Test a name inserted since the lookup is selected again."""
+        user = sample_user()
+        tag = models.Tag.objects.create(user=user, name='Vegan')
+        lookup = models.Tag.objects._lookup
+        # The first lookup runs before the concurrent insert.
+        missed = (['vegan'], {})
+
+        with patch.object(
+            models.Tag.objects,
+            '_lookup',
+            side_effect=[missed, lookup(user, ['Vegan'])],
+        ):
+            tags = models.Tag.objects.bulk_get_or_create(user, ['Vegan'])
+
+        self.assertEqual(tags, [tag])
+        self.assertEqual(models.Tag.objects.count(), 1)
+
+    def test_tag_bulk_get_or_create_lowered(self):
+        """Test names are matched as the database lowers them."""
+        user = sample_user()
+        # Python lowers the last letter to a final sigma, PostgreSQL never.
+        tag = models.Tag.objects.create(user=user, name='ΟΔΟΣ')
+
+        tags = models.Tag.objects.bulk_get_or_create(user, ['ΟΔΟΣ'])
+
+        self.assertEqual(tags, [tag])
+        self.assertEqual(models.Tag.objects.count(), 1)
+
     @patch('core.models.uuid4')
     def test_recipe_filename_uuid(self, mock_uuid):
         """Test the saving location of an image."""
@@ -0,0 +1,171 @@
+import json
+from tempfile import TemporaryDirectory
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.cache import response_cache
+
+# Tables which must always be read through an index.
+INDEXED_TABLES = (
+    'core_recipe',
+    'core_tag',
+    'core_ingredient',
+    'core_recipe_tags',
+    'core_recipe_ingredients',
+)
+
+# Statements with a plan worth checking.
+PLANNED_STATEMENTS = (
+    'SELECT',
+    'WITH',
+    'UPDATE',
+    'DELETE',
+)
+
+
+class ClearResponseCacheMixin:
+    """Start every test with an empty response cache.
+
+    The writes of previous tests are rolled back, their cached responses
+    are not.
+    """
+
+    def setUp(self):
+        super().setUp()
+        response_cache.cache.clear()
+
+
+class TemporaryMediaMixin:
+    """Store the media files of every test in a temporary directory."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media = override_settings(MEDIA_ROOT=media_root.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+def capture_queries(request):
+    """Call ``request()`` uncached, return its result and its queries."""
+    # A cached response would hide the queries of the request.
+    response_cache.cache.clear()
+    with CaptureQueriesContext(connection) as context:
+        response = request()
+        # Streamed responses run their queries while being read.
+        if getattr(response, 'streaming', False):
+            for _ in response.streaming_content:
+                pass
+
+    return response, [query['sql'] for query in context.captured_queries]
+
+
+def route_names(patterns):
+    """Yield the names of URL patterns, included ones too."""
+    for pattern in patterns:
+        if hasattr(pattern, 'url_patterns'):
+            yield from route_names(pattern.url_patterns)
+        elif pattern.name:
+            yield pattern.name
+
+
+def explain(sql):
+    """Return the plan of a statement, without running it."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+        plan, = cursor.fetchone()
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']
+
+
+def seq_scans(plan, tables=INDEXED_TABLES):
+    """Return the tables of ``tables`` a plan reads sequentially."""
+    found = []
+    if plan['Node Type'] == 'Seq Scan' and plan['Relation Name'] in tables:
+        found.append(plan['Relation Name'])
+    for child in plan.get('Plans', ()):
+        found.extend(seq_scans(child, tables))
+
+    return found
+
+
+class QueryBudgetMixin:
+    """Assert the number of queries of requests doesn't grow with data.
+
+    ``populate(size)`` grows the fixture of the test case, each request
+    is run after populating every size of ``sizes``. Writes are only
+    comparable if they change as much at every size: ``prepare(size)``
+    resets what the request changes, outside of the counted queries.
+    """
+
+    sizes = (1, 25)
+
+    def populate(self, size):
+        """Grow the fixture up to ``size`` objects of each kind."""
+
+    def assertQueryBudget(self, budget, request, prepare=None):
+        """Assert ``request(size)`` runs the same queries, within budget.
+
+        Return the queries of the largest size.
+        """
+        counts = []
+        for size in self.sizes:
+            self.populate(size)
+            if prepare is not None:
+                prepare(size)
+            response, queries = capture_queries(lambda: request(size))
+            self.assertLess(
+                response.status_code,
+                400,
+                f'{response.status_code}: '
+                f'{getattr(response, "content", b"")[:500]!r}',
+            )
+            counts.append(len(queries))
+
+        self.assertEqual(
+            len(set(counts)),
+            1,
+            f'Queries grow with the data: {counts}\n' + '\n'.join(queries),
+        )
+        self.assertLessEqual(
+            counts[0],
+            budget,
+            f'{counts[0]} queries, over the budget of {budget}:\n'
+            + '\n'.join(queries),
+        )
+
+        return queries
+
+
+class QueryPlanMixin:
+    """Assert queries read the core tables through their indexes.
+
+    Sequential scans are disabled while planning, so that the planner
+    picks an index whenever there is one, however small the tables: a
+    sequential scan left in the plan means no index can serve the query.
+    """
+
+    def assertIndexed(self, queries, tables=INDEXED_TABLES):
+        """Assert no query scans one of ``tables`` sequentially."""
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        try:
+            for sql in queries:
+                if not sql.lstrip().upper().startswith(PLANNED_STATEMENTS):
+                    continue
+
+                plan = explain(sql)
+                scanned = seq_scans(plan, tables)
+                self.assertFalse(
+                    scanned,
+                    f'Sequential scan of {", ".join(scanned)}:\n{sql}\n'
+                    f'{json.dumps(plan, indent=2)}',
+                )
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = on')
@@ -0,0 +1,102 @@
+import csv
+import json
+from itertools import islice
+
+from core.models import Recipe
+
+COLUMNS = (
+    'id',
+    'title',
+    'time_minutes',
+    'price',
+    'link',
+)
+
+# Separates the names of the tags and ingredients in a CSV cell, which
+# quotes the names holding it like CSV fields.
+CSV_SEPARATOR = '|'
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def export_recipes(qs, chunk_size=1000):
+    """Yield the recipes of a queryset as dicts, with related names.
+
+    Rows come from a server-side cursor, and the names of the tags and
+    ingredients are read per chunk of recipes, one query per relation: no
+    more than one chunk is held in memory whatever the size of ``qs``.
+    """
+    # Oldest first, so that importing an export keeps the order.
+    rows = qs.order_by('id').values(*COLUMNS).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+
+        ids = [row['id'] for row in chunk]
+        names = {
+            field: related_names(field, ids)
+            for field in ('tags', 'ingredients')
+        }
+        for row in chunk:
+            row['price'] = str(row['price'])
+            for field, related in names.items():
+                row[field] = related.get(row['id'], [])
+            yield row
+
+
+def related_names(field_name, ids):
+    """Map recipe ids to the names of their related objects, by id."""
+    field = Recipe._meta.get_field(field_name)
+    source = f'{field.m2m_field_name()}_id'
+    target = field.m2m_reverse_field_name()
+
+    names = {}
+    links = field.remote_field.through.objects.filter(**{
+        f'{source}__in': ids,
+    }).order_by(f'{target}_id').values_list(source, f'{target}__name')
+    for recipe_id, name in links:
+        names.setdefault(recipe_id, []).append(name)
+
+    return names
+
+
+def render_ndjson(recipes):
+    """Render recipes as lines of JSON."""
+    for recipe in recipes:
+        yield json.dumps(recipe, ensure_ascii=False) + '\n'
+
+
+class Echo:
+    """File-like object handing back what is written to it."""
+
+    def write(self, value):
+        return value
+
+
+def join_names(names):
+    """Join names in a CSV cell, see ``CSV_SEPARATOR``."""
+    writer = csv.writer(Echo(), delimiter=CSV_SEPARATOR, lineterminator='')
+    return writer.writerow(names)
+
+
+def render_csv(recipes):
+    """Render recipes as CSV lines, the header first."""
+    writer = csv.writer(Echo())
+    yield writer.writerow((*COLUMNS, 'tags', 'ingredients'))
+
+    for recipe in recipes:
+        yield writer.writerow((
+            *(recipe[column] for column in COLUMNS),
+            join_names(recipe['tags']),
+            join_names(recipe['ingredients']),
+        ))
+
+
+RENDERERS = {
+    'ndjson': render_ndjson,
+    'csv': render_csv,
+}
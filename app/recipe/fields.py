@@ -0,0 +1,123 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+from recipe.images import srcset
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """Many related field resolving every submitted pk in one query.
+
+    Objects already resolved by a parent are taken from the
+    ``related_objects`` context, mapping field names to ``{pk: object}``.
+    """
+
+    default_error_messages = {
+        'does_not_exist': _(
+            'Invalid pk(s) "{pk_value}" - object(s) do not exist.'
+        ),
+        'incorrect_type': _(
+            'Incorrect type. Expected pk value, received {data_type}.'
+        ),
+    }
+
+    def to_internal_value(self, data):
+        """Resolve a list of pks into objects, keeping the given order."""
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        queryset = self.child_relation.get_queryset()
+
+        pks = []
+        for item in data:
+            pk = self.to_pk(item)
+            if pk is None:
+                self.fail('incorrect_type', data_type=type(item).__name__)
+            if pk not in pks:
+                pks.append(pk)
+
+        if not pks:
+            return []
+
+        # A list serializer may have resolved the ids of every item at once.
+        objects = self.context.get('related_objects', {}).get(self.field_name)
+        if objects is None:
+            objects = queryset.in_bulk(pks)
+
+        missing = [str(pk) for pk in pks if pk not in objects]
+        if missing:
+            self.fail('does_not_exist', pk_value=', '.join(missing))
+
+        return [objects[pk] for pk in pks]
+
+    def to_pk(self, value):
+        """Coerce a submitted value into a pk, None if it is not one."""
+        if isinstance(value, bool):
+            return None
+
+        pk_field = self.child_relation.queryset.model._meta.pk
+        try:
+            return pk_field.to_python(value)
+        except DjangoValidationError:
+            return None
+
+
+class UserPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key of an object owned by the requesting user.
+
+    With ``many=True`` all the pks are validated in a single query.
+    """
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        """Use the bulk field for lists."""
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+
+        return BulkManyRelatedField(**list_kwargs)
+
+    def get_queryset(self):
+        """Limit the choices to the objects of the current user."""
+        queryset = super().get_queryset()
+
+        request = self.context.get('request')
+        if request is None:
+            return queryset.none()
+
+        return queryset.filter(user=request.user)
+
+
+class ImageSrcsetField(serializers.Field):
+    """Read-only ``srcset`` of the variants of an image, by media type.
+
+    Represented from the stored name and width alone, which the fast path
+    reads straight from their columns.
+    """
+
+    def __init__(self, width_source, **kwargs):
+        self.width_source = width_source
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    @property
+    def source_columns(self):
+        """The columns of the name and the width."""
+        return self.source, self.width_source
+
+    def get_attribute(self, instance):
+        """Return the name and the width."""
+        image = super().get_attribute(instance)
+        return getattr(image, 'name', image), getattr(
+            instance,
+            self.width_source,
+        )
+
+    def to_representation(self, value):
+        """Return the map, None without an image."""
+        name, width = value
+        return srcset(name, width) if name else None
@@ -0,0 +1,112 @@
+from django.db.models import Count, Exists, OuterRef
+from rest_framework.exceptions import ValidationError
+
+from core.models import Recipe
+
+MATCH_ANY = 'any'
+MATCH_ALL = 'all'
+
+RELATED_FILTERS = (
+    'tags',
+    'ingredients',
+)
+
+
+def parse_ids(value, param):
+    """Parse a comma separated list of ids."""
+    try:
+        ids = {int(i) for i in value.split(',') if i.strip()}
+    except ValueError:
+        raise ValidationError({
+            param: ['Expected a comma separated list of integers.'],
+        })
+
+    return ids
+
+
+def parse_names(value, param, allowed):
+    """Parse a comma separated list of names out of ``allowed``."""
+    names = []
+    for name in value.split(','):
+        name = name.strip()
+        if name and name not in names:
+            names.append(name)
+
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValidationError({
+            param: [f'Unknown name(s): {", ".join(unknown)}.'],
+        })
+
+    return names
+
+
+def parse_mode(value, param):
+    """Parse a match mode, matching any of the ids by default."""
+    mode = value or MATCH_ANY
+    if mode not in (MATCH_ANY, MATCH_ALL):
+        raise ValidationError({
+            param: [f'Expected "{MATCH_ANY}" or "{MATCH_ALL}".'],
+        })
+
+    return mode
+
+
+def filter_related(qs, field_name, ids, mode=MATCH_ANY):
+    """Filter recipes by a many-to-many relation using semi-joins.
+
+    The through table is never joined into the outer query, so a recipe
+    is returned once however many of the ids it matches.
+    """
+    field = Recipe._meta.get_field(field_name)
+    through = field.remote_field.through
+    source = field.m2m_field_name()
+    target = field.m2m_reverse_field_name()
+
+    links = through.objects.filter(**{f'{target}__in': ids})
+
+    if mode == MATCH_ALL:
+        # GROUP BY recipe HAVING COUNT(*) = len(ids); the through table is
+        # unique on (recipe, target), so the count is the distinct matches.
+        matching = links.values(source).annotate(
+            matches=Count(target),
+        ).filter(matches=len(ids)).values(source)
+        return qs.filter(pk__in=matching)
+
+    annotation = f'has_{field_name}'
+    return qs.annotate(**{
+        annotation: Exists(links.filter(**{source: OuterRef('pk')})),
+    }).filter(**{annotation: True})
+
+
+def filter_assigned(qs):
+    """Keep tags or ingredients assigned to at least one recipe.
+
+    A semi-join on the through table, so no ``DISTINCT`` is needed.
+    """
+    field = next(
+        f for f in Recipe._meta.many_to_many if f.related_model is qs.model
+    )
+    links = field.remote_field.through.objects.filter(**{
+        field.m2m_reverse_field_name(): OuterRef('pk'),
+    })
+
+    return qs.annotate(is_assigned=Exists(links)).filter(is_assigned=True)
+
+
+def filter_recipes(qs, params):
+    """Apply the related filters from the query params to recipes."""
+    for field_name in RELATED_FILTERS:
+        value = params.get(field_name)
+        if not value:
+            continue
+
+        ids = parse_ids(value, field_name)
+        if not ids:
+            continue
+
+        mode_param = f'{field_name}_mode'
+        mode = parse_mode(params.get(mode_param), mode_param)
+        qs = filter_related(qs, field_name, ids, mode)
+
+    return qs
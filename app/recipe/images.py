@@ -0,0 +1,525 @@
+import os
+import re
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from hashlib import sha256
+from os import path
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import (
+    MemoryFileUploadHandler,
+    TemporaryFileUploadHandler,
+)
+from django.db import transaction
+from django.utils.timezone import now
+from PIL import Image, features
+from rest_framework import serializers
+
+from core.cache import response_cache
+from core.models import (
+    RECIPE_IMAGE_DIR,
+    ChangeSequence,
+    ImageJob,
+    Recipe,
+    recipe_image_filename,
+)
+
+# Whether Pillow was built with libwebp, which the Docker image installs.
+WEBP = features.check('webp')
+
+DEFAULTS = {
+    # Storage directory of the uploads waiting for a worker. Shared by the
+    # web and the worker processes, like the rest of the media.
+    'STAGING_DIR': 'staging/recipe',
+    # Formats accepted, as named by Pillow; WebP if Pillow has libwebp.
+    'FORMATS': (
+        'JPEG',
+        'PNG',
+        'GIF',
+        *(('WEBP',) if WEBP else ()),
+    ),
+    'MAX_UPLOAD_SIZE': 20 * 1024 * 1024,
+    # Pixels of an upload, checked from its header before it's accepted.
+    'MAX_PIXELS': 40 * 1000 * 1000,
+    # Longest side of the processed image; larger ones are downscaled.
+    'MAX_DIMENSION': 2048,
+    'JPEG_QUALITY': 85,
+    # Jobs claimed at once by a worker process, per pool process.
+    'BATCH_SIZE': 2,
+    # Widths of the variants, never upscaled, and their formats by
+    # extension, the most compact first.
+    'VARIANT_WIDTHS': (64, 320, 640, 1280),
+    'VARIANT_FORMATS': (
+        *(('webp',) if WEBP else ()),
+        'jpg',
+    ),
+    'WEBP_QUALITY': 80,
+}
+
+# Extensions of the processed images.
+PROCESSED_EXTENSIONS = (
+    '.jpg',
+    '.png',
+)
+
+# Pillow name and media type of the variant formats, by extension.
+VARIANT_TYPES = {
+    'jpg': ('JPEG', 'image/jpeg'),
+    'webp': ('WEBP', 'image/webp'),
+}
+
+# Variants are stored next to their image: <stem>-<width>w.<extension>.
+VARIANT_NAME = re.compile(
+    r'^(?P<stem>.+)-(?P<width>[1-9][0-9]*)w\.(?P<extension>[a-z]+)$',
+)
+
+# Transpositions undoing the EXIF orientations, by tag value.
+ORIENTATIONS = {
+    2: (Image.FLIP_LEFT_RIGHT,),
+    3: (Image.ROTATE_180,),
+    4: (Image.FLIP_TOP_BOTTOM,),
+    5: (Image.TRANSPOSE,),
+    6: (Image.ROTATE_270,),
+    7: (Image.TRANSVERSE,),
+    8: (Image.ROTATE_90,),
+}
+
+EXIF_ORIENTATION = 0x0112
+
+
+def get_config():
+    """Return the image processing settings merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'IMAGE_PROCESSING', {})}
+
+
+class ContentHashMixin:
+    """Upload handler hashing files as their chunks are received.
+
+    The hex SHA-256 digest is set as ``content_hash`` on the file.
+    """
+
+    def new_file(self, *args, **kwargs):
+        # Before the memory handler may stop the others.
+        self.hasher = sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.content_hash = self.hasher.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(
+    ContentHashMixin,
+    MemoryFileUploadHandler,
+):
+    """Keep small uploads in memory, hashed."""
+
+
+class HashingTemporaryFileUploadHandler(
+    ContentHashMixin,
+    TemporaryFileUploadHandler,
+):
+    """Stream large uploads to a temporary file, hashed."""
+
+
+def content_hash(upload):
+    """Return the hex SHA-256 of an upload, hashed on receipt if it was."""
+    digest = getattr(upload, 'content_hash', None)
+    if digest is None:
+        hasher = sha256()
+        for chunk in upload.chunks():
+            hasher.update(chunk)
+        upload.seek(0)
+        digest = hasher.hexdigest()
+
+    return digest
+
+
+def find_processed(digest):
+    """Return the name of the processed image of an upload, if rendered.
+
+    Its modification time is bumped, so the collector leaves the file to
+    the recipe about to reference it.
+    """
+    for extension in PROCESSED_EXTENSIONS:
+        name = path.join(RECIPE_IMAGE_DIR, f'{digest}{extension}')
+        if default_storage.exists(name):
+            os.utime(default_storage.path(name))
+            return name
+
+    return None
+
+
+def inspect_upload(upload):
+    """Validate an upload from its header, without decoding it.
+
+    Return the Pillow name of its format.
+    """
+    config = get_config()
+    if upload.size > config['MAX_UPLOAD_SIZE']:
+        raise serializers.ValidationError(
+            f'Upload a file of at most {config["MAX_UPLOAD_SIZE"]} bytes.',
+        )
+
+    try:
+        # Not closed: Pillow 5 would close the upload along with it.
+        image = Image.open(upload)
+        image_format, (width, height) = image.format, image.size
+    except Exception:
+        raise serializers.ValidationError(
+            'Upload a valid image. The file you uploaded was either not an '
+            'image or a corrupted image.',
+        )
+    finally:
+        upload.seek(0)
+
+    if image_format not in config['FORMATS']:
+        raise serializers.ValidationError(
+            f'Upload an image in one of: {", ".join(config["FORMATS"])}.',
+        )
+    if width * height > config['MAX_PIXELS']:
+        raise serializers.ValidationError(
+            f'Upload an image of at most {config["MAX_PIXELS"]} pixels.',
+        )
+
+    return image_format
+
+
+def stage_upload(recipe, upload):
+    """Store an upload for processing and queue its job.
+
+    Uploads already processed once are not processed again, see
+    ``ImageProcessor``; the staged file is short-lived either way.
+    """
+    digest = content_hash(upload)
+    extension = path.splitext(upload.name)[-1].lower()
+    name = default_storage.save(
+        path.join(get_config()['STAGING_DIR'], f'{uuid4()}{extension}'),
+        upload,
+    )
+
+    with transaction.atomic():
+        job = ImageJob.objects.create(
+            recipe=recipe,
+            staged=name,
+            digest=digest,
+        )
+        recipe.image_status = Recipe.IMAGE_PROCESSING
+        recipe.image_upload = job.pk
+        recipe.save(update_fields=[
+            'image_status',
+            'image_upload',
+            'updated_at',
+        ])
+
+    return job
+
+
+def orient(image):
+    """Apply the EXIF orientation of an image to its pixels."""
+    exif = image._getexif() if hasattr(image, '_getexif') else None
+    orientation = (exif or {}).get(EXIF_ORIENTATION)
+
+    for method in ORIENTATIONS.get(orientation, ()):
+        image = image.transpose(method)
+
+    return image
+
+
+def has_alpha(image):
+    """Whether an image has transparent pixels, or might."""
+    return image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def render_image(source, target, config):
+    """Decode, orient, downscale and re-encode an image file.
+
+    Run by the worker processes; the files are absolute paths and
+    ``target`` has no extension yet. Alpha is kept in PNG, anything else
+    becomes a JPEG. Metadata, EXIF included, is left out. Written under a
+    temporary name then renamed, as workers may render the same upload at
+    once. Return the extension written and the width of the image.
+    """
+    limit = config['MAX_DIMENSION']
+    with Image.open(source) as image:
+        # JPEGs decode straight to a fraction of their size.
+        image.draft('RGB', (limit, limit))
+        image = orient(image)
+
+        transparent = has_alpha(image)
+        image = image.convert('RGBA' if transparent else 'RGB')
+        image.thumbnail((limit, limit), Image.LANCZOS)
+
+        os.makedirs(path.dirname(target), exist_ok=True)
+        temporary = f'{target}.{uuid4().hex}.tmp'
+        if transparent:
+            extension = '.png'
+            image.save(temporary, 'PNG', optimize=True)
+        else:
+            extension = '.jpg'
+            image.save(
+                temporary,
+                'JPEG',
+                quality=config['JPEG_QUALITY'],
+                optimize=True,
+                progressive=True,
+            )
+        os.replace(temporary, target + extension)
+
+    return extension, image.width
+
+
+def variant_name(name, width, extension):
+    """Return the storage name of a variant of an image."""
+    return f'{path.splitext(name)[0]}-{width}w.{extension}'
+
+
+def srcset(name, width=None):
+    """Return the ``srcset`` of the variants of an image, by media type.
+
+    Variants are never upscaled: widths past the one of the image are left
+    out but the first, which is the image at its own width. Without a
+    known width every configured one is listed. The URLs are relative, so
+    cached responses don't depend on the host.
+    """
+    config = get_config()
+    widths = sorted(config['VARIANT_WIDTHS'])
+    if width is not None:
+        larger = [w for w in widths if w >= width]
+        widths = [w for w in widths if w < width] + larger[:1]
+
+    return {
+        VARIANT_TYPES[extension][1]: ', '.join(
+            f'{default_storage.url(variant_name(name, w, extension))} '
+            f'{w if width is None else min(w, width)}w'
+            for w in widths
+        )
+        for extension in config['VARIANT_FORMATS']
+    }
+
+
+def render_variant(source, target, width, extension, config):
+    """Downscale an image file to ``width`` in the format of ``extension``.
+
+    The file is written under a temporary name then renamed, so concurrent
+    first requests never read a partial variant.
+    """
+    image_format, _ = VARIANT_TYPES[extension]
+    with Image.open(source) as image:
+        image.draft('RGB', (width, width))
+        image = orient(image)
+
+        transparent = has_alpha(image) and image_format == 'WEBP'
+        image = image.convert('RGBA' if transparent else 'RGB')
+        image.thumbnail((width, image.height), Image.LANCZOS)
+
+        temporary = f'{target}.{uuid4().hex}.tmp'
+        if image_format == 'WEBP':
+            image.save(temporary, 'WEBP', quality=config['WEBP_QUALITY'])
+        else:
+            image.save(
+                temporary,
+                'JPEG',
+                quality=config['JPEG_QUALITY'],
+                optimize=True,
+                progressive=True,
+            )
+        os.replace(temporary, target)
+
+
+def get_variant(name, recipes):
+    """Return the storage name of a variant, rendering it on first use.
+
+    None if ``name`` is not a configured variant of the image of one of
+    ``recipes``, or that image is missing.
+    """
+    config = get_config()
+    match = VARIANT_NAME.match(name)
+    if match is None:
+        return None
+
+    stem, width, extension = match.group('stem', 'width', 'extension')
+    if (
+        int(width) not in config['VARIANT_WIDTHS']
+        or extension not in config['VARIANT_FORMATS']
+    ):
+        return None
+
+    source = recipes.filter(
+        image__startswith=f'{stem}.',
+    ).values_list('image', flat=True).first()
+    if source is None:
+        return None
+
+    if not default_storage.exists(name):
+        try:
+            render_variant(
+                default_storage.path(source),
+                default_storage.path(name),
+                int(width),
+                extension,
+                config,
+            )
+        except FileNotFoundError:
+            # The image itself is gone.
+            return None
+
+    return name
+
+
+class ImageProcessor:
+    """Process queued image jobs, in a process pool or inline.
+
+    A batch is claimed, rendered and applied in one transaction: the row
+    locks of the jobs are held while the workers render them. Processed
+    images are named after the digest of their upload, so an upload seen
+    before reuses its image and variants, and duplicates within a batch
+    are rendered once.
+    """
+
+    def __init__(self, pool=None, batch_size=None):
+        self.pool = pool
+        self.config = get_config()
+        self.batch_size = batch_size or self.config['BATCH_SIZE']
+
+    def submit(self, *args):
+        """Render in the pool, or right away without one."""
+        if self.pool is not None:
+            return self.pool.submit(render_image, *args)
+
+        future = Future()
+        try:
+            future.set_result(render_image(*args))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+
+    def run_batch(self):
+        """Process one batch of jobs, return the number of jobs."""
+        with transaction.atomic():
+            jobs = list(ImageJob.objects.select_for_update(
+                skip_locked=True,
+                of=('self',),
+            ).select_related('recipe').filter(
+                status=ImageJob.QUEUED,
+            ).order_by('id')[:self.batch_size])
+
+            renders, rendering = [], {}
+            for job in jobs:
+                processed = job.digest and find_processed(job.digest)
+                if processed:
+                    stem, extension = path.splitext(processed)
+                    with Image.open(default_storage.path(processed)) as image:
+                        width = image.width
+                    future = Future()
+                    future.set_result((extension, width))
+                elif job.digest in rendering:
+                    stem, future = rendering[job.digest]
+                else:
+                    stem = self.image_stem(job)
+                    future = self.submit(
+                        default_storage.path(job.staged),
+                        default_storage.path(stem),
+                        self.config,
+                    )
+                    if job.digest:
+                        rendering[job.digest] = stem, future
+                renders.append((job, stem, future))
+
+            # Every render is waited for before any recipe is written, so
+            # no write lock is held while the pool works.
+            results = []
+            for job, stem, future in renders:
+                try:
+                    extension, width = future.result()
+                except BrokenProcessPool:
+                    raise
+                except Exception as exc:
+                    results.append((job, None, exc))
+                else:
+                    results.append((job, (stem + extension, width), None))
+
+            # Writing a recipe locks the change sequence of its user until
+            # we commit: take them in one order, like every worker does.
+            results.sort(key=lambda result: result[0].recipe.user_id)
+            for job, image, exc in results:
+                if exc is None:
+                    self.finish(job, *image)
+                else:
+                    self.fail(job, exc)
+
+        return len(jobs)
+
+    @staticmethod
+    def image_stem(job):
+        """Return the name of the processed image, without its extension.
+
+        Jobs queued before uploads were hashed have no digest and get a
+        random name.
+        """
+        if job.digest:
+            return path.join(RECIPE_IMAGE_DIR, job.digest)
+
+        return path.splitext(recipe_image_filename(None, ''))[0]
+
+    def finish(self, job, name, width):
+        """Give the recipe its processed image, unless superseded.
+
+        The image may be shared, so it's left in place either way.
+        """
+        self.update_recipe(
+            job,
+            image=name,
+            image_width=width,
+            image_status=Recipe.IMAGE_READY,
+        )
+
+        job.delete()
+        self.discard(job.staged)
+
+    def fail(self, job, exc):
+        """Keep the job with its error, flag the recipe."""
+        self.update_recipe(job, image_status=Recipe.IMAGE_FAILED)
+
+        job.status = ImageJob.FAILED
+        job.error = f'{type(exc).__name__}: {exc}'
+        job.save(update_fields=['status', 'error'])
+        self.discard(job.staged)
+
+    @staticmethod
+    def update_recipe(job, **values):
+        """Write the outcome of a job, unless a later upload superseded it.
+
+        The change number is reserved first, like every write does, which
+        also holds back the other writes of the user until we commit.
+        Return whether the recipe was written.
+        """
+        user_id = job.recipe.user_id
+        change_seq, = ChangeSequence.objects.reserve(user_id)
+        updated = Recipe.objects.filter(
+            pk=job.recipe_id,
+            image_upload=job.pk,
+        ).update(
+            change_seq=change_seq,
+            updated_at=now(),
+            **values,
+        )
+        if updated:
+            response_cache.invalidate(user_id)
+
+        return bool(updated)
+
+    @staticmethod
+    def discard(name):
+        """Delete a staged upload once the transaction commits."""
+        transaction.on_commit(lambda: default_storage.delete(name))
@@ -0,0 +1,118 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed
+
+from core.models import Recipe
+from core.signals import deferred_relinks
+
+
+def sync_related(field_name, desired, send_signals=True):
+    """Bring a many-to-many relation of recipes to the desired ids.
+
+    ``desired`` maps recipe instances to the ids they should be linked to.
+    The current links of every recipe are read in one query, the removed
+    ones are deleted in one statement and the new ones inserted with one
+    ``bulk_create``. Recipes whose links are unchanged cost nothing more.
+
+    ``m2m_changed`` is sent like ``RelatedManager.set()`` does, unless
+    ``send_signals`` is off for callers handling many recipes themselves.
+    The recipes are reindexed and renumbered once, not once per signal.
+    Return the recipes whose links changed.
+    """
+    field = Recipe._meta.get_field(field_name)
+    through = field.remote_field.through
+    source = f'{field.m2m_field_name()}_id'
+    target = f'{field.m2m_reverse_field_name()}_id'
+
+    current = defaultdict(dict)
+    links = through.objects.filter(**{
+        f'{source}__in': [recipe.pk for recipe in desired],
+    }).values_list('pk', source, target)
+    for pk, recipe_id, target_id in links:
+        current[recipe_id][target_id] = pk
+
+    changes = []
+    for recipe, ids in desired.items():
+        existing = current[recipe.pk]
+        removed = existing.keys() - set(ids)
+        added = set(ids) - existing.keys()
+        if removed or added:
+            changes.append((recipe, removed, added))
+
+    if not changes:
+        return []
+
+    stale = [
+        current[recipe.pk][target_id]
+        for recipe, removed, _ in changes
+        for target_id in removed
+    ]
+    new = [
+        through(**{source: recipe.pk, target: target_id})
+        for recipe, _, added in changes
+        for target_id in added
+    ]
+
+    with transaction.atomic(), deferred_relinks():
+        if send_signals:
+            _send(through, field, changes, 'pre')
+
+        if stale:
+            delete_links(field_name, pk__in=stale)
+        if new:
+            through.objects.bulk_create(new)
+
+        if send_signals:
+            _send(through, field, changes, 'post')
+
+    return [recipe for recipe, _, _ in changes]
+
+
+def delete_links(field_name, **lookups):
+    """Delete the links of a relation matching ``lookups``, in one statement.
+
+    ``QuerySet.delete()`` won't fast delete models with ``m2m_changed``
+    receivers: it reads the links and deletes them by batches of 100 ids.
+    Links have no relations or delete signals of their own to honour.
+    """
+    through = Recipe._meta.get_field(field_name).remote_field.through
+    links = through.objects.filter(**lookups)
+
+    return links._raw_delete(links.db)
+
+
+def insert_related(field_name, desired):
+    """Link freshly created recipes with one ``bulk_create``.
+
+    Unlike ``sync_related`` there are no current links to read or remove,
+    and no signals are sent.
+    """
+    field = Recipe._meta.get_field(field_name)
+    through = field.remote_field.through
+    source = f'{field.m2m_field_name()}_id'
+    target = f'{field.m2m_reverse_field_name()}_id'
+
+    through.objects.bulk_create([
+        through(**{source: recipe.pk, target: target_id})
+        for recipe, ids in desired.items()
+        for target_id in set(ids)
+    ])
+
+
+def _send(through, field, changes, stage):
+    """Send ``m2m_changed`` for the removed and added links."""
+    for recipe, removed, added in changes:
+        for action, pk_set in (('remove', removed), ('add', added)):
+            if not pk_set:
+                continue
+
+            m2m_changed.send(
+                sender=through,
+                action=f'{stage}_{action}',
+                instance=recipe,
+                reverse=False,
+                model=field.related_model,
+                pk_set=set(pk_set),
+                using=recipe._state.db,
+            )
@@ -0,0 +1,140 @@
+import tracemalloc
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Recipe, Tag
+from recipe.fastpath import get_fast_serializer
+from recipe.serializers import RecipeDetailSerializer, RecipeSerializer
+from recipe.views import optimize_recipes
+
+
+class Command(BaseCommand):
+    """Compare the regular and the fast-path recipe serialization.
+
+    The recipes are created in a transaction which is rolled back, so the
+    command leaves the database as it found it.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes',
+            default=10000,
+            type=int,
+            help='Recipes serialized per round.',
+        )
+        parser.add_argument(
+            '--tags',
+            default=3,
+            type=int,
+            help='Tags linked to each recipe.',
+        )
+        parser.add_argument(
+            '--rounds',
+            default=3,
+            type=int,
+            help='Rounds per path; the best one is reported.',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = self.create_sample(options['recipes'], options['tags'])
+
+            for serializer_class, nested in (
+                (RecipeSerializer, ()),
+                (RecipeDetailSerializer, ('ingredients', 'tags')),
+            ):
+                qs = Recipe.objects.filter(user=user).order_by('-id')
+                self.compare(serializer_class, qs, nested, options['rounds'])
+
+            transaction.set_rollback(True)
+
+    def create_sample(self, recipes, tags):
+        """Create a user with recipes, each linked to a few tags."""
+        user = get_user_model().objects.create_user(
+            email='bench@serializers.local',
+            password=None,
+        )
+        tag_objects = Tag.objects.bulk_create(
+            Tag(user=user, name=f'Tag {n}') for n in range(tags * 4)
+        )
+        recipe_objects = Recipe.objects.bulk_create(
+            Recipe(
+                user=user,
+                title=f'Recipe {n}',
+                time_minutes=n % 120,
+                price=f'{n % 1000}.{n % 100:02}',
+                link=f'https://example.com/recipes/{n}',
+            )
+            for n in range(recipes)
+        )
+
+        links = Recipe.tags.through
+        links.objects.bulk_create(
+            links(
+                recipe_id=recipe.id,
+                tag_id=tag_objects[(n + i) % len(tag_objects)].id,
+            )
+            for n, recipe in enumerate(recipe_objects)
+            for i in range(tags)
+        )
+
+        return user
+
+    def compare(self, serializer_class, qs, nested, rounds):
+        """Time both paths, from the query to the rendered bytes."""
+        fields = serializer_class.Meta.fields
+        fast = get_fast_serializer(serializer_class)
+        renderer = JSONRenderer()
+
+        def regular():
+            data = serializer_class(
+                optimize_recipes(qs, fields, nested=nested),
+                many=True,
+            ).data
+            return renderer.render(data)
+
+        def fast_path():
+            rows = list(qs.values(*fast.columns))
+            return renderer.render(fast.serialize(rows))
+
+        if regular() != fast_path():
+            self.stderr.write(self.style.ERROR(
+                f'{serializer_class.__name__}: the outputs differ.'
+            ))
+            return
+
+        regular_time, regular_peak = self.measure(regular, rounds)
+        fast_time, fast_peak = self.measure(fast_path, rounds)
+
+        self.stdout.write(
+            f'{serializer_class.__name__}: '
+            f'regular {regular_time * 1000:.0f}ms '
+            f'({regular_peak / 2 ** 20:.1f}MiB peak), '
+            f'fast {fast_time * 1000:.0f}ms '
+            f'({fast_peak / 2 ** 20:.1f}MiB peak), '
+            f'{regular_time / fast_time:.1f}x faster.'
+        )
+
+    @staticmethod
+    def measure(func, rounds):
+        """Return the best time of the rounds and the peak memory."""
+        best = None
+        for _ in range(rounds):
+            started = perf_counter()
+            func()
+            elapsed = perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+
+        # Measured apart, tracing slows the allocations down.
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return best, peak
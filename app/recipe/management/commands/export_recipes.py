@@ -0,0 +1,62 @@
+from time import monotonic
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Recipe
+from recipe.export import RENDERERS, export_recipes
+
+
+class Command(BaseCommand):
+    """Export the recipes of a user as NDJSON or CSV."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'email',
+            help='Email of the user whose recipes are exported.',
+        )
+        parser.add_argument(
+            '--type',
+            default='ndjson',
+            choices=tuple(RENDERERS),
+            help='Output format.',
+        )
+        parser.add_argument(
+            '--output',
+            default=None,
+            help='File written to, the standard output by default.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            default=1000,
+            type=int,
+            help='Recipes read per chunk.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No user with email {options["email"]}.')
+
+        recipes = export_recipes(
+            Recipe.objects.filter(user=user),
+            chunk_size=options['chunk_size'],
+        )
+        lines = RENDERERS[options['type']](recipes)
+
+        if options['output'] is None:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        started = monotonic()
+        # The CSV module writes its own line endings.
+        with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+            for line in lines:
+                f.write(line)
+
+        elapsed = monotonic() - started
+        self.stderr.write(self.style.SUCCESS(
+            f'Exported to {options["output"]} in {elapsed:.1f}s.'
+        ))
@@ -0,0 +1,145 @@
+import os
+from itertools import chain, islice
+from os import path
+from time import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import RECIPE_IMAGE_DIR, ImageJob, Recipe
+from recipe.images import VARIANT_NAME, get_config
+
+
+def scan(directory):
+    """Yield the files under a directory as ``os.DirEntry``, streamed."""
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from scan(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+    except FileNotFoundError:
+        return
+
+
+def file_stem(name):
+    """Return the name of the file a stored one derives from, unextended.
+
+    Variants derive from their image, temporary renders from nothing.
+    """
+    if name.endswith('.tmp'):
+        return None
+
+    match = VARIANT_NAME.match(name)
+    if match is not None:
+        return match.group('stem')
+
+    return path.splitext(name)[0]
+
+
+def batched(iterable, size):
+    """Yield lists of up to ``size`` items."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    """Delete the recipe images and staged uploads nothing references."""
+
+    help = (
+        'Delete the recipe images, their variants and the staged uploads '
+        'no recipe or image job references, once older than --min-age.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report the orphans without deleting them.',
+        )
+        parser.add_argument(
+            '--min-age',
+            default=24 * 60 * 60,
+            type=int,
+            help='Seconds since a file last changed before it is deleted.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            default=1000,
+            type=int,
+            help='References read and files deleted at a time.',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['min_age'] < 0:
+            raise CommandError(
+                '--batch-size must be positive, --min-age not negative.'
+            )
+
+        # Read first: files written afterwards are too young to be seen.
+        referenced = self.referenced(options['batch_size'])
+        cutoff = time() - options['min_age']
+        root = default_storage.location
+        directories = (RECIPE_IMAGE_DIR, get_config()['STAGING_DIR'])
+        orphans = (
+            entry for entry in chain.from_iterable(
+                scan(path.join(root, directory)) for directory in directories
+            )
+            if file_stem(path.relpath(entry.path, root)) not in referenced
+            and entry.stat(follow_symlinks=False).st_mtime < cutoff
+        )
+
+        verb = 'Found' if options['dry_run'] else 'Deleted'
+        count = size = 0
+        for batch in batched(orphans, options['batch_size']):
+            for entry in batch:
+                freed = self.delete(entry, cutoff, options['dry_run'])
+                if freed is not None:
+                    count += 1
+                    size += freed
+            self.stdout.write(f'{verb} {count} orphans ({size} bytes).')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {count} orphans, {size} bytes, '
+            f'out of {len(referenced)} referenced files.'
+        ))
+
+    @staticmethod
+    def referenced(chunk_size):
+        """Return the names, unextended, of the files still referenced.
+
+        Read from server-side cursors; the set grows with the references,
+        not with the files on disk.
+        """
+        images = Recipe.objects.exclude(image__isnull=True).exclude(
+            image='',
+        ).values_list('image', flat=True)
+        staged = ImageJob.objects.values_list('staged', flat=True)
+
+        return {
+            path.splitext(name)[0]
+            for name in chain(
+                images.iterator(chunk_size=chunk_size),
+                staged.iterator(chunk_size=chunk_size),
+            )
+        }
+
+    @staticmethod
+    def delete(entry, cutoff, dry_run):
+        """Delete an orphan, return its size, None if it changed since."""
+        try:
+            stat = os.stat(entry.path)
+            # An upload seen again bumps the time of its image.
+            if stat.st_mtime >= cutoff:
+                return None
+            if not dry_run:
+                os.unlink(entry.path)
+        except FileNotFoundError:
+            return None
+
+        return stat.st_size
@@ -0,0 +1,99 @@
+import sys
+from os import path
+from time import monotonic
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe.importer import READERS, RecipeImporter
+
+
+class Command(BaseCommand):
+    """Import recipes for a user from NDJSON or CSV, as exported."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'file',
+            help='File to import, - for the standard input.',
+        )
+        parser.add_argument(
+            '--user',
+            required=True,
+            help='Email of the user owning the recipes.',
+        )
+        parser.add_argument(
+            '--type',
+            default=None,
+            choices=tuple(READERS),
+            help='Input format, from the file extension by default.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            default=5000,
+            type=int,
+            help='Recipes imported per transaction.',
+        )
+        parser.add_argument(
+            '--source',
+            default=None,
+            help='Name the progress is saved under, the file path by '
+                 'default; required for the standard input.',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore the saved progress and import from the start.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No user with email {options["user"]}.')
+
+        stdin = options['file'] == '-'
+        source = options['source']
+        if source is None:
+            if stdin:
+                raise CommandError('--source is required for stdin.')
+            source = path.abspath(options['file'])
+
+        input_type = options['type']
+        if input_type is None:
+            input_type = path.splitext(options['file'])[1].lstrip('.')
+            if input_type not in READERS:
+                input_type = 'ndjson'
+
+        importer = RecipeImporter(user, source, options['batch_size'])
+        if options['restart']:
+            importer.reset()
+        start = importer.get_position()
+        if start:
+            self.stdout.write(f'Resuming after record {start}.')
+
+        f = sys.stdin if stdin else open(
+            options['file'],
+            newline='',
+            encoding='utf-8',
+        )
+        started = monotonic()
+        position = start
+        try:
+            for position in importer.run(READERS[input_type](f)):
+                rate = (position - start) / (monotonic() - started)
+                self.stdout.write(
+                    f'Imported {position} records ({rate:.0f}/s).'
+                )
+        except (ValidationError, ValueError) as exc:
+            raise CommandError(
+                f'{exc}; the records up to {position} are imported.'
+            )
+        finally:
+            if not stdin:
+                f.close()
+
+        elapsed = monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {position - start} recipes in {elapsed:.1f}s.'
+        ))
@@ -0,0 +1,80 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from os import cpu_count
+from time import sleep
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from recipe.images import ImageProcessor, get_config
+
+
+class Command(BaseCommand):
+    """Process the queued recipe image uploads."""
+
+    help = (
+        'Decode, orient, downscale and re-encode the queued recipe image '
+        'uploads in a pool of processes. Run as many commands as needed: '
+        'each one claims its own jobs.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            default=cpu_count() or 1,
+            type=int,
+            help='Processes rendering images, 0 to render in this one.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Jobs claimed at once, BATCH_SIZE per worker by default.',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            default=1.0,
+            type=float,
+            help='Seconds to wait when the queue is empty.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty.',
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers < 0 or (options['batch_size'] or 1) < 1:
+            raise CommandError(
+                '--workers must not be negative, --batch-size positive.'
+            )
+
+        batch_size = options['batch_size'] or (
+            get_config()['BATCH_SIZE'] * max(workers, 1)
+        )
+
+        with ExitStack() as stack:
+            pool = None
+            if workers:
+                # The workers are forked; they must not share our
+                # connections. They all start on the first submit, so do
+                # it before any query opens one again.
+                connections.close_all()
+                pool = stack.enter_context(ProcessPoolExecutor(workers))
+                pool.submit(int).result()
+
+            processor = ImageProcessor(pool, batch_size)
+            processed = 0
+            while True:
+                count = processor.run_batch()
+                processed += count
+                if count:
+                    self.stdout.write(f'Processed {processed} images.')
+                elif options['once']:
+                    break
+                else:
+                    sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} images.'
+        ))
@@ -0,0 +1,204 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.encoding import escape_uri_path
+from django.utils.http import http_date
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import NotFound
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+from core.authentication import CachedTokenAuthentication
+from core.models import Recipe
+from recipe.images import get_variant
+
+DEFAULTS = {
+    # Who sends the file once access is granted: 'django' streams it from
+    # Python, 'x-accel-redirect' hands it to nginx, 'x-sendfile' to Apache
+    # or lighttpd.
+    'BACKEND': 'django',
+    # Internal nginx location aliasing MEDIA_ROOT, for x-accel-redirect.
+    'INTERNAL_URL': '/protected-media/',
+    # Names are never reused for other content, so clients keep the files.
+    'MAX_AGE': 365 * 24 * 60 * 60,
+    # Bytes read at a time when streaming a range from Python.
+    'BLOCK_SIZE': 64 * 1024,
+}
+
+BACKENDS = (
+    'django',
+    'x-accel-redirect',
+    'x-sendfile',
+)
+
+# A single range; several in one request are answered with the whole file.
+BYTE_RANGE = re.compile(r'^bytes=(?P<start>[0-9]*)-(?P<end>[0-9]*)$')
+
+
+def get_config():
+    """Return the media delivery settings merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'MEDIA_DELIVERY', {})}
+
+
+def byte_range(header, size):
+    """Return the first and last byte requested by a Range header.
+
+    None for the whole file: without a header, or with one we don't
+    serve, which the client must accept. Raise ValueError when the range
+    starts past the end of the file.
+    """
+    match = BYTE_RANGE.match(header or '')
+    if match is None:
+        return None
+
+    start, end = match.group('start', 'end')
+    if not start:
+        # The last ``end`` bytes.
+        if not end:
+            return None
+        if not int(end):
+            raise ValueError('Empty suffix range.')
+        return max(size - int(end), 0), size - 1
+
+    start = int(start)
+    if start >= size:
+        raise ValueError('Range starts past the end.')
+    end = min(int(end), size - 1) if end else size - 1
+    if end < start:
+        return None
+
+    return start, end
+
+
+def read_span(file, length, block_size):
+    """Yield ``length`` bytes of a file from its position, then close it."""
+    try:
+        while length > 0:
+            block = file.read(min(block_size, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+    finally:
+        file.close()
+
+
+def send_file(request, name, config):
+    """Return a response sending a stored file, or handing it off.
+
+    A range is sent only if the client's If-Range, when given, is our
+    Last-Modified; it has no other validator to compare. Raise
+    FileNotFoundError for a missing file sent from Python.
+    """
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    backend = config['BACKEND']
+    if backend not in BACKENDS:
+        raise ImproperlyConfigured(
+            f'MEDIA_DELIVERY BACKEND must be one of: {", ".join(BACKENDS)}.'
+        )
+
+    if backend == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = escape_uri_path(
+            config['INTERNAL_URL'] + name,
+        )
+        return response
+
+    if backend == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = default_storage.path(name)
+        return response
+
+    file = default_storage.open(name)
+    stat = os.fstat(file.fileno())
+    size = stat.st_size
+    last_modified = http_date(stat.st_mtime)
+
+    header = request.META.get('HTTP_RANGE')
+    if request.META.get('HTTP_IF_RANGE', last_modified) != last_modified:
+        # The client holds another copy: a range of ours won't complete it.
+        header = None
+
+    try:
+        span = byte_range(header, size)
+    except ValueError:
+        file.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if span is None:
+        # Sent by the WSGI server's file wrapper, sendfile() if it has it.
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = span
+        file.seek(start)
+        response = StreamingHttpResponse(
+            read_span(file, end - start + 1, config['BLOCK_SIZE']),
+            status=206,
+            content_type=content_type,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+
+    response['Accept-Ranges'] = 'bytes'
+    response['Last-Modified'] = last_modified
+    return response
+
+
+class SendAsIsNegotiation(BaseContentNegotiation):
+    """Files are sent in their own type, whatever the client accepts."""
+
+    def select_parser(self, request, parsers):
+        return parsers[0] if parsers else None
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class MediaView(APIView):
+    """Send recipe images and their variants to their owner.
+
+    Other users get a 404, like for a missing file, and so does anything
+    else in the media storage. Variants are rendered on first request.
+    The file is sent by the front proxy when one is configured, from
+    Python otherwise. Names are unique, so the files are cached for good;
+    privately, as access is checked.
+    """
+
+    authentication_classes = (
+        CachedTokenAuthentication,
+        SessionAuthentication,
+    )
+    permission_classes = (
+        IsAuthenticated,
+    )
+    content_negotiation_class = SendAsIsNegotiation
+
+    def get(self, request, name):
+        recipes = Recipe.objects.filter(user=request.user)
+        variant = get_variant(name, recipes)
+        if variant is None and not recipes.filter(image=name).exists():
+            raise NotFound()
+
+        config = get_config()
+        try:
+            response = send_file(request, name, config)
+        except FileNotFoundError:
+            raise NotFound()
+        if response.status_code in (200, 206):
+            patch_cache_control(
+                response,
+                private=True,
+                max_age=config['MAX_AGE'],
+                immutable=True,
+            )
+
+        return response
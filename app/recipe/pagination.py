@@ -0,0 +1,205 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def encode_cursor(reverse, position):
+    """Encode a cursor into an opaque string."""
+    payload = json.dumps([int(reverse), position], separators=(',', ':'))
+    return urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    """Decode an opaque cursor, returning ``(reverse, position)``."""
+    try:
+        padded = value + '=' * (-len(value) % 4)
+        reverse, position = json.loads(urlsafe_b64decode(padded.encode()))
+    except (BinasciiError, TypeError, ValueError):
+        raise NotFound('Invalid cursor.')
+
+    # Keys are scalars; rows past null or nested values can't be sought,
+    # nor past strings PostgreSQL can't hold.
+    if not isinstance(position, list) or not all(
+        isinstance(value, (str, int, float))
+        and not (isinstance(value, str) and '\x00' in value)
+        for value in position
+    ):
+        raise NotFound('Invalid cursor.')
+
+    return bool(reverse), position
+
+
+class KeysetPagination(BasePagination):
+    """Keyset (seek) pagination over a stable, unique ordering.
+
+    Every page is fetched with ``WHERE <key> beyond <last key> LIMIT n``, so
+    with an index on the ordering a deep page costs the same as the first
+    one and no ``COUNT(*)`` is ever issued. The last ordering field must be
+    unique to break ties.
+    """
+
+    ordering = (
+        'id',
+    )
+    page_size = 100
+    max_page_size = 1000
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Return one page of rows."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(view)
+
+        value = request.query_params.get(self.cursor_query_param)
+        self.cursor = decode_cursor(value) if value else None
+
+        reverse, position = self.cursor or (False, None)
+        if position is not None and len(position) != len(self.ordering):
+            raise NotFound('Invalid cursor.')
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [self._invert(f) for f in ordering]
+
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self._seek(ordering, position))
+            except (TypeError, ValueError, ValidationError):
+                # A value the field can't hold, e.g. text for an id.
+                raise NotFound('Invalid cursor.')
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        if rows:
+            self.first_position = self._get_position(rows[0])
+            self.last_position = self._get_position(rows[-1])
+        else:
+            # An empty page can only be left the way it was reached.
+            self.first_position = self.last_position = position
+
+        return rows
+
+    def get_paginated_response(self, data):
+        """Wrap a page into the response envelope."""
+        return Response(OrderedDict((
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        )))
+
+    def get_page_size(self, request):
+        """Return the page size requested by the client, if any."""
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_ordering(self, view):
+        """Return the ordering of the view, if it sets one, or the default.
+
+        Views may vary the ordering per request with
+        ``get_pagination_ordering()``, e.g. to page through ranked results.
+        """
+        get_ordering = getattr(view, 'get_pagination_ordering', None)
+        ordering = get_ordering() if get_ordering else None
+
+        return tuple(ordering or self.ordering)
+
+    def get_next_link(self):
+        """Link to the page after the last row."""
+        if not self.has_next or self.last_position is None:
+            return None
+
+        return self._link(False, self.last_position)
+
+    def get_previous_link(self):
+        """Link to the page before the first row."""
+        if not self.has_previous or self.first_position is None:
+            return None
+
+        return self._link(True, self.first_position)
+
+    def _link(self, reverse, position):
+        """Build a link with an encoded cursor."""
+        url = remove_query_param(self.base_url, self.cursor_query_param)
+        return replace_query_param(
+            url,
+            self.cursor_query_param,
+            encode_cursor(reverse, position),
+        )
+
+    def _get_position(self, row):
+        """Return the key of a row, either a model instance or a dict."""
+        if isinstance(row, dict):
+            return [row[f.lstrip('-')] for f in self.ordering]
+
+        return [getattr(row, f.lstrip('-')) for f in self.ordering]
+
+    @staticmethod
+    def _invert(field):
+        """Invert the direction of an ordering field."""
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _seek(ordering, position):
+        """Build the condition selecting rows past ``position``.
+
+        Expands the row comparison for mixed directions, e.g. for
+        ``(-name, id)``: ``name < n OR (name = n AND id > i)``. The redundant
+        bound on the leading field lets the index scan start at the key
+        instead of filtering every row before it.
+        """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+
+        leading = ordering[0]
+        lookup = 'lte' if leading.startswith('-') else 'gte'
+        bound = Q(**{f'{leading.lstrip("-")}__{lookup}': position[0]})
+
+        return bound & condition
+
+
+class NamePagination(KeysetPagination):
+    """Tags and ingredients, by name."""
+
+    ordering = (
+        '-name',
+        'id',
+    )
+
+
+class RecipePagination(KeysetPagination):
+    """Recipes, newest first."""
+
+    ordering = (
+        '-id',
+    )
@@ -1,6 +1,66 @@
+from django.db import transaction
+from django.utils.timezone import now
 from rest_framework import serializers
+from rest_framework.serializers import raise_errors_on_nested_writes
 
-from core.models import Tag, Ingredient, Recipe
+from core.cache import response_cache
+from core.models import ChangeSequence, Tag, Ingredient, Recipe
+from core.search import update_search_vectors
+from core.signals import deferred_relinks
+from recipe.fields import ImageSrcsetField, UserPrimaryKeyRelatedField
+from recipe.images import inspect_upload, stage_upload
+from recipe.m2m import insert_related, sync_related
+
+RELATED_FIELDS = (
+    'ingredients',
+    'tags',
+)
+
+
+def pop_related(validated_data):
+    """Pop the submitted related ids out of validated data."""
+    return {
+        name: [obj.pk for obj in validated_data.pop(name)]
+        for name in RELATED_FIELDS
+        if name in validated_data
+    }
+
+
+def assign_changed(instance, validated_data):
+    """Set the attributes that differ, returning their names."""
+    changed = [
+        attr for attr, value in validated_data.items()
+        if getattr(instance, attr) != value
+    ]
+    for attr in changed:
+        setattr(instance, attr, validated_data[attr])
+
+    return changed
+
+
+class SparseFieldsMixin:
+    """Serializer trimmed to the fields requested in its context.
+
+    ``context['fields']`` names the fields to keep, all by default, and
+    ``context['expand']`` the relations nested as objects instead of ids.
+    """
+
+    expandable = {}
+
+    def get_fields(self):
+        """Drop the fields not requested and nest the expanded ones."""
+        fields = super().get_fields()
+
+        requested = self.context.get('fields')
+        if requested:
+            for name in set(fields) - set(requested):
+                del fields[name]
+
+        for name in self.context.get('expand', ()):
+            if name in fields:
+                fields[name] = self.expandable[name](many=True, read_only=True)
+
+        return fields
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -31,17 +91,122 @@ class IngredientSerializer(serializers.ModelSerializer):
         )
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeListSerializer(serializers.ListSerializer):
+    """Validates and writes many recipes with a fixed number of queries."""
+
+    def to_internal_value(self, data):
+        """Resolve the related ids of every item before validating."""
+        if isinstance(data, list):
+            self.context['related_objects'] = self._resolve_related(data)
+
+        return super().to_internal_value(data)
+
+    def create(self, validated_data):
+        """Insert the recipes and their links in one statement each."""
+        related = [pop_related(attrs) for attrs in validated_data]
+
+        recipes = [Recipe(**attrs) for attrs in validated_data]
+
+        with transaction.atomic():
+            ChangeSequence.objects.assign(recipes)
+            recipes = Recipe.objects.bulk_create(recipes)
+            for name in RELATED_FIELDS:
+                insert_related(name, {
+                    recipe: ids[name]
+                    for recipe, ids in zip(recipes, related)
+                    if ids.get(name)
+                })
+
+            # Bulk writes send no signals.
+            update_search_vectors(recipe.pk for recipe in recipes)
+            for user_id in {recipe.user_id for recipe in recipes}:
+                response_cache.invalidate(user_id)
+
+        return recipes
+
+    def update(self, instances, validated_data):
+        """Write only the changed columns and links of many recipes."""
+        changed, fields = [], set()
+        related = {name: {} for name in RELATED_FIELDS}
+
+        for instance, attrs in zip(instances, validated_data):
+            for name, ids in pop_related(attrs).items():
+                related[name][instance] = ids
+
+            attrs_changed = assign_changed(instance, attrs)
+            if attrs_changed:
+                changed.append(instance)
+                fields.update(attrs_changed)
+
+        with transaction.atomic():
+            indexed = {r.pk for r in changed} if 'title' in fields else set()
+            written = set(changed)
+            for name, desired in related.items():
+                if desired:
+                    relinked = sync_related(name, desired, send_signals=False)
+                    indexed.update(recipe.pk for recipe in relinked)
+                    written.update(relinked)
+
+            if written:
+                # Unlike save(), bulk_update() neither fills in auto_now
+                # fields nor numbers the changes.
+                written = sorted(written, key=lambda recipe: recipe.pk)
+                updated_at = now()
+                for recipe in written:
+                    recipe.updated_at = updated_at
+                ChangeSequence.objects.assign(written)
+
+                Recipe.objects.bulk_update(
+                    written,
+                    sorted(fields | {'updated_at', 'change_seq'}),
+                )
+
+            # Bulk writes send no signals.
+            update_search_vectors(indexed)
+            for user_id in {recipe.user_id for recipe in written}:
+                response_cache.invalidate(user_id)
+
+        return instances
+
+    def _resolve_related(self, data):
+        """Fetch the related objects of all items, one query per field."""
+        resolved = {}
+        for name in RELATED_FIELDS:
+            field = self.child.fields[name]
+
+            pks = set()
+            for item in data:
+                values = item.get(name) if isinstance(item, dict) else None
+                if isinstance(values, list):
+                    pks.update(field.to_pk(v) for v in values)
+            pks.discard(None)
+
+            queryset = field.child_relation.get_queryset()
+            resolved[name] = queryset.in_bulk(pks) if pks else {}
+
+        return resolved
+
+
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Recipe Serializer."""
 
-    ingredients = serializers.PrimaryKeyRelatedField(
+    expandable = {
+        'ingredients': IngredientSerializer,
+        'tags': TagSerializer,
+    }
+
+    ingredients = UserPrimaryKeyRelatedField(
         many=True,
         queryset=Ingredient.objects.all(),
     )
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = UserPrimaryKeyRelatedField(
         many=True,
         queryset=Tag.objects.all(),
     )
+    image_srcset = ImageSrcsetField(
+        source='image',
+        width_source='image_width',
+    )
 
     class Meta:
         model = Recipe
@@ -53,10 +218,55 @@ class RecipeSerializer(serializers.ModelSerializer):
             'time_minutes',
             'price',
             'link',
+            'image_status',
+            'image_srcset',
         )
         read_only_fields = (
             'id',
+            'image_status',
         )
+        list_serializer_class = RecipeListSerializer
+
+    def create(self, validated_data):
+        """Insert the recipe and its links, indexing and numbering it once.
+
+        Like ``RecipeListSerializer.create()``: ``set()`` would reindex
+        and renumber the recipe once per relation.
+        """
+        raise_errors_on_nested_writes('create', self, validated_data)
+
+        related = pop_related(validated_data)
+        instance = Recipe(**validated_data)
+
+        with transaction.atomic(), deferred_relinks():
+            ChangeSequence.objects.assign([instance])
+            instance, = Recipe.objects.bulk_create([instance])
+            for name, ids in related.items():
+                if ids:
+                    insert_related(name, {instance: ids})
+
+            # Bulk writes send no signals.
+            update_search_vectors([instance.pk])
+            response_cache.invalidate(instance.user_id)
+
+        return instance
+
+    def update(self, instance, validated_data):
+        """Write only the columns and links that changed."""
+        raise_errors_on_nested_writes('update', self, validated_data)
+
+        related = pop_related(validated_data)
+
+        # The tags and the ingredients relink the recipe once.
+        with transaction.atomic(), deferred_relinks():
+            changed = assign_changed(instance, validated_data)
+            if changed:
+                instance.save(update_fields=[*changed, 'updated_at'])
+
+            for name, ids in related.items():
+                sync_related(name, {instance: ids})
+
+        return instance
 
 
 class RecipeDetailSerializer(RecipeSerializer):
@@ -67,14 +277,37 @@ class RecipeDetailSerializer(RecipeSerializer):
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
-    """Upload image serializer."""
+    """Upload image serializer.
+
+    The upload is only checked from its header and queued; the recipe
+    keeps its current image until a worker has processed the new one.
+    """
+
+    image = serializers.FileField()
+    image_srcset = ImageSrcsetField(
+        source='image',
+        width_source='image_width',
+    )
 
     class Meta:
         model = Recipe
         fields = (
             'id',
             'image',
+            'image_status',
+            'image_srcset',
         )
         read_only_fields = (
             'id',
+            'image_status',
         )
+
+    def validate_image(self, value):
+        """Check the upload is an image we can process."""
+        inspect_upload(value)
+        return value
+
+    def update(self, instance, validated_data):
+        """Queue the upload for processing."""
+        stage_upload(instance, validated_data['image'])
+        return instance
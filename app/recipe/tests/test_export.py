@@ -0,0 +1,123 @@
+import csv
+import json
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.shortcuts import reverse
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.export import export_recipes
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+class ExportTests(TestCase):
+    """Test the streamed recipe export."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='j@j.com',
+            password='123qwerty',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ('Dessert', 'Crème')
+        ]
+        self.ingredient = Ingredient.objects.create(
+            user=self.user,
+            name='Sugar',
+        )
+        self.recipes = []
+        for n in range(3):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=f'Recipe {n}',
+                time_minutes=10,
+                price='5.50',
+            )
+            recipe.tags.add(*self.tags[:n])
+            self.recipes.append(recipe)
+        self.recipes[0].ingredients.add(self.ingredient)
+
+    def read(self, res):
+        """Return the streamed body of a response."""
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return b''.join(res.streaming_content).decode()
+
+    def test_ndjson(self):
+        """Test every recipe is a line of JSON, oldest first."""
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in self.read(res).splitlines()]
+        self.assertEqual(
+            [line['id'] for line in lines],
+            [recipe.id for recipe in self.recipes],
+        )
+        self.assertEqual(lines[2]['tags'], ['Dessert', 'Crème'])
+        self.assertEqual(lines[0]['price'], '5.50')
+        self.assertEqual(lines[0]['ingredients'], ['Sugar'])
+
+    def test_csv(self):
+        """Test the CSV has a header and joins the names."""
+        res = self.client.get(EXPORT_URL, {'type': 'csv'})
+
+        self.assertEqual(res['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(StringIO(self.read(res))))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[2]['tags'], 'Dessert|Crème')
+        self.assertEqual(rows[0]['ingredients'], 'Sugar')
+
+    def test_chunked(self):
+        """Test the related names are read per chunk of recipes."""
+        recipes = Recipe.objects.filter(user=self.user)
+        # The recipes, then two relations per chunk of two.
+        with self.assertNumQueries(5):
+            rows = list(export_recipes(recipes, chunk_size=2))
+
+        self.assertEqual(
+            [row['tags'] for row in rows],
+            [[], ['Dessert'], ['Dessert', 'Crème']],
+        )
+
+    def test_filtered_and_limited_to_user(self):
+        """Test the list filters apply, and other users are left out."""
+        other = get_user_model().objects.create_user(
+            email='g@g.com',
+            password='123qwerty',
+        )
+        Recipe.objects.create(
+            user=other,
+            title='Other',
+            time_minutes=10,
+            price=5,
+        )
+
+        res = self.client.get(EXPORT_URL, {'tags': self.tags[1].id})
+
+        lines = self.read(res).splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])['id'], self.recipes[2].id)
+
+    def test_invalid_type(self):
+        """Test an unknown format is rejected."""
+        res = self.client.get(EXPORT_URL, {'type': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_command(self):
+        """Test the command writes the same lines."""
+        out = StringIO()
+
+        call_command('export_recipes', 'j@j.com', stdout=out)
+
+        self.assertEqual(out.getvalue(), self.read(self.client.get(
+            EXPORT_URL,
+        )))
@@ -0,0 +1,169 @@
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.shortcuts import reverse
+from django.test import TestCase
+from rest_framework import serializers, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from core.tests.utils import ClearResponseCacheMixin
+from recipe.fastpath import FastSerializer, get_fast_serializer
+from recipe.serializers import (
+    IngredientSerializer,
+    RecipeDetailSerializer,
+    RecipeImageSerializer,
+    RecipeSerializer,
+    TagSerializer,
+)
+from recipe.views import optimize_recipes
+
+
+class FastSerializerParityTests(TestCase):
+    """Test the fast path renders the same bytes as the serializers."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            email='j@j.com',
+            password='123qwerty',
+        )
+        tags = [
+            Tag.objects.create(user=cls.user, name=name)
+            for name in ('Vegan', 'Dessert', 'Crème brûlée', '"Quoted"')
+        ]
+        ingredients = [
+            Ingredient.objects.create(user=cls.user, name=name)
+            for name in ('Salt', 'Sugar', 'Ünïcode')
+        ]
+        for n, price in enumerate(('5', '5.5', '0.10', '999.99', '0')):
+            recipe = Recipe.objects.create(
+                user=cls.user,
+                title=f'Recipe {n}',
+                time_minutes=n * 7,
+                price=Decimal(price),
+                link='' if n % 2 else f'https://example.com/{n}',
+                image=(None, '', f'uploads/recipe/{n}.jpg')[n % 3],
+            )
+            # Linked in reverse to check the order doesn't leak through.
+            recipe.tags.add(*reversed(tags[:n]))
+            recipe.ingredients.add(*ingredients[n % 2:])
+
+    def assertParity(self, serializer_class, qs, fields=(), expand=()):
+        """Assert both paths render identical JSON."""
+        context = {'fields': list(fields), 'expand': list(expand)}
+        expected = JSONRenderer().render(
+            serializer_class(qs, many=True, context=context).data,
+        )
+
+        fast = get_fast_serializer(serializer_class, fields, expand)
+        self.assertIsNotNone(fast)
+        actual = JSONRenderer().render(
+            fast.serialize(list(qs.values(*fast.columns))),
+        )
+
+        self.assertEqual(actual, expected)
+
+    def test_tags(self):
+        """Test tag parity."""
+        self.assertParity(TagSerializer, Tag.objects.order_by('-name', 'id'))
+
+    def test_ingredients(self):
+        """Test ingredient parity."""
+        self.assertParity(
+            IngredientSerializer,
+            Ingredient.objects.order_by('-name', 'id'),
+        )
+
+    def test_recipes(self):
+        """Test recipe parity, relations included."""
+        qs = optimize_recipes(
+            Recipe.objects.order_by('-id'),
+            RecipeSerializer.Meta.fields,
+        )
+
+        self.assertParity(RecipeSerializer, qs)
+
+    def test_recipe_details(self):
+        """Test recipe detail parity, nested objects included."""
+        qs = optimize_recipes(
+            Recipe.objects.order_by('-id'),
+            RecipeDetailSerializer.Meta.fields,
+            nested=('ingredients', 'tags'),
+        )
+
+        self.assertParity(RecipeDetailSerializer, qs)
+
+    def test_sparse_and_expanded(self):
+        """Test parity with sparse fieldsets and expansions."""
+        for fields, expand in (
+            (('title',), ()),
+            (('price', 'id', 'tags'), ()),
+            (('id', 'tags', 'ingredients'), ('tags',)),
+            ((), ('ingredients', 'tags')),
+        ):
+            qs = optimize_recipes(
+                Recipe.objects.order_by('-id'),
+                fields or RecipeSerializer.Meta.fields,
+                nested=expand,
+            )
+            with self.subTest(fields=fields, expand=expand):
+                self.assertParity(RecipeSerializer, qs, fields, expand)
+
+    def test_unsupported(self):
+        """Test serializers with file fields are not compiled."""
+        self.assertIsNone(
+            FastSerializer.compile(RecipeImageSerializer(context={})),
+        )
+
+
+class FastReadAPITests(ClearResponseCacheMixin, TestCase):
+    """Test the endpoints read through the fast path."""
+
+    def setUp(self):
+        super().setUp()
+
+        self.user = get_user_model().objects.create_user(
+            email='j@j.com',
+            password='123qwerty',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Cheesecake',
+            time_minutes=10,
+            price=5,
+        )
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='Cake'))
+
+    def test_reads_use_fast_path(self):
+        """Test list and retrieve skip the regular serializers."""
+        for url in (
+            reverse('recipe:recipe-list'),
+            reverse('recipe:recipe-detail', args=[self.recipe.id]),
+            reverse('recipe:tag-list'),
+        ):
+            with self.subTest(url=url):
+                with patch.object(
+                    serializers.Serializer,
+                    'to_representation',
+                ) as to_representation:
+                    res = self.client.get(url)
+
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                to_representation.assert_not_called()
+
+    def test_detail(self):
+        """Test the detail nests the tags."""
+        res = self.client.get(
+            reverse('recipe:recipe-detail', args=[self.recipe.id]),
+        )
+
+        self.assertEqual(
+            res.data,
+            RecipeDetailSerializer(self.recipe).data,
+        )
@@ -0,0 +1,104 @@
+import os
+from io import StringIO
+from time import time
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.models import ImageJob, Recipe
+from core.tests.utils import TemporaryMediaMixin
+
+DAY = 24 * 60 * 60
+
+
+class GcMediaCommandTests(TemporaryMediaMixin, TestCase):
+    """Test orphaned media files are collected."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(
+            email='j@j.com',
+            password='123qwerty',
+        )
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Cheesecake',
+            time_minutes=10,
+            price=5,
+            image='uploads/recipe/kept.jpg',
+        )
+        ImageJob.objects.create(
+            recipe=self.recipe,
+            staged='staging/recipe/queued.png',
+        )
+
+        self.files = {
+            name: self.store(name)
+            for name in (
+                'uploads/recipe/kept.jpg',
+                'uploads/recipe/kept-64w.webp',
+                'staging/recipe/queued.png',
+                'uploads/recipe/replaced.jpg',
+                'uploads/recipe/replaced-64w.webp',
+                'uploads/recipe/replaced.jpg.0a1b.tmp',
+                'staging/recipe/discarded.png',
+            )
+        }
+        self.young = self.store('uploads/recipe/young.jpg', age=60)
+        self.other = self.store('other/kept.txt')
+
+    def store(self, name, age=2 * DAY):
+        """Write a file last changed ``age`` seconds ago."""
+        name = default_storage.save(name, ContentFile(b'x' * 10))
+        mtime = time() - age
+        os.utime(default_storage.path(name), (mtime, mtime))
+        return name
+
+    def gc(self, **options):
+        """Run the command, return its output."""
+        out = StringIO()
+        call_command('gc_media', stdout=out, batch_size=2, **options)
+        return out.getvalue()
+
+    def remaining(self):
+        """Return the names of the files left."""
+        root = default_storage.location
+        return {
+            os.path.relpath(os.path.join(directory, name), root)
+            for directory, _, names in os.walk(root)
+            for name in names
+        }
+
+    def test_collected(self):
+        """Test only the old unreferenced files are deleted."""
+        out = self.gc()
+
+        self.assertIn('Deleted 4 orphans, 40 bytes', out)
+        self.assertEqual(self.remaining(), {
+            'uploads/recipe/kept.jpg',
+            'uploads/recipe/kept-64w.webp',
+            'staging/recipe/queued.png',
+            self.young,
+            self.other,
+        })
+
+    def test_dry_run(self):
+        """Test a dry run reports without deleting."""
+        out = self.gc(dry_run=True)
+
+        self.assertIn('Found 4 orphans, 40 bytes', out)
+        self.assertEqual(
+            self.remaining(),
+            {*self.files, self.young, self.other},
+        )
+
+    def test_deleted_owner(self):
+        """Test the images of deleted users are collected too."""
+        self.user.delete()
+
+        self.gc(min_age=0)
+
+        self.assertEqual(self.remaining(), {self.other})
@@ -0,0 +1,372 @@
+import os
+from hashlib import sha256
+from io import BytesIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.shortcuts import reverse
+from django.test import RequestFactory, TestCase, override_settings
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from core.models import ImageJob, Recipe
+from core.tests.utils import TemporaryMediaMixin
+from recipe import images
+from recipe.images import (
+    EXIF_ORIENTATION,
+    ImageProcessor,
+    get_variant,
+    inspect_upload,
+    srcset,
+    stage_upload,
+    variant_name,
+)
+
+
+def image_upload(size=(40, 20), image_format='JPEG', mode='RGB', color='red',
+                 **params):
+    """Return an uploaded image file."""
+    image = BytesIO()
+    Image.new(mode, size, color).save(image, format=image_format, **params)
+    return SimpleUploadedFile(
+        f'image.{image_format.lower()}',
+        image.getvalue(),
+    )
+
+
+def exif_orientation(value):
+    """Return an EXIF block holding only an orientation.
+
+    Pillow 5 can read EXIF, not write it; this is a little-endian TIFF
+    header and a single IFD entry.
+    """
+    return (
+        b'Exif\x00\x00II*\x00\x08\x00\x00\x00\x01\x00'
+        + EXIF_ORIENTATION.to_bytes(2, 'little')
+        + b'\x03\x00\x01\x00\x00\x00'
+        + value.to_bytes(2, 'little')
+        + b'\x00\x00\x00\x00\x00\x00'
+    )
+
+
+@override_settings(IMAGE_PROCESSING={'MAX_DIMENSION': 32})
+class ImageProcessorTests(TemporaryMediaMixin, TestCase):
+    """Test queued uploads are processed."""
+
+    def setUp(self):
+        super().setUp()
+        user = get_user_model().objects.create_user(
+            email='j@j.com',
+            password='123qwerty',
+        )
+        self.recipe = Recipe.objects.create(
+            user=user,
+            title='Cheesecake',
+            time_minutes=10,
+            price=5,
+        )
+
+    def process(self):
+        """Run the queue, return the recipe as processed."""
+        while ImageProcessor().run_batch():
+            pass
+        self.recipe.refresh_from_db()
+        return self.recipe
+
+    def test_processed(self):
+        """Test an image is downscaled and re-encoded without metadata."""
+        job = stage_upload(self.recipe, image_upload((80, 20), dpi=(300, 300)))
+        self.assertTrue(default_storage.exists(job.staged))
+
+        recipe = self.process()
+
+        self.assertEqual(recipe.image_status, Recipe.IMAGE_READY)
+        self.assertTrue(recipe.image.name.endswith('.jpg'))
+        self.assertEqual(recipe.image_width, 32)
+        with Image.open(recipe.image.path) as image:
+            self.assertEqual(image.size, (32, 8))
+            self.assertNotIn('dpi', image.info)
+        self.assertFalse(ImageJob.objects.exists())
+
+    def test_exif_orientation(self):
+        """Test rotated photos are turned upright."""
+        stage_upload(self.recipe, image_upload(
+            (30, 10),
+            exif=exif_orientation(6),
+        ))
+
+        with Image.open(self.process().image.path) as image:
+            self.assertEqual(image.size, (10, 30))
+
+    def test_transparency_kept(self):
+        """Test images with alpha become PNGs."""
+        stage_upload(self.recipe, image_upload(
+            image_format='PNG',
+            mode='RGBA',
+        ))
+
+        recipe = self.process()
+
+        self.assertTrue(recipe.image.name.endswith('.png'))
+        with Image.open(recipe.image.path) as image:
+            self.assertEqual(image.mode, 'RGBA')
+
+    def test_failed(self):
+        """Test an undecodable upload fails its job, not the queue."""
+        upload = image_upload()
+        upload.file.truncate(len(upload.file.getvalue()) // 2)
+        stage_upload(self.recipe, upload)
+
+        recipe = self.process()
+
+        self.assertEqual(recipe.image_status, Recipe.IMAGE_FAILED)
+        self.assertFalse(recipe.image)
+        job = ImageJob.objects.get()
+        self.assertEqual(job.status, ImageJob.FAILED)
+        self.assertTrue(job.error)
+
+    def test_superseded(self):
+        """Test only the last upload of a recipe ends up as its image."""
+        first = stage_upload(self.recipe, image_upload((20, 20)))
+        stage_upload(self.recipe, image_upload((30, 10)))
+
+        ImageProcessor(batch_size=1).run_batch()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_PROCESSING)
+        self.assertFalse(self.recipe.image)
+        self.assertFalse(ImageJob.objects.filter(pk=first.pk).exists())
+
+        with Image.open(self.process().image.path) as image:
+            self.assertEqual(image.size, (30, 10))
+
+    def test_superseded_finished_first(self):
+        """Test an earlier upload finishing last doesn't replace a later."""
+        first = stage_upload(self.recipe, image_upload((20, 20)))
+        second = stage_upload(self.recipe, image_upload((30, 10)))
+        processor = ImageProcessor()
+
+        processor.finish(second, 'uploads/recipe/second.jpg', 30)
+        processor.finish(first, 'uploads/recipe/first.jpg', 20)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image.name, 'uploads/recipe/second.jpg')
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_READY)
+
+    def test_users_in_order(self):
+        """Test a batch writes the recipes of its users in user order."""
+        other = Recipe.objects.create(
+            user=get_user_model().objects.create_user(
+                email='a@a.com',
+                password='123qwerty',
+            ),
+            title='Pie',
+            time_minutes=10,
+            price=5,
+        )
+        stage_upload(other, image_upload((20, 20)))
+        stage_upload(self.recipe, image_upload((30, 10)))
+
+        with patch.object(
+            ImageProcessor,
+            'update_recipe',
+            wraps=ImageProcessor.update_recipe,
+        ) as update:
+            ImageProcessor(batch_size=2).run_batch()
+
+        self.assertEqual(
+            [call[0][0].recipe.user_id for call in update.call_args_list],
+            sorted([self.recipe.user_id, other.user_id]),
+        )
+
+    def test_deduplicated(self):
+        """Test identical uploads are rendered once and share their image."""
+        upload = image_upload()
+        digest = sha256(upload.read()).hexdigest()
+        other = Recipe.objects.create(
+            user=self.recipe.user,
+            title='Pie',
+            time_minutes=10,
+            price=5,
+        )
+
+        with patch.object(
+            images,
+            'render_image',
+            wraps=images.render_image,
+        ) as render:
+            for recipe in (self.recipe, other):
+                stage_upload(recipe, image_upload())
+            self.process()
+            self.assertEqual(render.call_count, 1)
+
+            stage_upload(other, image_upload())
+            self.process()
+            self.assertEqual(render.call_count, 1)
+
+        other.refresh_from_db()
+        self.assertEqual(
+            self.recipe.image.name,
+            f'uploads/recipe/{digest}.jpg',
+        )
+        self.assertEqual(other.image.name, self.recipe.image.name)
+        self.assertEqual(other.image_width, self.recipe.image_width)
+        self.assertEqual(other.image_status, Recipe.IMAGE_READY)
+
+    def test_hashed_on_receipt(self):
+        """Test uploads are hashed by the upload handlers."""
+        upload = image_upload()
+        content = upload.read()
+        for size in (len(content) * 2, 0):
+            with self.subTest(size=size), \
+                    override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=size):
+                upload.seek(0)
+                request = RequestFactory().post('/', {'image': upload})
+                file = request.FILES['image']
+
+                self.assertEqual(
+                    file.content_hash,
+                    sha256(content).hexdigest(),
+                )
+                self.assertEqual(file.read(), content)
+
+    def test_inspect_upload(self):
+        """Test uploads are refused from their header."""
+        self.assertEqual(inspect_upload(image_upload()), 'JPEG')
+        for upload, config in (
+            (SimpleUploadedFile('image.jpg', b'not an image'), {}),
+            (image_upload(image_format='BMP'), {}),
+            (image_upload(), {'MAX_PIXELS': 100}),
+            (image_upload(), {'MAX_UPLOAD_SIZE': 100}),
+        ):
+            with self.subTest(config=config), \
+                    override_settings(IMAGE_PROCESSING=config):
+                with self.assertRaises(serializers.ValidationError):
+                    inspect_upload(upload)
+
+
+@override_settings(IMAGE_PROCESSING={
+    'VARIANT_WIDTHS': (16, 64),
+    'VARIANT_FORMATS': ('webp', 'jpg'),
+})
+class ImageVariantTests(TemporaryMediaMixin, TestCase):
+    """Test variants are rendered on first request and kept."""
+
+    def setUp(self):
+        super().setUp()
+        user = get_user_model().objects.create_user(
+            email='j@j.com',
+            password='123qwerty',
+        )
+        self.recipe = Recipe.objects.create(
+            user=user,
+            title='Cheesecake',
+            time_minutes=10,
+            price=5,
+        )
+        self.recipe.image_width = 40
+        self.recipe.image.save('image.png', image_upload(
+            (40, 20),
+            image_format='PNG',
+            mode='RGBA',
+            color=(255, 0, 0, 128),
+        ))
+
+    def get(self, width, extension):
+        """Request a variant of the recipe image, as its owner."""
+        name = variant_name(self.recipe.image.name, width, extension)
+        client = APIClient()
+        client.force_authenticate(self.recipe.user)
+        return client.get(reverse('media', args=[name]))
+
+    def test_srcset(self):
+        """Test every format lists the widths up to the image's own."""
+        stem = self.recipe.image.name[:-len('.png')]
+
+        self.assertEqual(srcset(self.recipe.image.name, 40), {
+            'image/webp': (
+                f'/media/{stem}-16w.webp 16w, /media/{stem}-64w.webp 40w'
+            ),
+            'image/jpeg': (
+                f'/media/{stem}-16w.jpg 16w, /media/{stem}-64w.jpg 40w'
+            ),
+        })
+        self.assertEqual(
+            srcset(self.recipe.image.name, 16)['image/webp'],
+            f'/media/{stem}-16w.webp 16w',
+        )
+
+    def test_srcset_width_unknown(self):
+        """Test every width is listed for images of unknown width."""
+        stem = self.recipe.image.name[:-len('.png')]
+
+        self.assertEqual(
+            srcset(self.recipe.image.name)['image/jpeg'],
+            f'/media/{stem}-16w.jpg 16w, /media/{stem}-64w.jpg 64w',
+        )
+
+    def test_rendered_once(self):
+        """Test the first request renders the variant, later ones read it."""
+        name = variant_name(self.recipe.image.name, 16, 'webp')
+
+        res = self.get(16, 'webp')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['Content-Type'], 'image/webp')
+        with Image.open(BytesIO(b''.join(res.streaming_content))) as image:
+            self.assertEqual(image.size, (16, 8))
+            self.assertEqual(image.mode, 'RGBA')
+        rendered = os.stat(default_storage.path(name)).st_mtime_ns
+
+        res = self.get(16, 'webp')
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(b''.join(res.streaming_content))
+        self.assertEqual(
+            os.stat(default_storage.path(name)).st_mtime_ns,
+            rendered,
+        )
+
+    def test_formats(self):
+        """Test JPEG variants drop alpha and images are never upscaled."""
+        res = self.get(64, 'jpg')
+
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        with Image.open(BytesIO(b''.join(res.streaming_content))) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (40, 20))
+
+    def test_not_a_variant(self):
+        """Test unknown widths, formats and images aren't rendered."""
+        for width, extension in ((32, 'webp'), (16, 'png')):
+            with self.subTest(width=width, extension=extension):
+                self.assertEqual(self.get(width, extension).status_code, 404)
+
+        self.assertIsNone(get_variant(
+            'uploads/recipe/missing-16w.webp',
+            Recipe.objects.all(),
+        ))
+        self.assertFalse(default_storage.exists(
+            variant_name(self.recipe.image.name, 32, 'webp'),
+        ))
+
+    def test_source_missing(self):
+        """Test variants of a deleted image are not found."""
+        default_storage.delete(self.recipe.image.name)
+
+        self.assertEqual(self.get(16, 'webp').status_code, 404)
+
+    def test_serialized(self):
+        """Test the recipe serializers expose the srcset."""
+        client = APIClient()
+        client.force_authenticate(self.recipe.user)
+        expected = srcset(self.recipe.image.name, 40)
+
+        for name, args in (
+            ('recipe-list', []),
+            ('recipe-detail', [self.recipe.id]),
+        ):
+            with self.subTest(name):
+                res = client.get(reverse(f'recipe:{name}', args=args))
+                data = res.data['results'][0] if args == [] else res.data
+                self.assertEqual(data['image_srcset'], expected)
@@ -0,0 +1,144 @@
+import json
+from io import StringIO
+from tempfile import NamedTemporaryFile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from core.models import ChangeSequence, Ingredient, Recipe, Tag
+from recipe.export import export_recipes, render_csv, render_ndjson
+
+
+def sample_records(count, **params):
+    """Return recipe records like the export writes them."""
+    records = []
+    for n in range(count):
+        record = {
+            'title': f'Recipe {n}',
+            'time_minutes': n,
+            'price': '5.50',
+            'link': '',
+            'tags': ['Dessert', 'dessert', f'Tag {n % 2}'],
+            'ingredients': ['Sugar'] if n % 2 else [],
+        }
+        record.update(params)
+        records.append(record)
+
+    return records
+
+
+class ImportCommandTests(TestCase):
+    """Test the import_recipes command."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='j@j.com',
+            password='123qwerty',
+        )
+        self.tag = Tag.objects.create(user=self.user, name='DESSERT')
+
+    def call(self, lines, suffix='.ndjson', **options):
+        """Import the lines from a file, return the output."""
+        options.setdefault('user', 'j@j.com')
+        out = StringIO()
+        with NamedTemporaryFile('w', suffix=suffix) as f:
+            f.writelines(lines)
+            f.flush()
+            call_command(
+                'import_recipes',
+                f.name,
+                stdout=out,
+                **options
+            )
+
+        return out.getvalue()
+
+    def test_import(self):
+        """Test recipes are imported with their related names resolved."""
+        self.call(
+            render_ndjson(sample_records(5)),
+            batch_size=2,
+        )
+
+        recipes = Recipe.objects.filter(user=self.user).order_by('id')
+        self.assertEqual(
+            [recipe.title for recipe in recipes],
+            [f'Recipe {n}' for n in range(5)],
+        )
+        # Names match the existing objects case-insensitively.
+        self.assertEqual(
+            sorted(Tag.objects.values_list('name', flat=True)),
+            ['DESSERT', 'Tag 0', 'Tag 1'],
+        )
+        self.assertEqual(
+            list(recipes[1].tags.order_by('id')),
+            [self.tag, Tag.objects.get(name='Tag 1')],
+        )
+        self.assertEqual(Ingredient.objects.count(), 1)
+        self.assertEqual(recipes[1].ingredients.get().name, 'Sugar')
+
+        # Numbered for the sync and searchable.
+        last = ChangeSequence.objects.get(user=self.user).last
+        self.assertEqual(recipes.last().change_seq, last)
+        self.assertFalse(recipes.filter(search_vector__isnull=True).exists())
+
+    def test_round_trip(self):
+        """Test an export imports back as the same recipes, CSV included."""
+        self.call(render_ndjson(sample_records(
+            3,
+            ingredients=['Salt|Pepper', '"Fresh" herbs', 'Oil'],
+        )))
+        exported = list(render_csv(export_recipes(
+            Recipe.objects.filter(user=self.user),
+        )))
+
+        other = get_user_model().objects.create_user(
+            email='g@g.com',
+            password='123qwerty',
+        )
+        self.call(exported, suffix='.csv', user='g@g.com')
+
+        def strip(lines):
+            return [line.split(',', 1)[1] for line in lines]
+
+        self.assertEqual(
+            strip(render_csv(export_recipes(
+                Recipe.objects.filter(user=other),
+            )))[1:],
+            strip(exported)[1:],
+        )
+        self.assertEqual(
+            sorted(Ingredient.objects.filter(user=other).values_list(
+                'name',
+                flat=True,
+            )),
+            ['"Fresh" herbs', 'Oil', 'Salt|Pepper'],
+        )
+
+    def test_resume(self):
+        """Test an import resumes after its last committed batch."""
+        records = sample_records(5)
+        records[3]['price'] = 'free'
+        lines = list(render_ndjson(records))
+
+        with self.assertRaisesRegex(CommandError, 'Record 4'):
+            self.call(lines, batch_size=2, source='recipes')
+        self.assertEqual(Recipe.objects.count(), 2)
+
+        lines[3] = json.dumps({**records[3], 'price': '1'}) + '\n'
+        out = self.call(lines, batch_size=2, source='recipes')
+
+        self.assertIn('Resuming after record 2', out)
+        self.assertEqual(
+            [recipe.title for recipe in Recipe.objects.order_by('id')],
+            [f'Recipe {n}' for n in range(5)],
+        )
+
+        # Done; nothing is imported twice.
+        self.call(lines, source='recipes')
+        self.assertEqual(Recipe.objects.count(), 5)
+
+        self.call(lines, source='recipes', restart=True)
+        self.assertEqual(Recipe.objects.count(), 10)
@@ -5,6 +5,7 @@ from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Ingredient, Recipe
+from core.tests.utils import ClearResponseCacheMixin
 from recipe.serializers import IngredientSerializer
 
 
@@ -23,7 +24,7 @@ class PublicIngredientsAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateIngredientsAPITests(TestCase):
+class PrivateIngredientsAPITests(ClearResponseCacheMixin, TestCase):
     """Authorized API for ingredients."""
 
     @classmethod
@@ -53,7 +54,7 @@ class PrivateIngredientsAPITests(TestCase):
         ing = Ingredient.objects.all().order_by('-name')
         ser = IngredientSerializer(ing, many=True)
 
-        self.assertEqual(res.data, ser.data)
+        self.assertEqual(res.data['results'], ser.data)
 
     def test_ingredients_limited_to_user(self):
         """Test own ingredients."""
@@ -69,8 +70,8 @@ class PrivateIngredientsAPITests(TestCase):
         res = self.client.get(reverse('recipe:ingredient-list'))
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], ing.name)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], ing.name)
 
     def test_create_ing_successful(self):
         """Test success."""
@@ -115,8 +116,8 @@ class PrivateIngredientsAPITests(TestCase):
         ser1 = IngredientSerializer(ing1)
         ser2 = IngredientSerializer(ing2)
 
-        self.assertIn(ser1.data, res.data)
-        self.assertNotIn(ser2.data, res.data)
+        self.assertIn(ser1.data, res.data['results'])
+        self.assertNotIn(ser2.data, res.data['results'])
 
     def test_retrieve_ingredients_assigned_are_unique(self):
         """Test uniqueness."""
@@ -144,4 +145,20 @@ class PrivateIngredientsAPITests(TestCase):
             {'assigned_only': 1},
         )
 
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_bulk_get_or_create_ingredients(self):
+        """Test resolving many names at once."""
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+
+        res = self.client.post(
+            reverse('recipe:ingredient-bulk'),
+            ['salt', 'Pepper'],
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(ing['id'], ing['name']) for ing in res.data],
+            [(salt.id, 'Salt'), (res.data[1]['id'], 'Pepper')],
+        )
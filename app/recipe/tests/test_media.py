@@ -0,0 +1,163 @@
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.shortcuts import reverse
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from core.tests.utils import TemporaryMediaMixin
+from recipe.media import byte_range
+
+CONTENT = bytes(range(256)) * 4
+
+
+class ByteRangeTests(TestCase):
+    """Test Range headers are parsed like RFC 7233 says."""
+
+    def test_ranges(self):
+        """Test the spans of satisfiable and ignored ranges."""
+        for header, expected in (
+            (None, None),
+            ('bytes=0-9', (0, 9)),
+            ('bytes=10-', (10, 99)),
+            ('bytes=90-200', (90, 99)),
+            ('bytes=-10', (90, 99)),
+            ('bytes=-200', (0, 99)),
+            ('bytes=0-1,5-6', None),
+            ('bytes=9-0', None),
+            ('lines=0-9', None),
+        ):
+            with self.subTest(header=header):
+                self.assertEqual(byte_range(header, 100), expected)
+
+    def test_unsatisfiable(self):
+        """Test ranges outside the file are refused."""
+        for header in ('bytes=100-', 'bytes=-0'):
+            with self.subTest(header=header):
+                with self.assertRaises(ValueError):
+                    byte_range(header, 100)
+
+
+class MediaViewTests(TemporaryMediaMixin, TestCase):
+    """Test media is sent to the owner of the recipe only."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(
+            email='j@j.com',
+            password='123qwerty',
+        )
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Cheesecake',
+            time_minutes=10,
+            price=5,
+        )
+        self.recipe.image.save('image.jpg', ContentFile(CONTENT))
+        self.url = reverse('media', args=[self.recipe.image.name])
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_owner(self):
+        """Test the owner gets the file, cached for good, privately."""
+        with self.assertNumQueries(1):
+            res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(b''.join(res.streaming_content), CONTENT)
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res['Accept-Ranges'], 'bytes')
+        self.assertEqual(
+            set(res['Cache-Control'].split(', ')),
+            {'private', 'max-age=31536000', 'immutable'},
+        )
+
+    def test_not_owner(self):
+        """Test other users and unreferenced files get a 404."""
+        other = get_user_model().objects.create_user(
+            email='k@k.com',
+            password='123qwerty',
+        )
+        client = APIClient()
+        client.force_authenticate(other)
+        res = client.get(self.url)
+        self.assertEqual(res.status_code, 404)
+        self.assertNotIn('Cache-Control', res)
+
+        staged = default_storage.save('staging/recipe/x.jpg', ContentFile(b''))
+        res = self.client.get(reverse('media', args=[staged]))
+        self.assertEqual(res.status_code, 404)
+
+    def test_anonymous(self):
+        """Test authentication is required."""
+        res = APIClient().get(self.url)
+
+        self.assertEqual(res.status_code, 401)
+
+    def test_range(self):
+        """Test a range is sent alone, with its position."""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(b''.join(res.streaming_content), CONTENT[10:20])
+        self.assertEqual(res['Content-Range'], f'bytes 10-19/{len(CONTENT)}')
+        self.assertEqual(res['Content-Length'], '10')
+
+    def test_range_unsatisfiable(self):
+        """Test ranges past the end are refused with the size."""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=5000-')
+
+        self.assertEqual(res.status_code, 416)
+        self.assertEqual(res['Content-Range'], f'bytes */{len(CONTENT)}')
+
+    def test_if_range(self):
+        """Test a range is sent only for the copy the client holds."""
+        res = self.client.get(self.url)
+        b''.join(res.streaming_content)
+        last_modified = res['Last-Modified']
+
+        for if_range, status_code in (
+            (last_modified, 206),
+            ('Wed, 21 Oct 2015 07:28:00 GMT', 200),
+            ('"etag"', 200),
+        ):
+            with self.subTest(if_range=if_range):
+                res = self.client.get(
+                    self.url,
+                    HTTP_RANGE='bytes=10-19',
+                    HTTP_IF_RANGE=if_range,
+                )
+
+                self.assertEqual(res.status_code, status_code)
+                b''.join(res.streaming_content)
+
+    def test_missing_file(self):
+        """Test a referenced file gone from the storage is not found."""
+        default_storage.delete(self.recipe.image.name)
+
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, 404)
+
+    def test_front_proxy(self):
+        """Test the transfer can be handed to the front proxy."""
+        name = self.recipe.image.name
+        for backend, header, value in (
+            ('x-accel-redirect', 'X-Accel-Redirect', f'/internal/{name}'),
+            ('x-sendfile', 'X-Sendfile', default_storage.path(name)),
+        ):
+            with self.subTest(backend=backend), override_settings(
+                MEDIA_DELIVERY={
+                    'BACKEND': backend,
+                    'INTERNAL_URL': '/internal/',
+                },
+            ):
+                res = self.client.get(self.url)
+
+                self.assertEqual(res.status_code, 200)
+                self.assertEqual(res[header], value)
+                self.assertEqual(res['Content-Type'], 'image/jpeg')
+                self.assertFalse(res.content)
+                self.assertIn('immutable', res['Cache-Control'])
@@ -0,0 +1,339 @@
+from io import BytesIO, StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.shortcuts import reverse
+from django.test import TestCase
+from PIL import Image
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from core.tests.utils import (
+    QueryBudgetMixin,
+    QueryPlanMixin,
+    TemporaryMediaMixin,
+    capture_queries,
+    route_names,
+)
+from recipe import urls
+
+# Queries per request, whatever the size of the data. Reads include the
+# aggregate validating their ETag; writes their savepoints, the reserved
+# change numbers and the search index update; deletes their image jobs.
+BUDGETS = {
+    ('api-root', 'GET'): 0,
+    ('sync', 'GET'): 7,
+    ('tag-list', 'GET'): 3,
+    ('tag-list', 'POST'): 4,
+    ('tag-bulk', 'POST'): 3,
+    ('ingredient-list', 'GET'): 3,
+    ('ingredient-list', 'POST'): 4,
+    ('ingredient-bulk', 'POST'): 3,
+    ('recipe-list', 'GET'): 4,
+    ('recipe-list', 'POST'): 11,
+    ('recipe-detail', 'GET'): 4,
+    ('recipe-detail', 'PUT'): 18,
+    ('recipe-detail', 'PATCH'): 13,
+    ('recipe-detail', 'DELETE'): 9,
+    ('recipe-upload-image', 'POST'): 6,
+    ('recipe-bulk', 'POST'): 14,
+    ('recipe-bulk', 'PUT'): 21,
+    ('recipe-bulk', 'PATCH'): 21,
+    ('recipe-bulk', 'DELETE'): 12,
+    ('recipe-export', 'GET'): 3,
+}
+
+
+def url(name, *args):
+    """Reverse a route of the recipe app."""
+    return reverse(f'recipe:{name}', args=args)
+
+
+def unlink(*recipe_ids):
+    """Reset the title and the links of recipes, so a write changes them."""
+    recipes = Recipe.objects.filter(pk__in=recipe_ids)
+    recipes.update(title='Unlinked')
+    for field in ('tags', 'ingredients'):
+        getattr(Recipe, field).through.objects.filter(
+            recipe_id__in=recipe_ids,
+        ).delete()
+
+
+class RecipeQueryBudgetTests(
+    TemporaryMediaMixin,
+    QueryBudgetMixin,
+    TestCase,
+):
+    """Test the recipe routes run a fixed number of queries."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(
+            email='j@j.com',
+            password='123qwerty',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def populate(self, size):
+        """Create recipes, tags and ingredients, each recipe linked."""
+        for model in (Tag, Ingredient):
+            for n in range(model.objects.count(), size):
+                model.objects.create(user=self.user, name=f'Name {n}')
+        tags = list(Tag.objects.order_by('id'))
+        ingredients = list(Ingredient.objects.order_by('id'))
+
+        for n in range(Recipe.objects.count(), size):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=f'Recipe {n}',
+                time_minutes=10,
+                price=5,
+            )
+            recipe.tags.add(*tags[:3])
+            recipe.ingredients.add(*ingredients[:3])
+
+        # Read here, so that building requests runs no query.
+        self.object_ids = {
+            model: list(model.objects.order_by('id').values_list(
+                'id',
+                flat=True,
+            ))
+            for model in (Tag, Ingredient, Recipe)
+        }
+
+    def ids(self, model, size):
+        """Return the ids of the first ``size`` objects."""
+        return self.object_ids[model][:size]
+
+    def recipe_payload(self, size, n=0):
+        """Return a recipe linked to ``size`` tags and ingredients."""
+        return {
+            'title': f'New {n}',
+            'time_minutes': 5,
+            'price': '1.00',
+            'tags': self.ids(Tag, size),
+            'ingredients': self.ids(Ingredient, size),
+        }
+
+    def check(self, name, method, request, prepare=None):
+        """Assert the budget of a route."""
+        return self.assertQueryBudget(
+            BUDGETS[name, method],
+            request,
+            prepare,
+        )
+
+    def test_every_route_budgeted(self):
+        """Test no route is left without a budget."""
+        self.assertEqual(
+            set(route_names(urls.urlpatterns)),
+            {name for name, _ in BUDGETS},
+        )
+
+    def test_root(self):
+        """Test the API root."""
+        self.check('api-root', 'GET', lambda size: self.client.get(
+            url('api-root'),
+        ))
+
+    def test_sync(self):
+        """Test the delta sync."""
+        self.check('sync', 'GET', lambda size: self.client.get(url('sync')))
+
+    def test_tags(self):
+        """Test listing and creating tags and ingredients."""
+        for name in ('tag', 'ingredient'):
+            with self.subTest(name=name):
+                self.check(f'{name}-list', 'GET', lambda size: (
+                    self.client.get(url(f'{name}-list'), {'assigned_only': 1})
+                ))
+                self.check(f'{name}-list', 'POST', lambda size: (
+                    self.client.post(url(f'{name}-list'), {
+                        'name': f'Other {size}',
+                    })
+                ))
+                self.check(f'{name}-bulk', 'POST', lambda size: (
+                    self.client.post(
+                        url(f'{name}-bulk'),
+                        [f'Bulk {size} {n}' for n in range(size)],
+                        format='json',
+                    )
+                ))
+
+    def test_recipe_list(self):
+        """Test listing recipes, filtered, searched and expanded."""
+        for name, params in (
+            ('plain', lambda: {}),
+            ('filter', lambda: {
+                'tags': ','.join(map(str, self.ids(Tag, 2))),
+                'ingredients': self.ids(Ingredient, 1)[0],
+            }),
+            ('search', lambda: {'search': 'recipe'}),
+            ('expand', lambda: {'expand': 'tags,ingredients'}),
+        ):
+            with self.subTest(name):
+                self.check('recipe-list', 'GET', lambda size: (
+                    self.client.get(url('recipe-list'), params())
+                ))
+
+    def test_recipe_create(self):
+        """Test creating a recipe linked to every tag and ingredient."""
+        self.check('recipe-list', 'POST', lambda size: self.client.post(
+            url('recipe-list'),
+            self.recipe_payload(size),
+            format='json',
+        ))
+
+    def test_recipe_detail(self):
+        """Test reading, updating and deleting a recipe."""
+        self.populate(1)
+        pk = self.ids(Recipe, 1)[0]
+
+        self.check('recipe-detail', 'GET', lambda size: self.client.get(
+            url('recipe-detail', pk),
+        ))
+        self.check(
+            'recipe-detail',
+            'PUT',
+            lambda size: self.client.put(
+                url('recipe-detail', pk),
+                self.recipe_payload(size, size),
+                format='json',
+            ),
+            lambda size: unlink(pk),
+        )
+        self.check(
+            'recipe-detail',
+            'PATCH',
+            lambda size: self.client.patch(
+                url('recipe-detail', pk),
+                {'tags': self.ids(Tag, size)},
+                format='json',
+            ),
+            lambda size: unlink(pk),
+        )
+
+    def test_recipe_delete(self):
+        """Test deleting a linked recipe."""
+        self.check('recipe-detail', 'DELETE', lambda size: (
+            self.client.delete(url('recipe-detail', self.ids(Recipe, 1)[0]))
+        ))
+
+    def test_upload_image(self):
+        """Test uploading the image of a recipe."""
+        self.populate(1)
+        pk = self.ids(Recipe, 1)[0]
+
+        def upload(size):
+            image = BytesIO()
+            Image.new('RGB', (10, 10)).save(image, format='JPEG')
+            image.name = 'image.jpg'
+            image.seek(0)
+            return self.client.post(
+                url('recipe-upload-image', pk),
+                {'image': image},
+                format='multipart',
+            )
+
+        self.check('recipe-upload-image', 'POST', upload)
+
+    def test_bulk(self):
+        """Test writing ``size`` recipes at once."""
+        self.check('recipe-bulk', 'POST', lambda size: self.client.post(
+            url('recipe-bulk'),
+            [self.recipe_payload(size, n) for n in range(size)],
+            format='json',
+        ))
+        for method in ('PUT', 'PATCH'):
+            with self.subTest(method=method):
+                self.check(
+                    'recipe-bulk',
+                    method,
+                    lambda size: getattr(self.client, method.lower())(
+                        url('recipe-bulk'),
+                        [
+                            {'id': pk, **self.recipe_payload(size, pk)}
+                            for pk in self.ids(Recipe, size)
+                        ],
+                        format='json',
+                    ),
+                    lambda size: unlink(*self.ids(Recipe, size)),
+                )
+        self.check('recipe-bulk', 'DELETE', lambda size: self.client.delete(
+            url('recipe-bulk'),
+            self.ids(Recipe, size),
+            format='json',
+        ))
+
+    def test_export(self):
+        """Test exporting every recipe."""
+        self.check('recipe-export', 'GET', lambda size: self.client.get(
+            url('recipe-export'),
+        ))
+
+
+class RecipeQueryPlanTests(QueryPlanMixin, TestCase):
+    """Test the reads of a seeded database go through indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'seed_data',
+            users=20,
+            recipes=50,
+            email_prefix='plan',
+            stdout=StringIO(),
+        )
+        cls.user = get_user_model().objects.get(email='plan-0@example.com')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertReadIndexed(self, path, params=None):
+        """Assert the queries of a read scan no core table."""
+        response, queries = capture_queries(
+            lambda: self.client.get(path, params),
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIndexed(queries)
+
+    def test_recipes(self):
+        """Test listing, filtering, searching and reading recipes."""
+        recipe = Recipe.objects.filter(user=self.user).first()
+        tag = Tag.objects.filter(user=self.user).first()
+        ingredient = Ingredient.objects.filter(user=self.user).first()
+
+        for path, params in (
+            (url('recipe-list'), {}),
+            (url('recipe-list'), {'expand': 'tags,ingredients'}),
+            (url('recipe-list'), {'tags': tag.id}),
+            (url('recipe-list'), {'ingredients': ingredient.id}),
+            (url('recipe-list'), {'search': recipe.title.split()[-1]}),
+            (url('recipe-detail', recipe.id), {}),
+            (url('recipe-export'), {}),
+        ):
+            with self.subTest(path=path, params=params):
+                self.assertReadIndexed(path, params)
+
+    def test_tags(self):
+        """Test listing tags and ingredients, assigned ones too."""
+        for name in ('tag', 'ingredient'):
+            for params in ({}, {'assigned_only': 1}):
+                with self.subTest(name=name, params=params):
+                    self.assertReadIndexed(url(f'{name}-list'), params)
+
+    def test_sync(self):
+        """Test the delta sync, from scratch and from a change."""
+        for params in ({}, {'since': 10}):
+            with self.subTest(params=params):
+                self.assertReadIndexed(url('sync'), params)
+
+    def test_detects_sequential_scans(self):
+        """Test a query no index serves fails the check."""
+        with self.assertRaises(AssertionError):
+            self.assertIndexed([
+                "SELECT id FROM core_recipe WHERE link = 'x'",
+            ])
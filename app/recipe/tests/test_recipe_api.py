@@ -1,14 +1,19 @@
+from io import StringIO
 from tempfile import NamedTemporaryFile
 from os import path
 
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
 from django.shortcuts import reverse
-from django.test import TestCase
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APIClient
 from PIL import Image
 
 from core.models import Recipe, Tag, Ingredient
+from core.tests.utils import ClearResponseCacheMixin, TemporaryMediaMixin
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
 
 
@@ -52,7 +57,7 @@ class PublicRecipeAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateRecipeAPITests(TestCase):
+class PrivateRecipeAPITests(ClearResponseCacheMixin, TestCase):
     """Private Recipe API."""
 
     @classmethod
@@ -64,6 +69,8 @@ class PrivateRecipeAPITests(TestCase):
         )
 
     def setUp(self):
+        super().setUp()
+
         self.client = APIClient()
         self.client.force_authenticate(self.user)
 
@@ -80,7 +87,7 @@ class PrivateRecipeAPITests(TestCase):
 
         serializer = RecipeSerializer(recipes, many=True)
 
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipes_limited_to_user(self):
         """Test recipes are limited to own user."""
@@ -96,12 +103,27 @@ class PrivateRecipeAPITests(TestCase):
         res = self.client.get(reverse('recipe:recipe-list'))
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
 
         recipes = Recipe.objects.filter(user=self.user)
         serializer = RecipeSerializer(recipes, many=True)
 
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
+
+    def test_recipes_paginated(self):
+        """Test walking the pages of recipes."""
+        recipes = [sample_recipe(self.user) for _ in range(5)]
+
+        ids = []
+        url = reverse('recipe:recipe-list') + '?page_size=2'
+        while url:
+            res = self.client.get(url)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            ids.extend(recipe['id'] for recipe in res.data['results'])
+            url = res.data['next']
+
+        self.assertEqual(ids, [recipe.id for recipe in reversed(recipes)])
 
     def test_recipe_detail(self):
         """Test viewing recipe detail."""
@@ -118,6 +140,102 @@ class PrivateRecipeAPITests(TestCase):
 
         self.assertEqual(res.data, sr.data)
 
+    def test_list_recipes_query_count(self):
+        """Test listing runs a fixed number of queries."""
+        for n in range(10):
+            recipe = sample_recipe(self.user, title=f'Recipe {n}')
+            recipe.tags.add(sample_tag(self.user, name=f'Tag {n}'))
+            recipe.ingredients.add(
+                sample_ingredient(self.user, name=f'Ingredient {n}'),
+            )
+
+        # The validator aggregate, recipes, ingredients and tags.
+        with self.assertNumQueries(4):
+            res = self.client.get(reverse('recipe:recipe-list'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 10)
+
+    def test_recipe_detail_query_count(self):
+        """Test viewing recipe detail runs a fixed number of queries."""
+        recipe = sample_recipe(self.user)
+        for n in range(5):
+            recipe.tags.add(sample_tag(self.user, name=f'Tag {n}'))
+            recipe.ingredients.add(
+                sample_ingredient(self.user, name=f'Ingredient {n}'),
+            )
+
+        url = reverse('recipe:recipe-detail', args=[recipe.id])
+        # The validator, recipe, ingredients and tags.
+        with self.assertNumQueries(4):
+            res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['tags']), 5)
+        self.assertEqual(len(res.data['ingredients']), 5)
+
+    def test_list_sparse_fields(self):
+        """Test only the requested fields are fetched and returned."""
+        recipe = sample_recipe(self.user)
+        recipe.tags.add(sample_tag(self.user))
+
+        # The validator aggregate and the recipes, no relation loaded.
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(
+                reverse('recipe:recipe-list'),
+                {'fields': 'id,title'},
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['results'],
+            [{'id': recipe.id, 'title': recipe.title}],
+        )
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertNotIn('"price"', ctx.captured_queries[-1]['sql'])
+
+    def test_list_expand(self):
+        """Test expanding relations nests them in the list."""
+        tag = sample_tag(self.user)
+        recipe = sample_recipe(self.user)
+        recipe.tags.add(tag)
+
+        # The validator aggregate, the recipes and the tags.
+        with self.assertNumQueries(3):
+            res = self.client.get(
+                reverse('recipe:recipe-list'),
+                {'fields': 'title,tags', 'expand': 'tags'},
+            )
+
+        self.assertEqual(
+            res.data['results'],
+            [{
+                'title': recipe.title,
+                'tags': [{'id': tag.id, 'name': tag.name}],
+            }],
+        )
+
+    def test_detail_sparse_fields(self):
+        """Test trimming the recipe detail."""
+        recipe = sample_recipe(self.user)
+
+        res = self.client.get(
+            reverse('recipe:recipe-detail', args=[recipe.id]),
+            {'fields': 'title,price'},
+        )
+
+        self.assertEqual(res.data, {'title': recipe.title, 'price': '5.00'})
+
+    def test_sparse_fields_invalid(self):
+        """Test unknown fields and relations are rejected."""
+        url = reverse('recipe:recipe-list')
+
+        res = self.client.get(url, {'fields': 'title,secret'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(url, {'expand': 'user'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_create_basic_recipe(self):
         """Test creating basic recipe."""
         payload = {
@@ -178,6 +296,55 @@ class PrivateRecipeAPITests(TestCase):
         self.assertIn(ing1, ings)
         self.assertIn(ing2, ings)
 
+    def test_related_ids_validated_in_one_query(self):
+        """Test validating many related ids costs one query each."""
+        ings = [
+            sample_ingredient(self.user, name=f'Ingredient {n}')
+            for n in range(50)
+        ]
+        tags = [sample_tag(self.user, name=f'Tag {n}') for n in range(5)]
+
+        request = RequestFactory().post(reverse('recipe:recipe-list'))
+        request.user = self.user
+
+        serializer = RecipeSerializer(
+            data={
+                'title': 'Fifty ingredients soup',
+                'ingredients': [i.id for i in ings],
+                'tags': [t.id for t in tags],
+                'time_minutes': 90,
+                'price': 10.0,
+            },
+            context={'request': request},
+        )
+
+        with self.assertNumQueries(2):
+            self.assertTrue(serializer.is_valid())
+
+        self.assertEqual(serializer.validated_data['ingredients'], ings)
+        self.assertEqual(serializer.validated_data['tags'], tags)
+
+    def test_related_ids_limited_to_user(self):
+        """Test other users' tags and missing ids are rejected at once."""
+        user2 = get_user_model().objects.create_user(
+            email='z@z.com',
+            password='123qwerty',
+        )
+        tag = sample_tag(self.user, name='Vegan')
+        foreign_tag = sample_tag(user2, name='Dessert')
+
+        payload = {
+            'title': 'Avocado Lime Cheesecake',
+            'tags': [tag.id, foreign_tag.id, 0],
+            'time_minutes': 60,
+            'price': 20.0,
+        }
+        res = self.client.post(reverse('recipe:recipe-list'), payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(f'"{foreign_tag.id}, 0"', res.data['tags'][0])
+        self.assertFalse(Recipe.objects.exists())
+
     def test_partial_update_recipe(self):
         """Patching a recipe."""
         recipe = sample_recipe(self.user)
@@ -224,6 +391,61 @@ class PrivateRecipeAPITests(TestCase):
         tags = recipe.tags.all()
         self.assertEqual(len(tags), 0)
 
+    def test_unchanged_update_writes_nothing(self):
+        """Test resending the same data issues no writes."""
+        recipe = sample_recipe(self.user)
+        tag = sample_tag(self.user)
+        recipe.tags.add(tag)
+
+        payload = {
+            'title': recipe.title,
+            'tags': [tag.id],
+            'price': '5.00',
+        }
+        url = reverse('recipe:recipe-detail', args=[recipe.id])
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(url, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        writes = [
+            q['sql'] for q in ctx.captured_queries
+            if q['sql'].startswith(('UPDATE', 'INSERT', 'DELETE'))
+        ]
+        self.assertEqual(writes, [])
+
+    def test_update_writes_only_changed_links(self):
+        """Test changing tags issues one delete and one insert."""
+        recipe = sample_recipe(self.user)
+        tag1 = sample_tag(self.user, name='Vegan')
+        tag2 = sample_tag(self.user, name='Spicy')
+        tag3 = sample_tag(self.user, name='Quick')
+        recipe.tags.add(tag1, tag2)
+
+        payload = {
+            'tags': [tag2.id, tag3.id],
+        }
+        url = reverse('recipe:recipe-detail', args=[recipe.id])
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(url, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        writes = [
+            q['sql'].split()[0] for q in ctx.captured_queries
+            if q['sql'].startswith(('UPDATE', 'INSERT', 'DELETE'))
+            and '"core_recipe_tags"' in q['sql']
+        ]
+        self.assertEqual(writes, ['DELETE', 'INSERT'])
+        self.assertGreater(
+            Recipe.objects.get(pk=recipe.pk).updated_at,
+            recipe.updated_at,
+        )
+        self.assertEqual(
+            set(recipe.tags.values_list('id', flat=True)),
+            {tag2.id, tag3.id},
+        )
+
     def test_filter_recipes_by_tags(self):
         """Test filtering by tags."""
         recipe1 = sample_recipe(self.user, title='Thai vegetable curry')
@@ -245,9 +467,9 @@ class PrivateRecipeAPITests(TestCase):
         ser2 = RecipeSerializer(recipe2)
         ser3 = RecipeSerializer(recipe3)
 
-        self.assertIn(ser1.data, res.data)
-        self.assertIn(ser2.data, res.data)
-        self.assertNotIn(ser3.data, res.data)
+        self.assertIn(ser1.data, res.data['results'])
+        self.assertIn(ser2.data, res.data['results'])
+        self.assertNotIn(ser3.data, res.data['results'])
 
     def test_filter_recipes_by_ingredients(self):
         """Test filtering by ingredients."""
@@ -270,12 +492,269 @@ class PrivateRecipeAPITests(TestCase):
         ser2 = RecipeSerializer(recipe2)
         ser3 = RecipeSerializer(recipe3)
 
-        self.assertIn(ser1.data, res.data)
-        self.assertIn(ser2.data, res.data)
-        self.assertNotIn(ser3.data, res.data)
+        self.assertIn(ser1.data, res.data['results'])
+        self.assertIn(ser2.data, res.data['results'])
+        self.assertNotIn(ser3.data, res.data['results'])
+
+    def test_filter_recipes_by_tags_unique(self):
+        """Test a recipe matching several tags is returned once."""
+        recipe = sample_recipe(self.user, title='Vegan curry')
+        tag1 = sample_tag(self.user, name='Vegan')
+        tag2 = sample_tag(self.user, name='Spicy')
+        ing = sample_ingredient(self.user, name='Chickpeas')
+        recipe.tags.add(tag1, tag2)
+        recipe.ingredients.add(ing)
+
+        res = self.client.get(
+            reverse('recipe:recipe-list'),
+            {'tags': f'{tag1.id},{tag2.id}', 'ingredients': f'{ing.id}'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['id'], recipe.id)
+
+    def test_filter_recipes_by_all_tags(self):
+        """Test filtering by recipes having every tag."""
+        recipe1 = sample_recipe(self.user, title='Vegan curry')
+        recipe2 = sample_recipe(self.user, title='Vegan salad')
+
+        tag1 = sample_tag(self.user, name='Vegan')
+        tag2 = sample_tag(self.user, name='Spicy')
 
+        recipe1.tags.add(tag1, tag2)
+        recipe2.tags.add(tag1)
 
-class RecipeUploadImageTests(TestCase):
+        res = self.client.get(
+            reverse('recipe:recipe-list'),
+            {'tags': f'{tag1.id},{tag2.id}', 'tags_mode': 'all'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [r['id'] for r in res.data['results']]
+        self.assertEqual(ids, [recipe1.id])
+
+    def test_filter_recipes_invalid(self):
+        """Test filtering with malformed params."""
+        url = reverse('recipe:recipe-list')
+
+        res = self.client.get(url, {'tags': '1,two'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(url, {'tags': '1', 'tags_mode': 'some'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_recipes(self):
+        """Test searching by title, tag and ingredient names."""
+        tag = sample_tag(user=self.user, name='Vegan')
+        ingredient = sample_ingredient(user=self.user, name='Chickpeas')
+        by_title = sample_recipe(user=self.user, title='Lemon tart')
+        by_tag = sample_recipe(user=self.user, title='Salad')
+        by_tag.tags.add(tag)
+        by_ingredient = sample_recipe(user=self.user, title='Hummus')
+        by_ingredient.ingredients.add(ingredient)
+        sample_recipe(user=self.user, title='Steak')
+        url = reverse('recipe:recipe-list')
+
+        for term, recipe in (
+            ('lemon', by_title),
+            ('vegan', by_tag),
+            ('chickpea', by_ingredient),
+        ):
+            res = self.client.get(url, {'search': term})
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            ids = [r['id'] for r in res.data['results']]
+            self.assertEqual(ids, [recipe.id])
+
+    def test_search_recipes_typo(self):
+        """Test a misspelled title still matches."""
+        recipe = sample_recipe(user=self.user, title='Spaghetti carbonara')
+        sample_recipe(user=self.user, title='Steak')
+
+        res = self.client.get(
+            reverse('recipe:recipe-list'),
+            {'search': 'spagetti carbonara'},
+        )
+
+        ids = [r['id'] for r in res.data['results']]
+        self.assertEqual(ids, [recipe.id])
+
+    def test_search_recipes_nul(self):
+        """Test a NUL character in the term is dropped."""
+        recipe = sample_recipe(user=self.user, title='Lemon tart')
+
+        res = self.client.get(
+            reverse('recipe:recipe-list'),
+            {'search': 'lem\x00on'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [r['id'] for r in res.data['results']]
+        self.assertEqual(ids, [recipe.id])
+
+    def test_search_recipes_ranked(self):
+        """Test title matches rank first and pages follow the rank."""
+        tag = sample_tag(user=self.user, name='Chocolate')
+        by_tag = sample_recipe(user=self.user, title='Brownies')
+        by_tag.tags.add(tag)
+        by_title = sample_recipe(user=self.user, title='Chocolate mousse')
+        url = reverse('recipe:recipe-list')
+
+        res = self.client.get(url, {'search': 'chocolate', 'page_size': 1})
+        self.assertEqual(
+            [r['id'] for r in res.data['results']],
+            [by_title.id],
+        )
+
+        res = self.client.get(res.data['next'])
+        self.assertEqual(
+            [r['id'] for r in res.data['results']],
+            [by_tag.id],
+        )
+        self.assertIsNone(res.data['next'])
+
+
+class RecipeBulkAPITests(TestCase):
+    """Test the bulk recipe endpoint."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = get_user_model().objects.create_user(
+            email='j@j.com',
+            password='123qwerty',
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('recipe:recipe-bulk')
+        self.tags = [sample_tag(self.user, name=f'Tag {n}') for n in range(3)]
+        self.ings = [
+            sample_ingredient(self.user, name=f'Ingredient {n}')
+            for n in range(3)
+        ]
+
+    def payload(self, count):
+        """Build recipes to create."""
+        return [
+            {
+                'title': f'Recipe {n}',
+                'time_minutes': n,
+                'price': '1.50',
+                'tags': [tag.id for tag in self.tags],
+                'ingredients': [self.ings[n % 3].id],
+            }
+            for n in range(count)
+        ]
+
+    def test_bulk_create(self):
+        """Test creating many recipes at once."""
+        res = self.client.post(self.url, self.payload(3), format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [recipe['title'] for recipe in res.data],
+            ['Recipe 0', 'Recipe 1', 'Recipe 2'],
+        )
+
+        recipe = Recipe.objects.get(id=res.data[1]['id'])
+        self.assertEqual(recipe.user, self.user)
+        self.assertEqual(recipe.tags.count(), 3)
+        self.assertEqual(list(recipe.ingredients.all()), [self.ings[1]])
+
+    def test_bulk_create_query_count(self):
+        """Test the number of queries doesn't depend on the batch size."""
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(self.url, self.payload(2), format='json')
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(self.url, self.payload(20), format='json')
+
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(Recipe.objects.count(), 22)
+
+    def test_bulk_create_errors_by_index(self):
+        """Test invalid items are reported and nothing is written."""
+        payload = self.payload(3)
+        payload[1]['title'] = ''
+        payload[2]['tags'] = [0]
+
+        res = self.client.post(self.url, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            [error['index'] for error in res.data['errors']],
+            [1, 2],
+        )
+        self.assertIn('title', res.data['errors'][0]['errors'])
+        self.assertIn('tags', res.data['errors'][1]['errors'])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_partial_update(self):
+        """Test patching many recipes at once."""
+        recipe1 = sample_recipe(self.user)
+        recipe2 = sample_recipe(self.user)
+        recipe2.tags.add(self.tags[0])
+
+        payload = [
+            {'id': recipe1.id, 'title': 'Renamed'},
+            {'id': recipe2.id, 'tags': [self.tags[1].id]},
+        ]
+        res = self.client.patch(self.url, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        recipe1.refresh_from_db()
+        self.assertEqual(recipe1.title, 'Renamed')
+        self.assertEqual(list(recipe2.tags.all()), [self.tags[1]])
+
+    def test_bulk_update_unknown_ids(self):
+        """Test other users' and duplicated ids are rejected."""
+        user2 = get_user_model().objects.create_user(
+            email='z@z.com',
+            password='123qwerty',
+        )
+        recipe = sample_recipe(self.user)
+        foreign = sample_recipe(user2)
+
+        payload = [
+            {'id': recipe.id, 'title': 'Renamed'},
+            {'id': foreign.id, 'title': 'Renamed'},
+            {'id': recipe.id, 'title': 'Renamed'},
+            {'title': 'Renamed'},
+        ]
+        res = self.client.patch(self.url, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            [error['index'] for error in res.data['errors']],
+            [1, 2, 3],
+        )
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'Sample Recipe')
+
+    def test_bulk_delete(self):
+        """Test deleting many recipes at once."""
+        recipes = [sample_recipe(self.user) for _ in range(3)]
+
+        res = self.client.delete(
+            self.url,
+            [recipes[0].id, recipes[2].id],
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(list(Recipe.objects.all()), [recipes[1]])
+
+    def test_bulk_not_a_list(self):
+        """Test the payload must be a list."""
+        res = self.client.post(self.url, {'title': 'One'}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeUploadImageTests(TemporaryMediaMixin, TestCase):
     """Test image uploads."""
 
     @classmethod
@@ -287,15 +766,13 @@ class RecipeUploadImageTests(TestCase):
         )
 
     def setUp(self):
+        super().setUp()
         self.client = APIClient()
         self.client.force_authenticate(self.user)
         self.recipe = sample_recipe(user=self.user)
 
-    def tearDown(self):
-        self.recipe.image.delete()
-
     def test_upload_image(self):
-        """Test uploading an image."""
+        """Test an upload is queued, then processed by a worker."""
         url = upload_image_url(self.recipe.id)
         with NamedTemporaryFile(suffix='.jpg') as tf:
             img = Image.new('RGB', (10, 10))
@@ -305,12 +782,20 @@ class RecipeUploadImageTests(TestCase):
 
             res = self.client.post(url, {'image': tf}, format='multipart')
 
-            self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_PROCESSING)
+        self.assertIsNone(res.data['image'])
 
-            self.recipe.refresh_from_db()
+        call_command(
+            'process_images',
+            once=True,
+            workers=0,
+            stdout=StringIO(),
+        )
+        self.recipe.refresh_from_db()
 
-            self.assertIn('image', res.data)
-            self.assertTrue(path.exists(self.recipe.image.path))
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_READY)
+        self.assertTrue(path.exists(self.recipe.image.path))
 
     def test_upload_image_invalid(self):
         """Test uploading invalid image."""
@@ -318,3 +803,16 @@ class RecipeUploadImageTests(TestCase):
         res = self.client.post(url, {'image': 'not image'}, format='multipart')
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(self.recipe.image_jobs.exists())
+
+    def test_upload_image_unsupported_format(self):
+        """Test formats we don't process are refused from their header."""
+        url = upload_image_url(self.recipe.id)
+        with NamedTemporaryFile(suffix='.bmp') as tf:
+            Image.new('RGB', (10, 10)).save(tf, format='BMP')
+            tf.seek(0)
+
+            res = self.client.post(url, {'image': tf}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(self.recipe.image_jobs.exists())
@@ -0,0 +1,241 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.shortcuts import reverse
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    ChangeSequence,
+    Ingredient,
+    Tag,
+    Tombstone,
+)
+from recipe.tests.test_recipe_api import sample_recipe
+
+SYNC_URL = reverse('recipe:sync')
+
+
+class PublicSyncAPITests(TestCase):
+    """Publicly available sync API."""
+
+    def test_login_required(self):
+        """Test that login is required to sync."""
+        res = APIClient().get(SYNC_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateSyncAPITests(TestCase):
+    """Private sync API."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='j@j.com',
+            password='123qwerty',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.tag = Tag.objects.create(user=self.user, name='Dessert')
+        self.ingredient = Ingredient.objects.create(
+            user=self.user,
+            name='Sugar',
+        )
+        self.recipe = sample_recipe(self.user, title='Cheesecake')
+
+    def test_full_sync(self):
+        """Test a sync without a cursor returns everything."""
+        res = self.client.get(SYNC_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(res.data['has_more'])
+        self.assertEqual(
+            [r['id'] for r in res.data['recipes']],
+            [self.recipe.id],
+        )
+        self.assertEqual(res.data['tags'][0]['name'], 'Dessert')
+        self.assertEqual(res.data['ingredients'][0]['name'], 'Sugar')
+
+    def test_no_changes(self):
+        """Test a sync with nothing new reads the sequence alone."""
+        cursor = self.client.get(SYNC_URL).data['cursor']
+
+        with self.assertNumQueries(1):
+            res = self.client.get(SYNC_URL, {'since': cursor})
+
+        self.assertEqual(res.data['cursor'], cursor)
+        self.assertEqual(res.data['recipes'], [])
+        self.assertEqual(res.data['deleted']['tags'], [])
+
+    def test_changes_since_cursor(self):
+        """Test only the objects written after the cursor are returned."""
+        cursor = self.client.get(SYNC_URL).data['cursor']
+
+        self.tag.name = 'Sweets'
+        self.tag.save()
+        other = sample_recipe(self.user, title='Brownies')
+        self.recipe.ingredients.add(self.ingredient)
+
+        res = self.client.get(SYNC_URL, {'since': cursor})
+
+        self.assertEqual(
+            [r['id'] for r in res.data['recipes']],
+            [other.id, self.recipe.id],
+        )
+        self.assertEqual(
+            res.data['recipes'][1]['ingredients'],
+            [self.ingredient.id],
+        )
+        self.assertEqual(res.data['tags'][0]['name'], 'Sweets')
+        self.assertEqual(res.data['ingredients'], [])
+        self.assertGreater(res.data['cursor'], cursor)
+
+    def test_deletes(self):
+        """Test deleted objects are reported by id."""
+        self.recipe.tags.add(self.tag)
+        cursor = self.client.get(SYNC_URL).data['cursor']
+        tag_id = self.tag.id
+
+        self.tag.delete()
+
+        res = self.client.get(SYNC_URL, {'since': cursor})
+
+        self.assertEqual(res.data['deleted']['tags'], [tag_id])
+        self.assertEqual(res.data['tags'], [])
+        # The recipe lost its link.
+        self.assertEqual(res.data['recipes'][0]['tags'], [])
+
+    def test_bulk_writes(self):
+        """Test bulk endpoints number their changes too."""
+        cursor = self.client.get(SYNC_URL).data['cursor']
+
+        self.client.post(
+            reverse('recipe:tag-bulk'),
+            ['Vegan', 'Quick'],
+            format='json',
+        )
+        self.client.patch(
+            reverse('recipe:recipe-bulk'),
+            [{'id': self.recipe.id, 'tags': [self.tag.id]}],
+            format='json',
+        )
+
+        res = self.client.get(SYNC_URL, {'since': cursor})
+
+        self.assertEqual(
+            [tag['name'] for tag in res.data['tags']],
+            ['Vegan', 'Quick'],
+        )
+        self.assertEqual(res.data['recipes'][0]['tags'], [self.tag.id])
+
+    def test_existing_names(self):
+        """Test resolving existing names changes nothing to sync."""
+        cursor = self.client.get(SYNC_URL).data['cursor']
+
+        self.client.post(
+            reverse('recipe:tag-bulk'),
+            ['dessert'],
+            format='json',
+        )
+        res = self.client.get(SYNC_URL, {'since': cursor})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['cursor'], cursor)
+        self.assertEqual(res.data['tags'], [])
+
+    @patch('core.signals.update_search_vectors')
+    def test_relinked_once(self, mock_index):
+        """Test an update reindexes and renumbers a recipe once."""
+        self.recipe.tags.add(self.tag)
+        cursor = self.client.get(SYNC_URL).data['cursor']
+        mock_index.reset_mock()
+
+        self.client.patch(
+            reverse('recipe:recipe-detail', args=[self.recipe.id]),
+            {
+                'title': 'Lemon cheesecake',
+                'tags': [],
+                'ingredients': [self.ingredient.id],
+            },
+            format='json',
+        )
+
+        mock_index.assert_called_once_with({self.recipe.id})
+        res = self.client.get(SYNC_URL, {'since': cursor})
+        self.assertEqual(res.data['cursor'], cursor + 1)
+
+    def test_paged(self):
+        """Test walking the changes page by page."""
+        for n in range(4):
+            sample_recipe(self.user, title=f'Recipe {n}')
+        Tag.objects.create(user=self.user, name='Vegan').delete()
+
+        seen, cursor, has_more = [], 0, True
+        while has_more:
+            res = self.client.get(SYNC_URL, {'since': cursor, 'page_size': 2})
+            page = (
+                [('recipe', r['id']) for r in res.data['recipes']]
+                + [('tag', t['id']) for t in res.data['tags']]
+                + [('ingredient', i['id']) for i in res.data['ingredients']]
+                + [('deleted', pk) for pk in res.data['deleted']['tags']]
+            )
+            self.assertLessEqual(len(page), 2)
+
+            seen.extend(page)
+            cursor, has_more = res.data['cursor'], res.data['has_more']
+
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), 8)
+
+    def test_limited_to_user(self):
+        """Test the changes of other users are not returned."""
+        other = get_user_model().objects.create_user(
+            email='g@g.com',
+            password='123qwerty',
+        )
+        sample_recipe(other)
+
+        res = self.client.get(SYNC_URL)
+
+        self.assertEqual(
+            [r['id'] for r in res.data['recipes']],
+            [self.recipe.id],
+        )
+
+    def test_user_deleted(self):
+        """Test deleting users records nothing per object."""
+        users = get_user_model().objects
+
+        def delete_user(size, delete):
+            user = users.create_user(
+                email=f'{size}@j.com',
+                password='123qwerty',
+            )
+            for n in range(size):
+                recipe = sample_recipe(user, title=f'Recipe {n}')
+                recipe.tags.add(Tag.objects.create(user=user, name=f'{n}'))
+            with CaptureQueriesContext(connection) as context:
+                delete(user)
+            return len(context.captured_queries)
+
+        for delete in (
+            lambda user: user.delete(),
+            lambda user: users.filter(pk=user.pk).delete(),
+        ):
+            self.assertEqual(delete_user(5, delete), delete_user(1, delete))
+
+        self.assertFalse(Tombstone.objects.exists())
+        self.assertFalse(ChangeSequence.objects.exclude(
+            user=self.user,
+        ).exists())
+
+    def test_invalid_cursor(self):
+        """Test a malformed cursor is rejected."""
+        for since in ('abc', '-1'):
+            res = self.client.get(SYNC_URL, {'since': since})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
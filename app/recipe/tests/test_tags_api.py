@@ -5,7 +5,9 @@ from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Tag, Recipe
+from core.tests.utils import ClearResponseCacheMixin
 
+from recipe.pagination import encode_cursor
 from recipe.serializers import TagSerializer
 
 
@@ -24,7 +26,7 @@ class PublicTagsAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateTagsAPITests(TestCase):
+class PrivateTagsAPITests(ClearResponseCacheMixin, TestCase):
     """Private Tags API."""
 
     @classmethod
@@ -36,6 +38,8 @@ class PrivateTagsAPITests(TestCase):
         )
 
     def setUp(self):
+        super().setUp()
+
         self.client = APIClient()
         self.client.force_authenticate(self.user)
 
@@ -52,7 +56,7 @@ class PrivateTagsAPITests(TestCase):
 
         serializer = TagSerializer(tags, many=True)
 
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_tags_limited_to_user(self):
         """Test tags are limited to own user."""
@@ -68,8 +72,8 @@ class PrivateTagsAPITests(TestCase):
         res = self.client.get(reverse('recipe:tag-list'))
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], tag.name)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], tag.name)
 
     def test_create_tag_successful(self):
         """Test create tag."""
@@ -86,6 +90,15 @@ class PrivateTagsAPITests(TestCase):
 
         self.assertTrue(is_tag)
 
+    def test_create_tag_duplicate(self):
+        """Test names are unique per user regardless of case."""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.post(reverse('recipe:tag-list'), {'name': 'VEGAN'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Tag.objects.count(), 1)
+
     def test_create_tag_invalid(self):
         """Test create tag with invalid payload."""
         payload = {
@@ -113,8 +126,8 @@ class PrivateTagsAPITests(TestCase):
         ser1 = TagSerializer(tag1)
         ser2 = TagSerializer(tag2)
 
-        self.assertIn(ser1.data, res.data)
-        self.assertNotIn(ser2.data, res.data)
+        self.assertIn(ser1.data, res.data['results'])
+        self.assertNotIn(ser2.data, res.data['results'])
 
     def test_retrieve_tags_assigned_are_unique(self):
         """Test uniqueness."""
@@ -139,4 +152,93 @@ class PrivateTagsAPITests(TestCase):
 
         res = self.client.get(reverse('recipe:tag-list'), {'assigned_only': 1})
 
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_tags_paginated_by_name(self):
+        """Test walking the pages by name."""
+        for name in ('Lunch', 'Dinner', 'Supper', 'Brunch', 'Snack'):
+            Tag.objects.create(user=self.user, name=name)
+
+        expected = list(
+            Tag.objects.order_by('-name', 'id').values_list('id', flat=True)
+        )
+
+        ids = []
+        url = reverse('recipe:tag-list') + '?page_size=2'
+        while url:
+            # The validator aggregate and a single page query.
+            with self.assertNumQueries(2):
+                res = self.client.get(url)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            ids.extend(tag['id'] for tag in res.data['results'])
+            url = res.data['next']
+
+        self.assertEqual(ids, expected)
+
+        res = self.client.get(res.data['previous'])
+
+        self.assertEqual(
+            [tag['id'] for tag in res.data['results']],
+            expected[2:4],
+        )
+
+    def test_tags_invalid_cursor(self):
+        """Test a malformed cursor."""
+        res = self.client.get(reverse('recipe:tag-list'), {'cursor': 'junk'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tags_invalid_cursor_values(self):
+        """Test a well-formed cursor with values the ordering can't hold."""
+        positions = (
+            [None, None],
+            [[1], {}],
+            ['Lunch', 'x'],
+            ['Lu\x00nch', 1],
+        )
+        for position in positions:
+            with self.subTest(position=position):
+                res = self.client.get(
+                    reverse('recipe:tag-list'),
+                    {'cursor': encode_cursor(False, position)},
+                )
+
+                self.assertEqual(
+                    res.status_code,
+                    status.HTTP_404_NOT_FOUND,
+                )
+
+    def test_bulk_get_or_create_tags(self):
+        """Test resolving many names at once."""
+        user2 = get_user_model().objects.create_user(
+            email='z@z.com',
+            password='123qwerty',
+        )
+        Tag.objects.create(user=user2, name='Vegan')
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.post(
+            reverse('recipe:tag-bulk'),
+            ['Dessert', 'vegan', 'Quick', 'dessert'],
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [tag['name'] for tag in res.data],
+            ['Dessert', 'Vegan', 'Quick'],
+        )
+        self.assertEqual(res.data[1]['id'], vegan.id)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 3)
+
+    def test_bulk_get_or_create_tags_invalid(self):
+        """Test the names are validated."""
+        res = self.client.post(
+            reverse('recipe:tag-bulk'),
+            ['Dessert', 'x' * 256],
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Tag.objects.exists())
@@ -1,11 +1,38 @@
-from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
+from collections import OrderedDict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from rest_framework import serializers, viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.pagination import _positive_int
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
 
-from core.models import Tag, Ingredient, Recipe
+from core.authentication import CachedTokenAuthentication
+from core.cache import (
+    CachedListMixin,
+    ConditionalListMixin,
+    ConditionalMixin,
+)
+from core.models import (
+    ChangeSequence,
+    Ingredient,
+    Recipe,
+    Tag,
+    Tombstone,
+)
+from core.search import search_recipes
+from core.signals import deferred_burials
+from recipe.export import CONTENT_TYPES, RENDERERS, export_recipes
+from recipe.fastpath import FastListMixin, FastReadMixin
+from recipe.filters import filter_assigned, filter_recipes, parse_names
+from recipe.m2m import delete_links
+from recipe.pagination import NamePagination, RecipePagination
 from recipe.serializers import (
+    RELATED_FIELDS,
     TagSerializer,
     IngredientSerializer,
     RecipeSerializer,
@@ -14,33 +41,124 @@ from recipe.serializers import (
 )
 
 
-class CommonRecipeAttributesMixin:
+def index_errors(errors):
+    """Report the errors of a list serializer by item index."""
+    if isinstance(errors, dict):
+        return errors
+
+    return [
+        {'index': index, 'errors': item_errors}
+        for index, item_errors in enumerate(errors)
+        if item_errors
+    ]
+
+
+# Serializer fields reading columns of other names.
+FIELD_COLUMNS = {
+    'image_srcset': ('image', 'image_width'),
+}
+
+
+def optimize_recipes(qs, fields, nested=(), extra=()):
+    """Load only the columns of ``fields`` and prefetch their relations.
+
+    Keeps the number of queries constant regardless of the page size:
+    one for the recipes and one per requested many-to-many relation. The
+    relations in ``nested`` load whole objects instead of their ids.
+    """
+    columns = {'id', *extra}
+    for field in fields:
+        if field not in RELATED_FIELDS:
+            columns.update(FIELD_COLUMNS.get(field, (field,)))
+
+    prefetches = []
+    for name in RELATED_FIELDS:
+        if name not in fields:
+            continue
+
+        model = Recipe._meta.get_field(name).related_model
+        related_fields = ('id', 'name') if name in nested else ('id',)
+        # Ordered, like the fast path reads them.
+        prefetches.append(Prefetch(
+            name,
+            queryset=model.objects.only(*related_fields).order_by('id'),
+        ))
+
+    return qs.only(*columns).prefetch_related(*prefetches)
+
+
+class CommonRecipeAttributesMixin(
+    ConditionalListMixin,
+    CachedListMixin,
+    FastListMixin,
+):
     """Common recipe attributes mixin."""
 
     queryset = NotImplemented
     request = NotImplemented
     authentication_classes = (
-        TokenAuthentication,
+        CachedTokenAuthentication,
     )
     permission_classes = (
         IsAuthenticated,
     )
+    pagination_class = NamePagination
+    bulk_max_size = 1000
 
     def get_queryset(self):
         """Return objects for the current authenticated user only."""
         qs = self.queryset
 
-        is_assigned_only = bool(int(
-            self.request.query_params.get('assigned_only', 0)
-        ))
-        if is_assigned_only:
-            qs = qs.filter(recipe__isnull=False)
+        if self.is_assigned_only():
+            qs = filter_assigned(qs)
+
+        return qs.filter(user=self.request.user).order_by('-name', 'id')
 
-        return qs.filter(user=self.request.user).order_by('-name').distinct()
+    def is_assigned_only(self):
+        """Whether only the objects assigned to recipes are requested."""
+        return bool(int(self.request.query_params.get('assigned_only', 0)))
+
+    def get_validator_querysets(self):
+        """Validate assignments by the recipes, touched on relinking."""
+        querysets = super().get_validator_querysets()
+        if self.is_assigned_only():
+            querysets.append(Recipe.objects.filter(user=self.request.user))
+
+        return querysets
 
     def perform_create(self, serializer):
         """Assign a tag to a user."""
-        serializer.save(user=self.request.user)
+        try:
+            with transaction.atomic():
+                serializer.save(user=self.request.user)
+        except IntegrityError:
+            raise ValidationError({
+                'name': ['An object with this name already exists.'],
+            })
+
+    @action(methods=['POST'], detail=False, url_path='bulk')
+    def bulk(self, request):
+        """Get or create many objects from a list of names.
+
+        Names match case-insensitively; the objects are returned in the
+        order of the names, whether they existed or not.
+        """
+        field = serializers.ListField(
+            child=serializers.CharField(max_length=255),
+            allow_empty=False,
+            max_length=self.bulk_max_size,
+        )
+        try:
+            names = field.run_validation(request.data)
+        except ValidationError as exc:
+            raise ValidationError({'errors': exc.detail})
+
+        objects = self.queryset.model.objects.bulk_get_or_create(
+            request.user,
+            names,
+        )
+
+        return Response(self.get_serializer(objects, many=True).data)
 
 
 class TagViewSet(
@@ -67,34 +185,91 @@ class IngredientViewSet(
     serializer_class = IngredientSerializer
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    ConditionalMixin,
+    CachedListMixin,
+    FastReadMixin,
+    viewsets.ModelViewSet,
+):
     """Manage recipes in the database."""
 
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     authentication_classes = (
-        TokenAuthentication,
+        CachedTokenAuthentication,
     )
     permission_classes = (
         IsAuthenticated,
     )
+    pagination_class = RecipePagination
+    bulk_max_size = 1000
 
     def get_queryset(self):
         """Retrieve the own recipes."""
-        qs = self.queryset
+        qs = filter_recipes(self.queryset, self.request.query_params)
+        qs = qs.filter(user=self.request.user).order_by('-id')
+
+        if self.action == 'list':
+            term = self.request.query_params.get('search')
+            if term:
+                qs = search_recipes(qs, term)
+        if self.action in ('list', 'retrieve'):
+            return self._optimize_queryset(qs)
+        return qs
+
+    def get_pagination_ordering(self):
+        """Order search results by rank."""
+        if self.request.query_params.get('search'):
+            return ('-rank', '-id')
 
-        tags = self.request.query_params.get('tags')
-        ings = self.request.query_params.get('ingredients')
+        return None
 
-        if tags:
-            qs = qs.filter(tags__id__in=[int(t) for t in tags.split(',')])
+    def get_sparse_fields(self):
+        """Return the fields and the relations to expand of a read.
 
-        if ings:
-            qs = qs.filter(
-                ingredients__id__in=[int(i) for i in ings.split(',')],
+        ``?fields=`` trims the output of list and retrieve, ``?expand=``
+        nests the tags and ingredients of the list.
+        """
+        if self.action not in ('list', 'retrieve'):
+            return [], []
+
+        params = self.request.query_params
+        fields = parse_names(
+            params.get('fields', ''),
+            'fields',
+            self.get_serializer_class().Meta.fields,
+        )
+        expand = []
+        if self.action == 'list':
+            expand = parse_names(
+                params.get('expand', ''),
+                'expand',
+                RELATED_FIELDS,
             )
 
-        return qs.filter(user=self.request.user)
+        return fields, expand
+
+    def get_serializer_context(self):
+        """Pass the requested fields on to the serializer."""
+        context = super().get_serializer_context()
+        context['fields'], context['expand'] = self.get_sparse_fields()
+
+        return context
+
+    def _optimize_queryset(self, qs):
+        """Load only the serialized columns and prefetch the relations."""
+        serializer_class = self.get_serializer_class()
+        fields, expand = self.get_sparse_fields()
+        nested = [
+            name for name, field in serializer_class._declared_fields.items()
+            if isinstance(field, serializers.BaseSerializer)
+        ]
+
+        return optimize_recipes(
+            qs,
+            fields or serializer_class.Meta.fields,
+            nested=[*nested, *expand],
+        )
 
     def get_serializer_class(self):
         """Return appropriate serializer."""
@@ -110,12 +285,312 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
-        """Upload an image to a recipe."""
+        """Queue an image upload of a recipe for processing."""
         recipe = self.get_object()
         serializer = self.get_serializer(recipe, data=request.data)
 
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(methods=['GET'], detail=False, url_path='export')
+    def export(self, request):
+        """Stream every recipe as NDJSON, or CSV with ``?type=csv``.
+
+        The related filters apply like on the list, without pagination.
+        """
+        output = request.query_params.get('type', 'ndjson')
+        if output not in RENDERERS:
+            raise ValidationError({
+                'type': [f'Expected one of: {", ".join(RENDERERS)}.'],
+            })
+
+        response = StreamingHttpResponse(
+            RENDERERS[output](export_recipes(self.get_queryset())),
+            content_type=CONTENT_TYPES[output],
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="recipes.{output}"'
+        )
+        return response
+
+    @action(
+        methods=['POST', 'PUT', 'PATCH', 'DELETE'],
+        detail=False,
+        url_path='bulk',
+    )
+    def bulk(self, request):
+        """Create, update or delete many recipes in one transaction.
+
+        POST takes a list of recipes, PUT and PATCH a list of recipes with
+        their ``id`` and DELETE a list of ids. Nothing is written unless
+        every item is valid; the errors are reported by item index.
+        """
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError({
+                'non_field_errors': ['Expected a non-empty list of items.'],
+            })
+        if len(items) > self.bulk_max_size:
+            raise ValidationError({
+                'non_field_errors': [
+                    f'Expected at most {self.bulk_max_size} items.',
+                ],
+            })
+
+        with transaction.atomic():
+            if request.method == 'POST':
+                return self._bulk_create(items)
+            if request.method == 'DELETE':
+                return self._bulk_delete(items)
+            return self._bulk_update(items, partial=request.method == 'PATCH')
+
+    def _bulk_create(self, items):
+        """Create many recipes."""
+        serializer = self.get_serializer(data=items, many=True)
+        if not serializer.is_valid():
+            return Response(
+                {'errors': index_errors(serializer.errors)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        recipes = serializer.save(user=self.request.user)
+
+        return Response(
+            self._bulk_output(recipes),
+            status=status.HTTP_201_CREATED,
+        )
+
+    def _bulk_update(self, items, partial):
+        """Update many recipes identified by their ids."""
+        ids = [
+            item.get('id') if isinstance(item, dict) else None
+            for item in items
+        ]
+        found = self.get_queryset().in_bulk(
+            [pk for pk in ids if isinstance(pk, int)],
+        )
+
+        errors = self._bulk_id_errors(ids, found)
+        if errors:
+            return Response(
+                {'errors': errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        instances = [found[pk] for pk in ids]
+        serializer = self.get_serializer(
+            instances,
+            data=items,
+            many=True,
+            partial=partial,
+        )
+        if not serializer.is_valid():
+            return Response(
+                {'errors': index_errors(serializer.errors)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        serializer.save()
+
+        return Response(self._bulk_output(instances))
+
+    def _bulk_delete(self, ids):
+        """Delete many recipes by id."""
+        qs = self.get_queryset()
+        found = set(qs.filter(
+            pk__in=[pk for pk in ids if isinstance(pk, int)],
+        ).values_list('pk', flat=True))
+
+        errors = self._bulk_id_errors(ids, found)
+        if errors:
+            return Response(
+                {'errors': errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Unlinked first, the collector would delete the links by batches.
+        for name in RELATED_FIELDS:
+            delete_links(name, recipe_id__in=ids)
+        with deferred_burials():
+            qs.filter(pk__in=ids).delete()
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @staticmethod
+    def _bulk_id_errors(ids, found):
+        """Report invalid, duplicated and unknown ids by index."""
+        errors, seen = [], set()
+        for index, pk in enumerate(ids):
+            if not isinstance(pk, int) or isinstance(pk, bool):
+                message = 'A valid integer is required.'
+            elif pk in seen:
+                message = 'Duplicated id.'
+            elif pk not in found:
+                message = 'Not found.'
+            else:
+                seen.add(pk)
+                continue
+
+            errors.append({'index': index, 'errors': {'id': [message]}})
+
+        return errors
+
+    def _bulk_output(self, recipes):
+        """Serialize written recipes with a fixed number of queries."""
+        qs = self._optimize_queryset(
+            Recipe.objects.filter(pk__in=[recipe.pk for recipe in recipes]),
+        )
+        by_pk = {recipe.pk: recipe for recipe in qs}
+
+        return self.get_serializer(
+            [by_pk[recipe.pk] for recipe in recipes],
+            many=True,
+        ).data
+
+
+class SyncView(APIView):
+    """Changes to the recipes, tags and ingredients since a cursor.
+
+    The cursor is the last change number the client has seen. Every write
+    numbers the written object from the change sequence of its user and
+    deletes leave a tombstone, so a sync reads the rows numbered past the
+    cursor, each through a ``(user, change_seq)`` index. A sync with
+    nothing new reads the sequence alone.
+    """
+
+    authentication_classes = (
+        CachedTokenAuthentication,
+    )
+    permission_classes = (
+        IsAuthenticated,
+    )
+    page_size = 500
+    max_page_size = 1000
+    sources = (
+        ('recipes', Recipe, RecipeSerializer),
+        ('tags', Tag, TagSerializer),
+        ('ingredients', Ingredient, IngredientSerializer),
+    )
+
+    def get(self, request):
+        """Return one page of changes."""
+        since = self.get_since(request)
+        page_size = self.get_page_size(request)
+
+        last = ChangeSequence.objects.filter(
+            user=request.user,
+        ).values_list('last', flat=True).first()
+        if last is None or last <= since:
+            return Response(self._envelope(since, False, {}, {}))
+
+        changed = {
+            name: list(self._changed(model, since)[:page_size + 1])
+            for name, model, _ in self.sources
+        }
+        deleted = {name: [] for name, _, _ in self.sources}
+        names = {
+            model._meta.model_name: name
+            for name, model, _ in self.sources
+        }
+        tombstones = Tombstone.objects.filter(
+            user=request.user,
+            change_seq__gt=since,
+        ).order_by('change_seq').values_list(
+            'model',
+            'object_id',
+            'change_seq',
+        )
+        for model_name, object_id, change_seq in tombstones[:page_size + 1]:
+            deleted[names[model_name]].append((change_seq, object_id))
+
+        # Every source holds its first page_size + 1 changes, so the first
+        # page_size changes overall are among them. The numbers are unique,
+        # which lets the page end exactly after the last one returned.
+        seqs = sorted(
+            [obj.change_seq for objs in changed.values() for obj in objs]
+            + [seq for items in deleted.values() for seq, _ in items]
+        )
+        has_more = len(seqs) > page_size
+        if has_more:
+            cursor = seqs[page_size - 1]
+        else:
+            # Numbers can be reserved past the cursor without any change
+            # left to show for them, so there may be no seqs at all.
+            cursor = max([last, *seqs[-1:]])
+
+        return Response(self._envelope(
+            cursor,
+            has_more,
+            {
+                name: [obj for obj in objs if obj.change_seq <= cursor]
+                for name, objs in changed.items()
+            },
+            {
+                name: [pk for seq, pk in items if seq <= cursor]
+                for name, items in deleted.items()
+            },
+        ))
+
+    def get_since(self, request):
+        """Return the cursor sent by the client, 0 for a full sync."""
+        try:
+            since = int(request.query_params.get('since', 0))
+        except ValueError:
+            since = -1
+
+        if since < 0:
+            raise ValidationError({
+                'since': ['A valid cursor is required.'],
+            })
+
+        return since
+
+    def get_page_size(self, request):
+        """Return the page size requested by the client, if any."""
+        try:
+            return _positive_int(
+                request.query_params['page_size'],
+                strict=True,
+                cutoff=self.max_page_size,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def _changed(self, model, since):
+        """Objects of a source changed past the cursor, in change order."""
+        qs = model.objects.filter(
+            user=self.request.user,
+            change_seq__gt=since,
+        ).order_by('change_seq')
+
+        if model is Recipe:
+            qs = optimize_recipes(
+                qs,
+                RecipeSerializer.Meta.fields,
+                extra=('change_seq',),
+            )
+
+        return qs
+
+    def _envelope(self, cursor, has_more, changed, deleted):
+        """Serialize a page of changes."""
+        context = {'request': self.request}
+        data = OrderedDict((
+            ('cursor', cursor),
+            ('has_more', has_more),
+        ))
+        for name, _, serializer_class in self.sources:
+            data[name] = serializer_class(
+                changed.get(name, []),
+                many=True,
+                context=context,
+            ).data
+        data['deleted'] = OrderedDict(
+            (name, deleted.get(name, []))
+            for name, _, _ in self.sources
+        )
+
+        return data
@@ -0,0 +1,95 @@
+from django.contrib.auth import get_user_model
+from django.shortcuts import reverse
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from core.tests.utils import QueryBudgetMixin, route_names
+from user import urls
+
+# Queries per request, whatever the number of users and of their objects.
+# Saving a user reads its tokens, to drop them from the token cache.
+BUDGETS = {
+    ('create', 'POST'): 3,
+    ('token', 'POST'): 2,
+    ('me', 'GET'): 0,
+    ('me', 'PUT'): 5,
+    ('me', 'PATCH'): 2,
+}
+
+
+class UserQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Test the user routes run a fixed number of queries."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='j@j.com',
+            password='123qwerty',
+            name='J',
+        )
+        # Logins reuse the token of the first one.
+        Token.objects.create(user=self.user)
+        self.client = APIClient()
+
+    def populate(self, size):
+        """Create other users, and recipes and tags of the user."""
+        User = get_user_model()
+        for n in range(User.objects.count() - 1, size):
+            User.objects.create_user(
+                email=f'other-{n}@example.com',
+                password='123qwerty',
+            )
+        for n in range(Recipe.objects.count(), size):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=f'Recipe {n}',
+                time_minutes=10,
+                price=5,
+            )
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f'{n}'))
+
+    def check(self, name, method, request):
+        """Assert the budget of a route."""
+        return self.assertQueryBudget(BUDGETS[name, method], request)
+
+    def test_every_route_budgeted(self):
+        """Test no route is left without a budget."""
+        self.assertEqual(
+            set(route_names(urls.urlpatterns)),
+            {name for name, _ in BUDGETS},
+        )
+
+    def test_create(self):
+        """Test signing up."""
+        self.check('create', 'POST', lambda size: self.client.post(
+            reverse('user:create'),
+            {
+                'email': f'new-{size}@example.com',
+                'password': '123qwerty',
+                'name': 'New',
+            },
+        ))
+
+    def test_token(self):
+        """Test logging in."""
+        self.check('token', 'POST', lambda size: self.client.post(
+            reverse('user:token'),
+            {'email': 'j@j.com', 'password': '123qwerty'},
+        ))
+
+    def test_me(self):
+        """Test reading and updating the profile."""
+        self.client.force_authenticate(self.user)
+
+        self.check('me', 'GET', lambda size: self.client.get(
+            reverse('user:me'),
+        ))
+        self.check('me', 'PUT', lambda size: self.client.put(
+            reverse('user:me'),
+            {'email': 'j@j.com', 'password': f'new-{size}', 'name': 'K'},
+        ))
+        self.check('me', 'PATCH', lambda size: self.client.patch(
+            reverse('user:me'),
+            {'name': f'Name {size}'},
+        ))
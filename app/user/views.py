@@ -1,7 +1,8 @@
-from rest_framework import authentication, generics, permissions
+from rest_framework import generics, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
 
+from core.authentication import CachedTokenAuthentication
 from user.serializers import AuthTokenSerializer, UserSerializer
 
 
@@ -23,7 +24,7 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
 
     serializer_class = UserSerializer
     authentication_classes = (
-        authentication.TokenAuthentication,
+        CachedTokenAuthentication,
     )
     permission_classes = (
         permissions.IsAuthenticated,